@@ -1,11 +1,15 @@
 ﻿import streamlit as st
-import yaml
 from pathlib import Path
 
 from config import config
-from backend.validate_sql import validate_sql_pair, is_safe_select, get_conn
-from backend.llm_feedback import get_feedback
-from backend.bootstrap_db import bootstrap_database
+from backend.validate_sql import validate_sql_pair, QueryTooExpensive
+from backend.sql_analysis import analyze_sql
+from backend.llm_feedback import get_feedback, stream_feedback
+from backend.feedback_rules import rule_feedback
+from backend.bootstrap_db import bootstrap_database, table_schema
+from backend.question_bank import QuestionBank
+from backend.metrics import start_metrics_server
+from backend.service_client import service_client
 
 
 APP_DIR = Path(__file__).resolve().parent
@@ -20,32 +24,36 @@ def _resolve(path_str: str) -> Path:
         return candidate
     return Path.cwd() / path
 
-def load_yaml(path_str: str):
-    resolved = _resolve(path_str)
-    if not resolved.exists():
-        return {} if resolved.suffix in {".yml", ".yaml"} else []
-    with resolved.open("r", encoding="utf-8") as handle:
-        return yaml.safe_load(handle)
+@st.cache_resource(show_spinner=False)
+def get_question_bank() -> QuestionBank:
+    return QuestionBank(_resolve(config.QUESTIONS_PATH), _resolve(config.SOLUTIONS_PATH), config.QUESTION_INDEX_PATH)
 
 
-QUESTIONS_RAW = load_yaml(config.QUESTIONS_PATH) or []
-SOLUTIONS_RAW = load_yaml(config.SOLUTIONS_PATH) or {}
+#a stat() per rerun; the YAML is only parsed again when a file actually changed
+BANK = get_question_bank()
+BANK.refresh()
 
 st.caption(f"Loaded questions from: {_resolve(config.QUESTIONS_PATH)}")
 
-if isinstance(QUESTIONS_RAW, dict):
-    QUESTIONS = QUESTIONS_RAW.get("questions", [])
-else:
-    QUESTIONS = QUESTIONS_RAW or []
-if not isinstance(QUESTIONS, list):
-    QUESTIONS = []
+SCHEMA_TABLES = ("departments", "employees", "projects")
 
-if isinstance(SOLUTIONS_RAW, dict):
-    SOLUTIONS = {str(key): value for key, value in SOLUTIONS_RAW.items()}
-else:
-    SOLUTIONS = {}
 
-SCHEMA_TABLES = ("departments", "employees", "projects")
+@st.cache_resource(show_spinner=False)
+def get_service():
+    #None grades in this process; with GRADING_SERVICE_URL set, grading and feedback go to the service
+    return service_client()
+
+
+SERVICE = get_service()
+
+
+@st.cache_resource(show_spinner=False)
+def metrics_server():
+    #one /metrics listener per process, not per rerun
+    return start_metrics_server()
+
+
+metrics_server()
 
 
 @st.cache_resource(show_spinner=False)
@@ -56,47 +64,115 @@ def ensure_bootstrap():
 
 @st.cache_data(show_spinner=False)
 def load_table_schema(table_names):
-    ensure_bootstrap()
-    table_list = list(table_names)
     try:
-        with get_conn() as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT table_name, column_name, data_type
-                    FROM information_schema.columns
-                    WHERE table_schema = 'public' AND table_name = ANY(%s)
-                    ORDER BY table_name, ordinal_position
-                """, (table_list,))
-                rows = cur.fetchall()
+        if SERVICE is not None:
+            return SERVICE.schema(table_names)
+        ensure_bootstrap()
+        return table_schema(table_names)
     except Exception as exc:
         return {"_error": str(exc)}
-    schema = {}
-    for table_name, column_name, data_type in rows:
-        schema.setdefault(table_name, []).append((column_name, data_type))
-    return schema
 
 st.set_page_config(page_title="SQL Playground", layout="wide")
 st.title("SQL Playground (Postgres + Local LLM)")
 
-if "q_index" not in st.session_state:
-    st.session_state.q_index = 0
+if "q_id" not in st.session_state:
+    st.session_state.q_id = None
 if "last_feedback" not in st.session_state:
     st.session_state.last_feedback = ""
+if "rule_hint" not in st.session_state:
+    st.session_state.rule_hint = ""
+    st.session_state.mentor_request = None
+
+def cancel_feedback_stream():
+    #stops a mentor answer that was still generating when the user moved on
+    stream = st.session_state.pop("feedback_stream", None)
+    if stream is not None:
+        stream.cancel()
+
+def reset_feedback():
+    st.session_state.last_feedback = ""
+    st.session_state.rule_hint = ""
+    st.session_state.mentor_request = None
+    cancel_feedback_stream()
+
+def ask_mentor(request) -> bool:
+    """Get LLM feedback into last_feedback; returns True when it was already rendered while streaming."""
+    remote = (request["question_id"], request["user_sql"], request["diagnostics"])
+    if not config.LLM_STREAM:
+        st.session_state.last_feedback = SERVICE.feedback(*remote) if SERVICE else get_feedback(**request)
+        return False
+    st.markdown("### Mentor Feedback")
+    stream = SERVICE.stream_feedback(*remote) if SERVICE else stream_feedback(**request)
+    st.session_state.feedback_stream = stream
+    try:
+        st.session_state.last_feedback = st.write_stream(iter(stream))
+    finally:
+        #no-op once finished; on a rerun mid-answer it stops the model
+        cancel_feedback_stream()
+    if stream.metrics.get("cached"):
+        st.caption("Answered from the feedback cache.")
+    elif stream.metrics.get("ttft_ms") is not None:
+        st.caption(f"First token after {stream.metrics['ttft_ms'] / 1000:.1f}s, "
+                   f"{stream.metrics['tokens_per_sec'] or 0:.1f} tokens/s")
+    return True
+
+ALL = "All"
+
+def current_filters():
+    tag = st.session_state.get("filter_tag", ALL)
+    difficulty = st.session_state.get("filter_difficulty", ALL)
+    return (None if tag == ALL else tag), (None if difficulty == ALL else difficulty)
+
+def go_to(qid):
+    if qid is not None and qid != st.session_state.q_id:
+        st.session_state.q_id = qid
+        reset_feedback()
+
+def apply_filters():
+    tag, difficulty = current_filters()
+    if BANK.position(st.session_state.q_id, tag, difficulty) is None:
+        go_to(BANK.neighbor(None, 1, tag, difficulty))
+
+def jump_to_id():
+    wanted = st.session_state.jump_id.strip()
+    st.session_state.jump_id = ""
+    if BANK.question(wanted) is None:
+        st.session_state.jump_error = f"No question with id {wanted}."
+    else:
+        go_to(wanted)
 
 def get_current_q():
-    if not QUESTIONS:
-        return None
-    index = max(0, min(st.session_state.q_index, len(QUESTIONS) - 1))
-    return QUESTIONS[index]
+    qid = st.session_state.q_id
+    question = BANK.question(qid) if qid is not None else None
+    if question is None:
+        #first visit, or the question was removed from the bank
+        qid = BANK.neighbor(None, 1, *current_filters()) or BANK.neighbor(None, 1)
+        st.session_state.q_id = qid
+        question = BANK.question(qid) if qid is not None else None
+    return question
+
+#resolve the starting question before the sidebar shows where it is
+get_current_q()
 
 with st.sidebar:
     st.subheader("Question Navigation")
+    difficulties, tags = BANK.difficulties(), BANK.tags()
+    if difficulties:
+        st.selectbox("Difficulty", [ALL] + difficulties, key="filter_difficulty", on_change=apply_filters)
+    if tags:
+        st.selectbox("Tag", [ALL] + tags, key="filter_tag", on_change=apply_filters)
+    tag, difficulty = current_filters()
     if st.button("Prev", use_container_width=True):
-        st.session_state.q_index = max(0, st.session_state.q_index - 1)
-        st.session_state.last_feedback = ""
+        go_to(BANK.neighbor(st.session_state.q_id, -1, tag, difficulty))
     if st.button("Next", use_container_width=True):
-        st.session_state.q_index = min(len(QUESTIONS) - 1, st.session_state.q_index + 1)
-        st.session_state.last_feedback = ""
+        go_to(BANK.neighbor(st.session_state.q_id, 1, tag, difficulty))
+    st.text_input("Jump to question id", key="jump_id", on_change=jump_to_id)
+    jump_error = st.session_state.pop("jump_error", None)
+    if jump_error:
+        st.warning(jump_error)
+    position = BANK.position(st.session_state.q_id, tag, difficulty) if st.session_state.q_id else None
+    total = BANK.count(tag, difficulty)
+    st.caption(f"Question {position + 1} of {total}" if position is not None else f"{total} matching question(s)")
 
     schema_info = load_table_schema(SCHEMA_TABLES)
     st.markdown("### Table Schema")
@@ -120,7 +196,7 @@ if not current_q:
     st.stop()
 
 question_id = str(current_q["id"])
-solution_entry = SOLUTIONS.get(question_id, {})
+solution_entry = BANK.solution(question_id)
 solution_sql = solution_entry.get("solution_sql", "").strip()
 explanation = solution_entry.get("explanation", "").strip()
 
@@ -141,30 +217,74 @@ with right_col:
                              label_visibility="collapsed")
 
     run_clicked = st.button("Run & Validate")
+    feedback_shown = False
     if run_clicked:
-        st.session_state.last_feedback = ""
+        reset_feedback()
+        analysis = analyze_sql(user_sql)
         if not user_sql.strip():
             st.warning("Enter a SQL query before running.")
-        elif not is_safe_select(user_sql):
-            st.error("Only safe SELECT queries are allowed. (No DDL/DML keywords.)")
+        elif not analysis.safe:
+            st.error(analysis.reason)
         elif not solution_sql:
             st.warning("No stored solution for this question yet. Generate it first.")
         else:
             try:
-                verdict = validate_sql_pair(user_sql, solution_sql)
-                if verdict["is_correct"]:
+                if SERVICE is not None:
+                    verdict = SERVICE.validate(question_id, user_sql)
+                else:
+                    verdict = validate_sql_pair(user_sql, solution_sql,
+                                                compare_options=solution_entry.get("compare"),
+                                                budget=solution_entry.get("budget"),
+                                                performance=solution_entry.get("performance"))
+                for warning in verdict["warnings"]:
+                    st.warning(warning)
+                perf = verdict["performance"]
+                if verdict["is_correct"] and perf and perf["too_slow"]:
+                    st.warning(f"Correct, but about {perf['time_ratio']}x slower than the official solution. "
+                               "Compare the plans below and look for a cheaper approach.")
+                elif verdict["is_correct"]:
                     st.success("Correct! Your result matches the official solution.")
+                    if verdict["shortcut"]:
+                        st.caption("Matched a known correct answer, so it was graded without running the query.")
                 else:
                     st.error("Not quite. Your result differs from the official solution.")
+                if perf:
+                    with st.expander("Performance (EXPLAIN ANALYZE)"):
+                        st.json(perf)
+                if not verdict["is_correct"]:
                     diagnostics = verdict["diagnostics"]
                     with st.expander("Diagnostics (technical)"):
                         st.json(diagnostics)
-                    feedback = get_feedback(current_q["question"], user_sql, solution_sql, explanation, diagnostics)
-                    st.session_state.last_feedback = feedback
+                    request = {
+                        "question": current_q["question"],
+                        "user_sql": user_sql,
+                        "solution_sql": solution_sql,
+                        "explanation": explanation,
+                        "diagnostics": diagnostics,
+                        "question_id": question_id,
+                    }
+                    hint = rule_feedback(user_sql, solution_sql, diagnostics) if config.FEEDBACK_RULES else None
+                    if hint:
+                        st.session_state.rule_hint = hint["hint"]
+                        st.session_state.mentor_request = dict(request, diagnostics=dict(diagnostics, likely_cause=hint["hint"]))
+                    else:
+                        feedback_shown = ask_mentor(request)
+            except QueryTooExpensive as exc:
+                st.error(f"Query too expensive: {exc}")
             except Exception as exc:
                 st.error(f"Execution error: {exc}")
 
-    if st.session_state.last_feedback:
+    if st.session_state.rule_hint:
+        st.markdown("### Hint")
+        st.info(st.session_state.rule_hint)
+        if st.session_state.mentor_request and st.button("Ask the mentor for more detail"):
+            try:
+                feedback_shown = ask_mentor(st.session_state.mentor_request)
+                st.session_state.mentor_request = None
+            except Exception as exc:
+                st.error(f"Mentor unavailable: {exc}")
+
+    if st.session_state.last_feedback and not feedback_shown:
         st.markdown("### Mentor Feedback")
         st.info(st.session_state.last_feedback)
 
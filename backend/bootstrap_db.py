@@ -1,6 +1,77 @@
-﻿from typing import Sequence
+﻿import argparse
+import io
+import random
+import time
+from datetime import date, timedelta
+from typing import Iterator, Sequence
 
+from config import config
 from backend.validate_sql import get_conn
+from backend.metrics import span
+
+DEPARTMENTS_CREATE = (
+    "CREATE TABLE IF NOT EXISTS departments ("
+    " id SERIAL PRIMARY KEY,"
+    " name VARCHAR(50) NOT NULL"
+    ")"
+)
+
+EMPLOYEES_CREATE = (
+    "CREATE TABLE IF NOT EXISTS employees ("
+    " id SERIAL PRIMARY KEY,"
+    " name VARCHAR(100) NOT NULL,"
+    " department_id INTEGER REFERENCES departments(id),"
+    " salary NUMERIC(10,2) NOT NULL,"
+    " hire_date DATE NOT NULL"
+    ")"
+)
+
+PROJECTS_CREATE = (
+    "CREATE TABLE IF NOT EXISTS projects ("
+    " id SERIAL PRIMARY KEY,"
+    " name VARCHAR(100) NOT NULL,"
+    " department_id INTEGER REFERENCES departments(id),"
+    " start_date DATE NOT NULL,"
+    " budget NUMERIC(12,2) NOT NULL"
+    ")"
+)
+
+#keep in sync with db/init.sql
+INDEXES = {
+    "idx_employees_department_id": "CREATE INDEX IF NOT EXISTS idx_employees_department_id ON employees (department_id)",
+    "idx_employees_hire_date": "CREATE INDEX IF NOT EXISTS idx_employees_hire_date ON employees (hire_date)",
+    "idx_employees_salary": "CREATE INDEX IF NOT EXISTS idx_employees_salary ON employees (salary)",
+    "idx_projects_department_id": "CREATE INDEX IF NOT EXISTS idx_projects_department_id ON projects (department_id)",
+}
+
+FOREIGN_KEYS = {
+    "employees": ("employees_department_id_fkey", "FOREIGN KEY (department_id) REFERENCES departments(id)"),
+    "projects": ("projects_department_id_fkey", "FOREIGN KEY (department_id) REFERENCES departments(id)"),
+}
+
+#rows per scale factor: SF=1 -> 10k employees, SF=100 -> 1M
+EMPLOYEES_PER_SF = 10_000
+PROJECTS_PER_SF = 500
+DEPARTMENTS_PER_SF = 12
+
+DEPARTMENT_NAMES = [
+    "Engineering", "HR", "Marketing", "Finance", "Sales", "Legal", "Support", "Operations",
+    "Research", "Design", "Security", "Data", "Procurement", "Facilities", "Compliance", "Product",
+]
+REGIONS = ["", " EMEA", " APAC", " Americas", " North", " South", " East", " West"]
+FIRST_NAMES = [
+    "Alice", "Bob", "Charlie", "Diana", "Edward", "Fay", "Grace", "Hiro", "Ines", "Jonas", "Kemal", "Lena",
+    "Maya", "Nikhil", "Olga", "Pablo", "Quinn", "Rosa", "Sven", "Tariq", "Uma", "Victor", "Wen", "Ximena",
+    "Yusuf", "Zoe", "Amara", "Bruno", "Chen", "Dmitri", "Elif", "Farah",
+]
+LAST_NAMES = [
+    "Smith", "Garcia", "Kim", "Nguyen", "Patel", "Muller", "Rossi", "Silva", "Kowalski", "Okafor", "Tanaka",
+    "Haddad", "Jensen", "Moreau", "Novak", "Ortiz", "Brown", "Ivanova", "Lopez", "Sato", "Cohen", "Ali",
+]
+PROJECT_WORDS = [
+    "Platform", "Migration", "Revamp", "Campaign", "Analytics", "Portal", "Automation", "Audit",
+    "Pipeline", "Rollout", "Upgrade", "Integration", "Dashboard", "Redesign", "Onboarding", "Forecast",
+]
 
 
 def _ensure_table(cur, name: str, create_sql: str, seed_sql: str | None = None, seed_params: Sequence[Sequence] | None = None) -> None:
@@ -15,7 +86,176 @@ def _ensure_table(cur, name: str, create_sql: str, seed_sql: str | None = None,
             cur.executemany(seed_sql, seed_params)
 
 
-def bootstrap_database() -> None:
+def _ensure_indexes(cur) -> None:
+    for create_sql in INDEXES.values():
+        cur.execute(create_sql)
+
+
+class _CopyStream(io.TextIOBase):
+    """Read-only file object over an iterator of COPY text chunks, so rows are never materialized."""
+
+    def __init__(self, chunks: Iterator[str]):
+        self._chunks = chunks
+        self._buffer = ""
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            data, self._buffer = self._buffer, ""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def _batched_lines(rows: Iterator[str], batch: int = 5000) -> Iterator[str]:
+    lines = []
+    for line in rows:
+        lines.append(line)
+        if len(lines) == batch:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+
+def _department_rows(count: int) -> Iterator[str]:
+    for i in range(count):
+        name = DEPARTMENT_NAMES[i % len(DEPARTMENT_NAMES)] + REGIONS[(i // len(DEPARTMENT_NAMES)) % len(REGIONS)]
+        if i >= len(DEPARTMENT_NAMES) * len(REGIONS):
+            name = f"{name} {i // (len(DEPARTMENT_NAMES) * len(REGIONS)) + 1}"
+        yield f"{i + 1}\t{name}\n"
+
+
+def _department_weights(rng: random.Random, count: int) -> list:
+    #Zipf-like head count: a few very large departments and a long tail of small ones
+    weights = [1.0 / (rank ** 1.1) for rank in range(1, count + 1)]
+    rng.shuffle(weights)
+    cumulative, total = [], 0.0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return cumulative
+
+
+def _employee_rows(rng: random.Random, count: int, departments: int) -> Iterator[str]:
+    cum_weights = _department_weights(rng, departments)
+    dept_ids = range(1, departments + 1)
+    names = [f"{first} {last}" for first in FIRST_NAMES for last in LAST_NAMES]
+    #each department gets its own pay level; individual salaries are right-skewed around it
+    pay_levels = [rng.lognormvariate(11.3, 0.25) for _ in dept_ids]
+    first_day = date(1995, 1, 1).toordinal()
+    day_range = date(2025, 12, 31).toordinal() - first_day
+    #hiring accelerates over time, so recent years are denser
+    hire_dates = [date.fromordinal(first_day + day).isoformat() for day in range(day_range + 1)]
+    lognorm, random_ = rng.lognormvariate, rng.random
+    batch = 10_000
+    emitted = 0
+    while emitted < count:
+        n = min(batch, count - emitted)
+        picks = rng.choices(dept_ids, cum_weights=cum_weights, k=n)
+        picked_names = rng.choices(names, k=n)
+        for dept, name in zip(picks, picked_names):
+            emitted += 1
+            salary = min(max(pay_levels[dept - 1] * lognorm(0.0, 0.35), 25_000.0), 9_999_999.0)
+            hired = hire_dates[int(day_range * random_() ** 0.6)]
+            yield f"{emitted}\t{name}\t{dept}\t{salary:.2f}\t{hired}\n"
+
+
+def _project_rows(rng: random.Random, count: int, departments: int) -> Iterator[str]:
+    cum_weights = _department_weights(rng, departments)
+    dept_ids = range(1, departments + 1)
+    first_day = date(2012, 1, 1)
+    for i in range(1, count + 1):
+        dept = rng.choices(dept_ids, cum_weights=cum_weights)[0]
+        name = f"{rng.choice(PROJECT_WORDS)} {rng.choice(PROJECT_WORDS)} {i}"
+        started = first_day + timedelta(days=rng.randrange(14 * 365))
+        budget = min(rng.lognormvariate(12.0, 0.9), 9_999_999_999.0)
+        yield f"{i}\t{name}\t{dept}\t{started.isoformat()}\t{budget:.2f}\n"
+
+
+def _dataset_marker(scale_factor: int, seed: int) -> str:
+    return f"sql-playground dataset sf={scale_factor} seed={seed}"
+
+
+def _dataset_counts(scale_factor: int) -> dict:
+    return {
+        "departments": max(4, DEPARTMENTS_PER_SF * scale_factor),
+        "employees": EMPLOYEES_PER_SF * scale_factor,
+        "projects": PROJECTS_PER_SF * scale_factor,
+    }
+
+
+def dataset_rows(scale_factor: int, seed: int) -> dict:
+    """{table: (COPY column list, tab-separated row lines)}; one shared RNG, so consume the tables in order."""
+    counts = _dataset_counts(scale_factor)
+    rng = random.Random(seed)
+    return {
+        "departments": ("id, name", _department_rows(counts["departments"])),
+        "employees": ("id, name, department_id, salary, hire_date",
+                      _employee_rows(rng, counts["employees"], counts["departments"])),
+        "projects": ("id, name, department_id, start_date, budget",
+                     _project_rows(rng, counts["projects"], counts["departments"])),
+    }
+
+
+def load_scaled_dataset(scale_factor: int, seed: int | None = None) -> dict:
+    """Replace all rows with a deterministic synthetic dataset, bulk-loaded with COPY FROM STDIN."""
+    seed = config.DATA_SEED if seed is None else seed
+    counts = _dataset_counts(scale_factor)
+    started = time.perf_counter()
+    with span("bootstrap.load", scale_factor=scale_factor), get_conn(readonly=False) as conn:
+        with conn.cursor() as cur:
+            _ensure_table(cur, "departments", DEPARTMENTS_CREATE)
+            _ensure_table(cur, "employees", EMPLOYEES_CREATE)
+            _ensure_table(cur, "projects", PROJECTS_CREATE)
+            cur.execute("TRUNCATE projects, employees, departments RESTART IDENTITY")
+            #indexes and FK checks are rebuilt in bulk after loading instead of per row
+            for index in INDEXES:
+                cur.execute(f"DROP INDEX IF EXISTS {index}")
+            for table, (constraint, _) in FOREIGN_KEYS.items():
+                cur.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {constraint}")
+
+            for table, (columns, rows) in dataset_rows(scale_factor, seed).items():
+                cur.copy_expert(f"COPY {table} ({columns}) FROM STDIN", _CopyStream(_batched_lines(rows)), size=65536)
+                cur.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), {max(counts[table], 1)})")
+
+            for table, (constraint, definition) in FOREIGN_KEYS.items():
+                cur.execute(f"ALTER TABLE {table} ADD CONSTRAINT {constraint} {definition}")
+            _ensure_indexes(cur)
+            cur.execute(f"COMMENT ON TABLE employees IS '{_dataset_marker(scale_factor, seed)}'")
+    #ANALYZE outside the load transaction so the planner sees the committed rows
+    with span("bootstrap.analyze"), get_conn(readonly=False) as conn:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE departments, employees, projects")
+    counts["seconds"] = round(time.perf_counter() - started, 2)
+    return counts
+
+
+def _current_marker(cur) -> str | None:
+    cur.execute("SELECT obj_description(to_regclass('public.employees'), 'pg_class')")
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def bootstrap_database(scale_factor: int | None = None, seed: int | None = None) -> None:
+    scale_factor = config.DATA_SCALE_FACTOR if scale_factor is None else scale_factor
+    seed = config.DATA_SEED if seed is None else seed
+    if scale_factor > 0:
+        with span("bootstrap.check"), get_conn(readonly=False) as conn:
+            with conn.cursor() as cur:
+                marker = _current_marker(cur)
+        if marker != _dataset_marker(scale_factor, seed):
+            load_scaled_dataset(scale_factor, seed)
+        return
+
     departments_seed = [
         ("Engineering",),
         ("HR",),
@@ -39,36 +279,36 @@ def bootstrap_database() -> None:
         ("ERP Migration", 4, "2019-11-20", 320000),
     ]
 
-    departments_create = (
-        "CREATE TABLE IF NOT EXISTS departments ("
-        " id SERIAL PRIMARY KEY,"
-        " name VARCHAR(50) NOT NULL"
-        ")"
-    )
-
-    employees_create = (
-        "CREATE TABLE IF NOT EXISTS employees ("
-        " id SERIAL PRIMARY KEY,"
-        " name VARCHAR(100) NOT NULL,"
-        " department_id INTEGER REFERENCES departments(id),"
-        " salary NUMERIC(10,2) NOT NULL,"
-        " hire_date DATE NOT NULL"
-        ")"
-    )
-
-    projects_create = (
-        "CREATE TABLE IF NOT EXISTS projects ("
-        " id SERIAL PRIMARY KEY,"
-        " name VARCHAR(100) NOT NULL,"
-        " department_id INTEGER REFERENCES departments(id),"
-        " start_date DATE NOT NULL,"
-        " budget NUMERIC(12,2) NOT NULL"
-        ")"
-    )
-
-    with get_conn() as conn:
+    #seeding writes, so it cannot use the read-only pooled sessions
+    with span("bootstrap.seed"), get_conn(readonly=False) as conn:
         with conn.cursor() as cur:
-            _ensure_table(cur, "departments", departments_create, "INSERT INTO departments (name) VALUES (%s)", departments_seed)
-            _ensure_table(cur, "employees", employees_create, "INSERT INTO employees (name, department_id, salary, hire_date) VALUES (%s, %s, %s, %s)", employees_seed)
-            _ensure_table(cur, "projects", projects_create, "INSERT INTO projects (name, department_id, start_date, budget) VALUES (%s, %s, %s, %s)", projects_seed)
+            _ensure_table(cur, "departments", DEPARTMENTS_CREATE, "INSERT INTO departments (name) VALUES (%s)", departments_seed)
+            _ensure_table(cur, "employees", EMPLOYEES_CREATE, "INSERT INTO employees (name, department_id, salary, hire_date) VALUES (%s, %s, %s, %s)", employees_seed)
+            _ensure_table(cur, "projects", PROJECTS_CREATE, "INSERT INTO projects (name, department_id, start_date, budget) VALUES (%s, %s, %s, %s)", projects_seed)
+            _ensure_indexes(cur)
+
+
+def table_schema(table_names: Sequence[str]) -> dict:
+    """{table: [(column, data_type), ...]} for the given public tables, in column order."""
+    with span("schema.load", tables=len(table_names)), get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT table_name, column_name, data_type
+                FROM information_schema.columns
+                WHERE table_schema = 'public' AND table_name = ANY(%s)
+                ORDER BY table_name, ordinal_position
+            """, (list(table_names),))
+            rows = cur.fetchall()
+    schema = {}
+    for table_name, column_name, data_type in rows:
+        schema.setdefault(table_name, []).append((column_name, data_type))
+    return schema
+
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load a deterministic synthetic dataset at a given scale factor.")
+    parser.add_argument("--scale-factor", "--sf", type=int, default=config.DATA_SCALE_FACTOR or 1,
+                        help="SF=1 loads 10k employees; SF=100 loads 1M")
+    parser.add_argument("--seed", type=int, default=config.DATA_SEED)
+    args = parser.parse_args()
+    print(load_scaled_dataset(args.scale_factor, args.seed))
@@ -0,0 +1,177 @@
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+
+from config import config
+from backend.metrics import span
+
+
+def _connect_kwargs(readonly: bool) -> Dict[str, Any]:
+    kwargs = {
+        "host": config.DB_HOST,
+        "port": config.DB_PORT,
+        "dbname": config.DB_NAME,
+        "user": config.DB_USER,
+        "password": config.DB_PASSWORD,
+        "application_name": "sql-playground",
+    }
+    if readonly:
+        #pin every pooled session so user SQL can never write or run forever
+        kwargs["options"] = (
+            "-c default_transaction_read_only=on "
+            f"-c statement_timeout={config.DB_STATEMENT_TIMEOUT_MS}"
+        )
+    return kwargs
+
+
+class PoolTimeout(RuntimeError):
+    """Raised when no pooled connection frees up within DB_POOL_TIMEOUT."""
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of read-only Postgres sessions with health checks."""
+
+    def __init__(self, minconn: int, maxconn: int, timeout: float, healthcheck_interval: float, **connect_kwargs):
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_interval = healthcheck_interval
+        self._pool = pg_pool.ThreadedConnectionPool(minconn, maxconn, **connect_kwargs)
+        #psycopg2 raises instead of blocking when exhausted, so callers queue on this
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._last_used: Dict[int, float] = {}
+        self._stats = {
+            "checkouts": 0,
+            "in_use": 0,
+            "peak_in_use": 0,
+            "timeouts": 0,
+            "discarded": 0,
+            "wait_total_s": 0.0,
+            "wait_max_s": 0.0,
+        }
+
+    def _healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        idle_for = time.monotonic() - self._last_used.get(id(conn), 0.0)
+        if idle_for < self.healthcheck_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise PoolTimeout(f"No database connection available after {self.timeout:.1f}s")
+        try:
+            conn = self._pool.getconn()
+            if not self._healthy(conn):
+                with self._lock:
+                    self._stats["discarded"] += 1
+                self._last_used.pop(id(conn), None)
+                self._pool.putconn(conn, close=True)
+                conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+        waited = time.monotonic() - start
+        with self._lock:
+            stats = self._stats
+            stats["checkouts"] += 1
+            stats["in_use"] += 1
+            stats["peak_in_use"] = max(stats["peak_in_use"], stats["in_use"])
+            stats["wait_total_s"] += waited
+            stats["wait_max_s"] = max(stats["wait_max_s"], waited)
+        return conn
+
+    def putconn(self, conn, close: bool = False) -> None:
+        try:
+            close = close or conn.closed != 0
+            if close:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+            self._pool.putconn(conn, close=close)
+        finally:
+            with self._lock:
+                self._stats["in_use"] -= 1
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = dict(self._stats)
+        checkouts = snapshot["checkouts"]
+        snapshot["max_size"] = self.maxconn
+        snapshot["utilization"] = snapshot["in_use"] / self.maxconn if self.maxconn else 0.0
+        snapshot["wait_avg_s"] = snapshot["wait_total_s"] / checkouts if checkouts else 0.0
+        return snapshot
+
+    def closeall(self) -> None:
+        self._pool.closeall()
+
+
+_POOL: Optional[ConnectionPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide pool, creating it on first use."""
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = ConnectionPool(
+                    config.DB_POOL_MIN,
+                    config.DB_POOL_MAX,
+                    config.DB_POOL_TIMEOUT,
+                    config.DB_POOL_HEALTHCHECK_SECONDS,
+                    **_connect_kwargs(readonly=True),
+                )
+                atexit.register(_POOL.closeall)
+    return _POOL
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Wait-time and utilization counters for the shared pool (empty until first use)."""
+    return _POOL.stats() if _POOL is not None else {}
+
+
+@contextmanager
+def get_conn(readonly: bool = True):
+    """Borrow a pooled read-only connection; readonly=False opens a one-off writer session."""
+    if not readonly:
+        conn = psycopg2.connect(**_connect_kwargs(readonly=False))
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+        return
+
+    pool = get_pool()
+    with span("db.get_conn"):
+        conn = pool.getconn()
+    broken = False
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
+        raise
+    finally:
+        pool.putconn(conn, close=broken)
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from config import config
+from backend.solution_cache import SolutionCache
+from backend.sql_analysis import analyze_sql
+
+#diagnostics fields that describe *what* went wrong; previews, timings and plan costs are left out
+DIGEST_KEYS = (
+    "user_rowcount",
+    "solution_rowcount",
+    "user_cols",
+    "solution_cols",
+    "column_mismatch",
+    "row_order_mismatch",
+    "missing_rows_example",
+    "extra_rows_example",
+    "missing_rowcount",
+    "extra_rowcount",
+    "db_diff_error",
+)
+
+
+
+def normalize_sql(sql: str) -> str:
+    """Whitespace-, case- and alias-insensitive form of a query; string literals are kept verbatim."""
+    return analyze_sql(sql).canonical
+
+
+def diagnostics_digest(diagnostics: Dict[str, Any]) -> str:
+    signature = {key: diagnostics.get(key) for key in DIGEST_KEYS if diagnostics.get(key) is not None}
+    perf = diagnostics.get("performance") or {}
+    if perf.get("too_slow"):
+        signature["too_slow"] = True
+    return hashlib.sha256(json.dumps(signature, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def feedback_key(question_id: str, user_sql: str, solution_sql: str, diagnostics: Dict[str, Any], prompt_version: str = "") -> str:
+    """Same question, same (normalized) mistake, same outcome -> same key."""
+    parts = [
+        str(question_id),
+        normalize_sql(user_sql),
+        hashlib.sha256(solution_sql.strip().encode("utf-8")).hexdigest(),
+        diagnostics_digest(diagnostics),
+        config.LLM_MODEL,
+        prompt_version,
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class FeedbackCache:
+    """In-memory LRU in front of a SQLite store; entries expire after `ttl` seconds, oldest-used go first past `max_entries`."""
+
+    def __init__(self, path: Optional[str], ttl: float, max_entries: int, memory_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._memory = SolutionCache(memory_entries)
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._path = path
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _conn(self) -> Optional[sqlite3.Connection]:
+        if self._db is None and self._path:
+            Path(self._path).parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self._path, check_same_thread=False, timeout=5)
+            #WAL lets several Streamlit processes share the file
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS feedback (
+                    key TEXT PRIMARY KEY,
+                    question_id TEXT,
+                    feedback TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS idx_feedback_last_used ON feedback(last_used)")
+            db.commit()
+            self._db = db
+        return self._db
+
+    def get(self, key: str) -> Optional[str]:
+        if self.max_entries <= 0:
+            return None
+        #memory entries carry their creation time so the TTL holds in both tiers
+        entry = self._memory.get(key)
+        now = time.time()
+        if entry is not None and now - entry[1] < self.ttl:
+            return entry[0]
+        with self._lock:
+            db = self._conn()
+            row = None
+            if db is not None:
+                row = db.execute("SELECT feedback, created_at FROM feedback WHERE key = ?", (key,)).fetchone()
+                if row is not None and now - row[1] >= self.ttl:
+                    db.execute("DELETE FROM feedback WHERE key = ?", (key,))
+                    db.commit()
+                    self.evictions += 1
+                    row = None
+                elif row is not None:
+                    db.execute("UPDATE feedback SET last_used = ? WHERE key = ?", (now, key))
+                    db.commit()
+            if row is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._memory.put(key, (row[0], row[1]))
+        return row[0]
+
+    def put(self, key: str, feedback: str, question_id: Optional[str] = None) -> None:
+        if self.max_entries <= 0 or not feedback:
+            return
+        now = time.time()
+        self._memory.put(key, (feedback, now))
+        with self._lock:
+            db = self._conn()
+            if db is None:
+                return
+            db.execute(
+                "INSERT OR REPLACE INTO feedback (key, question_id, feedback, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, question_id, feedback, now, now),
+            )
+            db.execute("DELETE FROM feedback WHERE created_at <= ?", (now - self.ttl,))
+            overflow = db.execute("SELECT count(*) FROM feedback").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                db.execute(
+                    "DELETE FROM feedback WHERE key IN (SELECT key FROM feedback ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                )
+                self.evictions += overflow
+            db.commit()
+
+    def clear(self) -> None:
+        self._memory.clear()
+        with self._lock:
+            db = self._conn()
+            if db is not None:
+                db.execute("DELETE FROM feedback")
+                db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        memory = self._memory.stats()
+        with self._lock:
+            db = self._conn()
+            stored = db.execute("SELECT count(*) FROM feedback").fetchone()[0] if db is not None else 0
+            hits = memory["hits"] + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "memory_entries": memory["entries"],
+                "stored_entries": stored,
+                "memory_hits": memory["hits"],
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
+
+
+FEEDBACK_CACHE = FeedbackCache(
+    config.FEEDBACK_CACHE_PATH,
+    config.FEEDBACK_CACHE_TTL,
+    config.FEEDBACK_CACHE_MAX_ENTRIES,
+    config.FEEDBACK_CACHE_MEMORY_SIZE,
+)
+
+
+def feedback_cache_stats() -> Dict[str, Any]:
+    return FEEDBACK_CACHE.stats()
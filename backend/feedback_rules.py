@@ -0,0 +1,139 @@
+import math
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from backend.sql_analysis import SQLAnalysis, analyze_sql
+
+HINTS = {
+    "select_star": "Your query returns every column (`SELECT *`), but this question expects only: {expected}. List those columns explicitly.",
+    "column_alias": "Your values look right, but column {user} should be named {solution}. Rename it with `AS`.",
+    "missing_columns": "Your result is missing column(s) {missing}. Check the SELECT list.",
+    "extra_columns": "Your result has extra column(s) {extra} that the question doesn't ask for.",
+    "column_set": "Your columns ({user}) don't match the expected ones ({solution}). Re-read which fields the question asks for.",
+    "column_order": "You have the right columns, but in a different order. Expected order: {solution}.",
+    "row_order": "You return the right rows, but in the wrong order. Check the sort keys and direction in your ORDER BY.",
+    "filter_boundary": "Check the boundary of your condition on `{column}`: compare `>` vs `>=` (or `<` vs `<=`) and the cutoff value you used.",
+    "missing_distinct": "Your result contains duplicate rows ({user} rows vs {solution} expected). Think about DISTINCT or GROUP BY.",
+    "missing_group_by": "You return {user} rows but {solution} are expected. The question asks for one row per group, so aggregate with GROUP BY.",
+    "missing_filter": "You return {user} rows but {solution} are expected, and your query has no WHERE clause. Which rows should be filtered out?",
+    "outer_join_nulls": "Some of your rows contain NULLs, which usually comes from an outer join keeping unmatched rows. An inner JOIN may be what you need.",
+    "inner_join_drops": "Some expected rows are missing. The expected result keeps rows without a match, which an inner JOIN drops. Consider an outer join.",
+    "precision": "Your numbers are close, but not equal, in column(s) {columns}. Check rounding, integer division, or casts.",
+    "letter_case": "Your values in column(s) {columns} differ only in letter case. Check UPPER/LOWER/INITCAP.",
+}
+
+
+def _fmt(cols) -> str:
+    return ", ".join(f"`{c}`" for c in cols)
+
+
+def _column_rules(user: SQLAnalysis, sol: SQLAnalysis, diag: Dict[str, Any]) -> Optional[Tuple[str, Dict[str, Any]]]:
+    u_cols, s_cols = diag.get("user_cols") or [], diag.get("solution_cols") or []
+    missing = [c for c in s_cols if c not in u_cols]
+    extra = [c for c in u_cols if c not in s_cols]
+    if not missing and not extra:
+        if diag.get("column_mismatch"):
+            return "column_order", {"solution": _fmt(s_cols)}
+        return None
+    if user.select_star and not sol.select_star:
+        return "select_star", {"expected": _fmt(s_cols)}
+    if len(missing) == 1 and len(extra) == 1 and diag.get("user_rowcount") == diag.get("solution_rowcount"):
+        return "column_alias", {"user": _fmt(extra), "solution": _fmt(missing)}
+    if missing and not extra:
+        return "missing_columns", {"missing": _fmt(missing)}
+    if extra and not missing:
+        return "extra_columns", {"extra": _fmt(extra)}
+    return "column_set", {"user": _fmt(u_cols), "solution": _fmt(s_cols)}
+
+
+def _scale(value) -> int:
+    """Decimal places a number is shown with (0 for whole numbers)."""
+    if isinstance(value, int) or float(value).is_integer():
+        return 0
+    return max(0, -Decimal(repr(value)).normalize().as_tuple().exponent)
+
+
+def _only_precision_differs(got, expected) -> bool:
+    #equal to float noise, or less than one unit apart at the coarser scale (1000 vs 1000.5 from integer
+    #division); a count of 5 vs 6 or a salary of 99000 vs 100000 is a wrong value, not a rounding slip
+    if not (math.isfinite(got) and math.isfinite(expected)):
+        #NaN/Infinity from float8 or numeric have no scale, and differing from them is never rounding
+        return False
+    if math.isclose(got, expected, rel_tol=1e-6):
+        return True
+    return abs(got - expected) < 10 ** -min(_scale(got), _scale(expected))
+
+
+def _value_rules(diag: Dict[str, Any]) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """Same row count, one differing row pair: compare the example rows column by column."""
+    missing, extra = diag.get("missing_rows_example"), diag.get("extra_rows_example")
+    if not missing or not extra or diag.get("user_rowcount") != diag.get("solution_rowcount"):
+        return None
+    close, cased, other = [], [], []
+    for col, expected in missing.items():
+        got = extra.get(col)
+        if got == expected:
+            continue
+        if isinstance(got, (int, float)) and isinstance(expected, (int, float)) and not isinstance(got, bool) \
+                and _only_precision_differs(got, expected):
+            close.append(col)
+        elif isinstance(got, str) and isinstance(expected, str) and got.casefold() == expected.casefold():
+            cased.append(col)
+        else:
+            other.append(col)
+    if other:
+        return None
+    if close and not cased:
+        return "precision", {"columns": _fmt(close)}
+    if cased and not close:
+        return "letter_case", {"columns": _fmt(cased)}
+    return None
+
+
+def _row_rules(user: SQLAnalysis, sol: SQLAnalysis, diag: Dict[str, Any]) -> Optional[Tuple[str, Dict[str, Any]]]:
+    if diag.get("row_order_mismatch"):
+        return "row_order", {}
+    u_rows, s_rows = diag.get("user_rowcount"), diag.get("solution_rowcount")
+    counts = {"user": u_rows, "solution": s_rows}
+    u_cmp, s_cmp = user.comparisons, sol.comparisons
+    for column in sorted(set(u_cmp) & set(s_cmp)):
+        ranged = {u_cmp[column][0], s_cmp[column][0]} & {">", ">=", "<", "<="}
+        if ranged and u_cmp[column] != s_cmp[column]:
+            return "filter_boundary", {"column": column}
+    if u_rows is None or s_rows is None or u_rows == s_rows:
+        return _value_rules(diag)
+    extra_row = diag.get("extra_rows_example") or {}
+    if u_rows > s_rows:
+        if sol.distinct and not user.distinct and not user.grouped and not diag.get("missing_rows_example"):
+            return "missing_distinct", counts
+        if sol.grouped and not user.grouped and not user.distinct:
+            return "missing_group_by", counts
+        if user.outer_join and not sol.outer_join and any(v is None for v in extra_row.values()):
+            return "outer_join_nulls", {}
+        if sol.filtered and not user.filtered:
+            return "missing_filter", counts
+        return None
+    if sol.outer_join and not user.outer_join and user.inner_join:
+        return "inner_join_drops", {}
+    #a plain "wrong number of rows" is left to the LLM mentor
+    return None
+
+
+#checked in order; the first rule that recognizes the mismatch wins
+RULES: List[Callable[[SQLAnalysis, SQLAnalysis, Dict[str, Any]], Optional[Tuple[str, Dict[str, Any]]]]] = [
+    _column_rules,
+    _row_rules,
+]
+
+
+def rule_feedback(user_sql: str, solution_sql: str, diagnostics: Dict[str, Any]) -> Optional[Dict[str, str]]:
+    """Deterministic hint for a recognizable mismatch, or None when only the LLM mentor can help."""
+    if diagnostics.get("equal") or diagnostics.get("db_diff_error"):
+        return None
+    user, sol = analyze_sql(user_sql), analyze_sql(solution_sql)
+    for rule in RULES:
+        found = rule(user, sol, diagnostics)
+        if found is not None:
+            name, params = found
+            return {"rule": name, "hint": HINTS[name].format(**params)}
+    return None
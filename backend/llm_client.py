@@ -0,0 +1,206 @@
+import asyncio
+import copy
+import hashlib
+import json
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import config
+
+
+class LLMBusy(RuntimeError):
+    """Raised when no LLM slot frees up within LLM_QUEUE_TIMEOUT."""
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[BaseException] = None
+
+
+class LLMClient:
+    """Process-wide client for the OpenAI-compatible endpoint.
+
+    One keep-alive session with retry/backoff on 429/5xx, a semaphore that caps
+    in-flight requests at what the local model can serve, and single-flight
+    deduplication so identical concurrent prompts share one completion.
+    """
+
+    def __init__(self, base_url: str, api_key: str, max_concurrency: int, connect_timeout: float,
+                 read_timeout: float, retries: int, backoff: float, queue_timeout: float):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.queue_timeout = queue_timeout
+        self.max_concurrency = max(1, max_concurrency)
+        retry = Retry(
+            total=retries,
+            read=0,
+            backoff_factor=backoff,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=frozenset({"POST"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}",
+        })
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+        self._queue_waits: Deque[float] = deque(maxlen=500)
+        self._latencies: Deque[float] = deque(maxlen=500)
+        self._stats = {
+            "requests": 0,
+            "in_flight": 0,
+            "peak_in_flight": 0,
+            "waiting": 0,
+            "deduplicated": 0,
+            "retries": 0,
+            "errors": 0,
+            "rejected": 0,
+        }
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url}/chat/completions"
+
+    def _acquire(self) -> None:
+        started = time.perf_counter()
+        with self._lock:
+            self._stats["waiting"] += 1
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+        waited = time.perf_counter() - started
+        with self._lock:
+            self._stats["waiting"] -= 1
+            if not acquired:
+                self._stats["rejected"] += 1
+            else:
+                self._queue_waits.append(waited)
+                self._stats["requests"] += 1
+                self._stats["in_flight"] += 1
+                self._stats["peak_in_flight"] = max(self._stats["peak_in_flight"], self._stats["in_flight"])
+        if not acquired:
+            raise LLMBusy(f"The LLM is busy: no slot freed up within {self.queue_timeout:g}s.")
+
+    def _release(self, started: float, resp: Optional[requests.Response], failed: bool) -> None:
+        self._slots.release()
+        retries = getattr(getattr(resp, "raw", None), "retries", None)
+        with self._lock:
+            self._stats["in_flight"] -= 1
+            self._latencies.append(time.perf_counter() - started)
+            if retries is not None:
+                self._stats["retries"] += len(retries.history)
+            if failed:
+                self._stats["errors"] += 1
+
+    def _post(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        self._acquire()
+        started, resp, failed = time.perf_counter(), None, True
+        try:
+            resp = self.session.post(self.url, data=json.dumps(payload), timeout=self.timeout)
+            resp.raise_for_status()
+            data = resp.json()
+            failed = False
+            return data
+        finally:
+            self._release(started, resp, failed)
+
+    def chat(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Blocking chat completion; concurrent calls with an identical payload share one request."""
+        key = hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self._stats["deduplicated"] += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result)
+        try:
+            flight.result = self._post(payload)
+            return copy.deepcopy(flight.result)
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def achat(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """chat() for asyncio callers; the blocking request runs in the default thread pool."""
+        return await asyncio.to_thread(self.chat, payload)
+
+    @contextmanager
+    def stream(self, payload: Dict[str, Any]) -> Iterator[requests.Response]:
+        """Streaming response that holds a concurrency slot until the block exits; closing it stops generation."""
+        self._acquire()
+        started, resp, failed = time.perf_counter(), None, True
+        try:
+            resp = self.session.post(self.url, data=json.dumps(payload), stream=True, timeout=self.timeout)
+            try:
+                resp.raise_for_status()
+                yield resp
+                failed = False
+            except GeneratorExit:
+                #the consumer stopped reading early: a cancel, not an error
+                failed = False
+                raise
+            finally:
+                resp.close()
+        finally:
+            self._release(started, resp, failed)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._queue_waits)
+            latencies = sorted(self._latencies)
+            out = dict(self._stats, max_concurrency=self.max_concurrency)
+
+        def _pct(values, q):
+            return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 1) if values else None
+
+        out.update({
+            "queue_wait_ms_p50": round(statistics.median(waits) * 1000, 1) if waits else None,
+            "queue_wait_ms_p95": _pct(waits, 0.95),
+            "queue_wait_ms_max": round(waits[-1] * 1000, 1) if waits else None,
+            "latency_ms_p50": round(statistics.median(latencies) * 1000, 1) if latencies else None,
+            "latency_ms_p95": _pct(latencies, 0.95),
+        })
+        return out
+
+
+LLM_CLIENT = LLMClient(
+    config.LLM_API_BASE,
+    config.LLM_API_KEY,
+    max_concurrency=config.LLM_MAX_CONCURRENCY,
+    connect_timeout=config.LLM_CONNECT_TIMEOUT,
+    read_timeout=config.LLM_READ_TIMEOUT,
+    retries=config.LLM_RETRIES,
+    backoff=config.LLM_RETRY_BACKOFF,
+    queue_timeout=config.LLM_QUEUE_TIMEOUT,
+)
+
+
+def llm_stats() -> Dict[str, Any]:
+    return LLM_CLIENT.stats()
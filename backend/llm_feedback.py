@@ -1,58 +1,244 @@
+import hashlib
 import json
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, Optional
+
 import requests
-from typing import Dict, Any
 
 from config import config
+from backend.llm_client import LLM_CLIENT
+from backend.feedback_cache import FEEDBACK_CACHE, feedback_key
+from backend.metrics import inc, observe, span
+from backend.prompts import SCHEMA_HINT, prompt_metrics, serialize_diagnostics
 
-HEADERS = {
-    "Content-Type": "application/json",
-    "Authorization": f"Bearer {config.LLM_API_KEY}",
-}
-
+#system prompt = instructions + schema + output rules: identical for every request, so it stays in the KV prefix cache
 FEEDBACK_SYSTEM = (
     "You are a senior SQL mentor. Be concise, specific, and actionable. "
     "Given a SQL practice question, the official solution SQL, the stored explanation, and diagnostics "
     "from comparing the user's result to the solution's result, explain: "
-    "1) what's wrong in the user's approach; 2) a hint to fix it (but do not reveal the full solution)."
+    "1) what's wrong in the user's approach; 2) a hint to fix it (but do not reveal the full solution).\n\n"
+    f"Schema:\n{SCHEMA_HINT}\n"
+    "Diagnostics are compact JSON; \"…\" marks values and rows cut to fit.\n"
+    "Write a short feedback (max ~120 words): what went wrong and one or two hints. "
+    "Do NOT reveal the entire solution SQL."
 )
 
+#per-question parts before per-attempt parts, so repeat attempts on a question share a longer prefix
 FEEDBACK_TEMPLATE = """\
 Question:
 {question}
 
-User SQL:
-{user_sql}
-
 Official Solution SQL:
 {solution_sql}
 
 Stored Explanation:
 {explanation}
 
+User SQL:
+{user_sql}
+
 Diagnostics:
 {diagnostics}
-
-Write a short feedback (max ~120 words): what went wrong and one or two hints.
-Do NOT reveal the entire solution SQL.
 """
 
-def get_feedback(question: str, user_sql: str, solution_sql: str, explanation: str, diagnostics: Dict[str, Any]) -> str:
+#any prompt edit changes this, so cached answers from an older prompt are not reused
+PROMPT_VERSION = hashlib.sha256((FEEDBACK_SYSTEM + FEEDBACK_TEMPLATE).encode("utf-8")).hexdigest()[:12]
+
+
+def _messages(question: str, user_sql: str, solution_sql: str, explanation: str, diagnostics: Dict[str, Any]):
+    return [
+        {"role": "system", "content": FEEDBACK_SYSTEM},
+        {"role": "user", "content": FEEDBACK_TEMPLATE.format(
+            question=question.strip(),
+            solution_sql=solution_sql.strip(),
+            explanation=explanation.strip(),
+            user_sql=user_sql.strip(),
+            diagnostics=serialize_diagnostics(diagnostics, config.LLM_DIAGNOSTICS_TOKENS),
+        )},
+    ]
+
+
+def _cache_key(question_id, user_sql, solution_sql, diagnostics) -> Optional[str]:
+    if question_id is None:
+        return None
+    return feedback_key(question_id, user_sql, solution_sql, diagnostics, PROMPT_VERSION)
+
+
+def get_feedback(question: str, user_sql: str, solution_sql: str, explanation: str, diagnostics: Dict[str, Any],
+                 question_id: Optional[str] = None) -> str:
+    """Blocking mentor feedback; pass question_id to serve and store repeat mistakes from the feedback cache."""
+    key = _cache_key(question_id, user_sql, solution_sql, diagnostics)
+    if key is not None:
+        cached = FEEDBACK_CACHE.get(key)
+        inc("feedback_cache_total", result="miss" if cached is None else "hit")
+        if cached is not None:
+            return cached
+    messages = _messages(question, user_sql, solution_sql, explanation, diagnostics)
     payload = {
         "model": config.LLM_MODEL,
-        "messages": [
-            {"role": "system", "content": FEEDBACK_SYSTEM},
-            {"role": "user", "content": FEEDBACK_TEMPLATE.format(
-                question=question,
-                user_sql=user_sql,
-                solution_sql=solution_sql,
-                explanation=explanation,
-                diagnostics=json.dumps(diagnostics, ensure_ascii=False, indent=2),
-            )},
-        ],
+        "messages": messages,
         "temperature": 0.2,
         "stream": False,
     }
-    resp = requests.post(f"{config.LLM_API_BASE}/chat/completions", headers=HEADERS, data=json.dumps(payload), timeout=120)
-    resp.raise_for_status()
-    data = resp.json()
-    return data["choices"][0]["message"]["content"].strip()
+    started = time.perf_counter()
+    with span("llm.feedback", model=config.LLM_MODEL, stream=False):
+        data = LLM_CLIENT.chat(payload)
+    feedback = data["choices"][0]["message"]["content"].strip()
+    metrics = prompt_metrics(messages, data.get("usage"), data.get("timings"))
+    metrics["tokens"] = (data.get("usage") or {}).get("completion_tokens")
+    metrics["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    _record_metrics(metrics)
+    if key is not None:
+        FEEDBACK_CACHE.put(key, feedback, question_id)
+    return feedback
+
+
+_RECENT: Deque[Dict[str, Any]] = deque(maxlen=100)
+_recent_lock = threading.Lock()
+
+
+def _record_metrics(metrics: Dict[str, Any]) -> None:
+    with _recent_lock:
+        _RECENT.append(metrics)
+    if metrics.get("ttft_ms") is not None:
+        observe("llm.ttft", metrics["ttft_ms"] / 1000)
+    inc("llm_tokens_total", metrics.get("prompt_tokens") or metrics.get("prompt_tokens_estimated") or 0, kind="prompt")
+    inc("llm_tokens_total", metrics.get("prompt_tokens_evaluated") or 0, kind="prompt_evaluated")
+    inc("llm_tokens_total", metrics.get("tokens") or 0, kind="completion")
+
+
+class FeedbackStream:
+    """Iterates mentor feedback chunks from an OpenAI-compatible SSE stream.
+
+    Closing the iterator (or calling cancel()) drops the HTTP connection, which
+    makes Ollama/llama.cpp stop generating. Timing lands in `metrics` and in
+    feedback_stats().
+    """
+
+    def __init__(self, messages, cache_key: Optional[str] = None, question_id: Optional[str] = None):
+        self.messages = messages
+        self.cache_key = cache_key
+        self.question_id = question_id
+        self.text = ""
+        self.metrics: Dict[str, Any] = {}
+        self._cancelled = threading.Event()
+        self._resp = None
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+        resp = self._resp
+        if resp is not None:
+            resp.close()
+
+    def __iter__(self) -> Iterator[str]:
+        payload = {
+            "model": config.LLM_MODEL,
+            "messages": self.messages,
+            "temperature": 0.2,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        }
+        started = time.perf_counter()
+        first_token_at = None
+        chunks = 0
+        usage, timings = None, None
+        completed = False
+        if self._cancelled.is_set():
+            return
+        cached = FEEDBACK_CACHE.get(self.cache_key) if self.cache_key is not None else None
+        if self.cache_key is not None:
+            inc("feedback_cache_total", result="miss" if cached is None else "hit")
+        if cached is not None:
+            self.text = cached
+            self.metrics = {"cached": True, "ttft_ms": round((time.perf_counter() - started) * 1000, 1),
+                            "tokens_per_sec": None, "completed": True, "cancelled": False}
+            yield cached
+            return
+        #the read timeout applies between chunks, so a slow model is fine as long as it keeps producing
+        try:
+            with LLM_CLIENT.stream(payload) as resp:
+                self._resp = resp
+                try:
+                    for line in resp.iter_lines(decode_unicode=True):
+                        if self._cancelled.is_set():
+                            break
+                        if not line or not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            break
+                        event = json.loads(data)
+                        if event.get("usage"):
+                            usage = event["usage"]
+                        if event.get("timings"):
+                            timings = event["timings"]
+                        for choice in event.get("choices") or []:
+                            content = (choice.get("delta") or {}).get("content")
+                            if content:
+                                if first_token_at is None:
+                                    first_token_at = time.perf_counter()
+                                chunks += 1
+                                self.text += content
+                                yield content
+                    completed = not self._cancelled.is_set()
+                except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError, AttributeError):
+                    #cancel() closing the socket under iter_lines surfaces as one of these
+                    if not self._cancelled.is_set():
+                        raise
+            if completed and self.cache_key is not None:
+                FEEDBACK_CACHE.put(self.cache_key, self.text.strip(), self.question_id)
+        finally:
+            self._record(started, first_token_at, chunks, completed, usage, timings)
+
+    def _record(self, started: float, first_token_at: Optional[float], chunks: int, completed: bool,
+                usage: Optional[Dict[str, Any]], timings: Optional[Dict[str, Any]]) -> None:
+        ended = time.perf_counter()
+        tokens = (usage or {}).get("completion_tokens") or chunks
+        generating = ended - first_token_at if first_token_at is not None else 0.0
+        self.metrics = {
+            "ttft_ms": round((first_token_at - started) * 1000, 1) if first_token_at is not None else None,
+            "total_ms": round((ended - started) * 1000, 1),
+            "tokens": tokens,
+            #decode rate: tokens after the first over the time spent producing them
+            "tokens_per_sec": round((tokens - 1) / generating, 1) if tokens > 1 and generating > 0 else None,
+            "completed": completed,
+            "cancelled": not completed,
+        }
+        self.metrics.update(prompt_metrics(self.messages, usage, timings))
+        observe("llm.stream", ended - started)
+        _record_metrics(self.metrics)
+
+
+def stream_feedback(question: str, user_sql: str, solution_sql: str, explanation: str, diagnostics: Dict[str, Any],
+                    question_id: Optional[str] = None) -> FeedbackStream:
+    """Streaming variant of get_feedback; nothing is sent until the result is iterated."""
+    return FeedbackStream(_messages(question, user_sql, solution_sql, explanation, diagnostics),
+                          _cache_key(question_id, user_sql, solution_sql, diagnostics), question_id)
+
+
+def _median(values):
+    values = [v for v in values if v is not None]
+    return statistics.median(values) if values else None
+
+
+def feedback_stats() -> Dict[str, Any]:
+    """Streaming latency, throughput and prompt size over the last 100 LLM calls."""
+    with _recent_lock:
+        recent = list(_RECENT)
+    streams = [m for m in recent if "ttft_ms" in m]
+    ttft = [m["ttft_ms"] for m in streams if m["ttft_ms"] is not None]
+    rates = [m["tokens_per_sec"] for m in streams if m["tokens_per_sec"] is not None]
+    return {
+        "calls": len(recent),
+        "streams": len(streams),
+        "cancelled": sum(1 for m in streams if m["cancelled"]),
+        "ttft_ms_p50": statistics.median(ttft) if ttft else None,
+        "ttft_ms_max": max(ttft) if ttft else None,
+        "tokens_per_sec_mean": round(statistics.mean(rates), 1) if rates else None,
+        "prompt_tokens_p50": _median(m.get("prompt_tokens") or m.get("prompt_tokens_estimated") for m in recent),
+        "prompt_tokens_evaluated_p50": _median(m.get("prompt_tokens_evaluated") for m in recent),
+        "prompt_eval_ms_p50": _median(m.get("prompt_eval_ms") for m in recent),
+    }
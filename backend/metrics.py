@@ -0,0 +1,256 @@
+import bisect
+import json
+import logging
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from config import config
+
+#stage latencies in seconds, from a pooled checkout to a slow LLM answer
+BUCKETS: Tuple[float, ...] = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES: Tuple[float, ...] = (0.5, 0.95, 0.99)
+PREFIX = "sqlplay_"
+
+#read on every span; tests and the load harness flip it at runtime
+ENABLED = config.METRICS_ENABLED
+LOG = logging.getLogger("sqlplay.metrics")
+if config.METRICS_LOG and not LOG.handlers:
+    #one JSON object per line on stderr, ready for a log shipper
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    LOG.addHandler(_handler)
+    LOG.setLevel(logging.INFO)
+    LOG.propagate = False
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Histogram:
+    """Cumulative Prometheus buckets plus a window of recent samples for p50/p95/p99."""
+
+    __slots__ = ("counts", "total", "count", "recent")
+
+    def __init__(self, window: int):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+        self.recent: Deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float) -> None:
+        i = bisect.bisect_left(BUCKETS, seconds)
+        if i < len(BUCKETS):
+            self.counts[i] += 1
+        self.total += seconds
+        self.count += 1
+        self.recent.append(seconds)
+
+    def quantiles(self) -> Dict[float, Optional[float]]:
+        ordered = sorted(self.recent)
+        if not ordered:
+            return {q: None for q in QUANTILES}
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in QUANTILES}
+
+
+class Registry:
+    """Thread-safe histograms and counters keyed by (name, labels)."""
+
+    def __init__(self, window: int):
+        self.window = window
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, LabelKey], Histogram] = {}
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+
+    def observe(self, name: str, seconds: float, labels: LabelKey) -> None:
+        with self._lock:
+            hist = self._histograms.get((name, labels))
+            if hist is None:
+                hist = self._histograms[(name, labels)] = Histogram(self.window)
+            hist.observe(seconds)
+
+    def inc(self, name: str, value: float, labels: LabelKey) -> None:
+        with self._lock:
+            self._counters[(name, labels)] = self._counters.get((name, labels), 0) + value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self) -> Tuple[Dict[Tuple[str, LabelKey], Tuple[List[int], float, int, Dict[float, Optional[float]]]],
+                                Dict[Tuple[str, LabelKey], float]]:
+        with self._lock:
+            histograms = {key: (list(h.counts), h.total, h.count, h.quantiles()) for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+        return histograms, counters
+
+
+REGISTRY = Registry(config.METRICS_WINDOW)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+    def set(self, **fields) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    """Times a block into stage_seconds{stage=...}; set() adds fields to its JSON log line."""
+
+    __slots__ = ("stage", "fields", "started")
+
+    def __init__(self, stage: str, fields: Dict[str, Any]):
+        self.stage = stage
+        self.fields = fields
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        seconds = time.perf_counter() - self.started
+        labels = (("stage", self.stage),)
+        REGISTRY.observe("stage_seconds", seconds, labels)
+        if exc_type is not None:
+            REGISTRY.inc("stage_errors_total", 1, labels + (("error", exc_type.__name__),))
+        if config.METRICS_LOG and LOG.isEnabledFor(logging.INFO):
+            record = {"event": "span", "stage": self.stage, "ms": round(seconds * 1000, 3), **self.fields}
+            if exc_type is not None:
+                record["error"] = exc_type.__name__
+            LOG.info(json.dumps(record, default=str))
+        return False
+
+    def set(self, **fields) -> None:
+        self.fields.update(fields)
+
+
+def span(stage: str, **fields):
+    """`with span("grade.user_query"):` times the block; a shared no-op when metrics are disabled."""
+    if not ENABLED:
+        return _NOOP
+    return Span(stage, fields)
+
+
+def observe(stage: str, seconds: float) -> None:
+    """Record a duration measured elsewhere (e.g. LLM time to first token)."""
+    if ENABLED:
+        REGISTRY.observe("stage_seconds", seconds, (("stage", stage),))
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    """Add to a counter such as rows_fetched_total{source="user"}."""
+    if ENABLED and value:
+        REGISTRY.inc(name, value, _labels(labels))
+
+
+def _fmt_labels(labels: LabelKey, *extra: Tuple[str, str]) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def render_prometheus() -> str:
+    """Prometheus text exposition: histograms, a pNN gauge per stage over the recent window, and counters."""
+    histograms, counters = REGISTRY.snapshot()
+    lines: List[str] = []
+    typed = set()
+    for (name, labels), (counts, total, count, _) in sorted(histograms.items()):
+        metric = PREFIX + name
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, n in zip(BUCKETS, counts):
+            cumulative += n
+            lines.append(f"{metric}_bucket{_fmt_labels(labels, ('le', repr(bound)))} {cumulative}")
+        lines.append(f"{metric}_bucket{_fmt_labels(labels, ('le', '+Inf'))} {count}")
+        lines.append(f"{metric}_sum{_fmt_labels(labels)} {total:.6f}")
+        lines.append(f"{metric}_count{_fmt_labels(labels)} {count}")
+    for (name, labels), (_, _, _, quantiles) in sorted(histograms.items()):
+        metric = f"{PREFIX}{name}_recent"
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f"# TYPE {metric} gauge")
+        for q, value in quantiles.items():
+            if value is not None:
+                lines.append(f"{metric}{_fmt_labels(labels, ('quantile', str(q)))} {value:.6f}")
+    for (name, labels), value in sorted(counters.items()):
+        metric = PREFIX + name
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric}{_fmt_labels(labels)} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_stats() -> Dict[str, Any]:
+    """Per-stage count and p50/p95/p99 in ms, plus counters, for JSON logs and scripts."""
+    histograms, counters = REGISTRY.snapshot()
+    stages = {}
+    for (name, labels), (_, total, count, quantiles) in histograms.items():
+        if name != "stage_seconds":
+            continue
+        row = {"count": count, "mean_ms": round(total / count * 1000, 3) if count else None}
+        for q, value in quantiles.items():
+            row[f"p{int(q * 100)}_ms"] = round(value * 1000, 3) if value is not None else None
+        stages[dict(labels)["stage"]] = row
+    return {
+        "stages": stages,
+        "counters": {name + _fmt_labels(labels): value for (name, labels), value in sorted(counters.items())},
+    }
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] == "/metrics":
+            body, ctype = render_prometheus().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path.split("?")[0] == "/metrics.json":
+            body, ctype = json.dumps(metrics_stats()).encode("utf-8"), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: Optional[int] = None, host: str = "127.0.0.1") -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics (Prometheus) and /metrics.json from a daemon thread; idempotent, port 0 disables it."""
+    global _server
+    port = config.METRICS_PORT if port is None else port
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    return _server
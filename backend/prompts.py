@@ -0,0 +1,100 @@
+import json
+from typing import Any, Dict, Optional
+
+#static text goes first in every prompt so llama.cpp/Ollama can reuse the cached KV prefix across requests
+SCHEMA_HINT = """\
+Tables:
+- departments(id SERIAL PRIMARY KEY, name VARCHAR(50) NOT NULL)
+- employees(id SERIAL PRIMARY KEY, name VARCHAR(100) NOT NULL,
+            department_id INTEGER REFERENCES departments(id),
+            salary NUMERIC(10,2) NOT NULL, hire_date DATE NOT NULL)
+- projects(id SERIAL PRIMARY KEY, name VARCHAR(100) NOT NULL,
+           department_id INTEGER REFERENCES departments(id),
+           start_date DATE NOT NULL, budget NUMERIC(12,2) NOT NULL)
+"""
+
+#(max example rows, max columns per row, max string length), tried from loosest to tightest
+_COMPACTION_LEVELS = ((5, 12, 80), (3, 8, 40), (1, 6, 24), (1, 4, 12), (0, 0, 12))
+_PERF_KEYS = ("time_ratio", "max_ratio", "too_slow", "extra_node_types", "missing_node_types")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English/SQL); good enough for budgeting."""
+    return (len(text) + 3) // 4
+
+
+def _clip(value: Any, max_str: int) -> Any:
+    if isinstance(value, str) and len(value) > max_str:
+        return value[:max_str] + "…"
+    return value
+
+
+def _clip_row(row: Optional[Dict[str, Any]], max_cols: int, max_str: int):
+    if not isinstance(row, dict):
+        return row
+    items = list(row.items())
+    out = {k: _clip(v, max_str) for k, v in items[:max_cols]}
+    if len(items) > max_cols:
+        out["…"] = f"+{len(items) - max_cols} more columns"
+    return out
+
+
+def _clip_list(values, limit: int, max_str: int):
+    out = [_clip(v, max_str) for v in values[:limit]]
+    if len(values) > limit:
+        out.append(f"+{len(values) - limit} more")
+    return out
+
+
+def _compact(diagnostics: Dict[str, Any], max_rows: int, max_cols: int, max_str: int) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for key, value in diagnostics.items():
+        if key == "equal":
+            continue
+        if key == "performance" and isinstance(value, dict):
+            out[key] = {k: value[k] for k in _PERF_KEYS if k in value}
+        elif key.endswith("_example"):
+            if max_rows:
+                out[key] = _clip_row(value, max_cols, max_str)
+        elif key in ("missing_rows", "extra_rows") and isinstance(value, list):
+            if max_rows > 1:
+                out[key] = [dict(item, row=_clip_row(item.get("row"), max_cols, max_str)) for item in value[:max_rows - 1]]
+        elif key.endswith("_cols") and isinstance(value, list):
+            out[key] = _clip_list(value, max(max_cols, 4), max_str)
+        elif key == "column_mismatch" and isinstance(value, dict):
+            out[key] = {side: _clip_list(cols, max(max_cols, 4), max_str) for side, cols in value.items()}
+        else:
+            out[key] = _clip(value, max(max_str, 80))
+    return out
+
+
+def serialize_diagnostics(diagnostics: Dict[str, Any], max_tokens: int) -> str:
+    """Compact JSON for the prompt, shrinking example rows, columns and strings until it fits max_tokens."""
+    text = ""
+    for max_rows, max_cols, max_str in _COMPACTION_LEVELS:
+        text = json.dumps(_compact(diagnostics, max_rows, max_cols, max_str),
+                          ensure_ascii=False, separators=(",", ":"), default=str)
+        if estimate_tokens(text) <= max_tokens:
+            return text
+    #still over budget at the tightest level: hard cut, which the model tolerates better than no diagnostics
+    return text[:max_tokens * 4]
+
+
+def prompt_metrics(messages, usage: Optional[Dict[str, Any]], timings: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Prompt size and prompt-eval cost from the server's usage/timings, with a local estimate as fallback.
+
+    `prompt_tokens_evaluated` comes from llama.cpp's timings (tokens not served from the
+    prefix cache) or from usage.prompt_tokens_details.cached_tokens where the server reports it.
+    """
+    usage, timings = usage or {}, timings or {}
+    prompt_tokens = usage.get("prompt_tokens")
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+    evaluated = timings.get("prompt_n")
+    if evaluated is None and prompt_tokens is not None and cached is not None:
+        evaluated = prompt_tokens - cached
+    return {
+        "prompt_tokens": prompt_tokens,
+        "prompt_tokens_estimated": sum(estimate_tokens(m["content"]) for m in messages),
+        "prompt_tokens_evaluated": evaluated,
+        "prompt_eval_ms": timings.get("prompt_ms"),
+    }
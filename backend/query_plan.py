@@ -0,0 +1,156 @@
+import statistics
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import psycopg2
+from psycopg2 import sql as pgsql
+
+from config import config
+from backend.db_pool import get_conn
+from backend.sql_analysis import statement_body
+
+
+class QueryTooExpensive(ValueError):
+    """Raised when a user query is over its cost, row, or time budget."""
+
+
+def explain(cur, sql_text: str, analyze: bool = False) -> Dict[str, Any]:
+    """Return the top-level EXPLAIN (FORMAT JSON) document for a statement."""
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+    cur.execute(pgsql.SQL("EXPLAIN ({options}) {query}").format(
+        options=pgsql.SQL(options),
+        query=pgsql.SQL(statement_body(sql_text)),
+    ))
+    doc = cur.fetchone()[0]
+    return doc[0] if isinstance(doc, list) else doc
+
+
+class QueryGuard:
+    """Admission control plus hard per-session limits for one user query.
+
+    budget is the question's optional `budget:` block in solutions.yaml
+    (max_cost, warn_cost, max_rows, timeout_ms); anything missing falls back to config.
+    """
+
+    def __init__(self, budget: Optional[Dict[str, Any]] = None):
+        budget = budget or {}
+        self.max_cost = float(budget.get("max_cost", config.QUERY_MAX_COST))
+        self.warn_cost = float(budget.get("warn_cost", config.QUERY_WARN_COST))
+        self.max_plan_rows = float(budget.get("max_rows", config.QUERY_MAX_PLAN_ROWS))
+        self.max_fetch_rows = config.USER_MAX_FETCH_ROWS
+        self.timeout_ms = int(budget.get("timeout_ms", config.USER_STATEMENT_TIMEOUT_MS))
+        self.work_mem = config.USER_WORK_MEM
+        self._deadline: Optional[float] = None
+        self.estimate: Optional[Dict[str, float]] = None
+        self.warnings: List[str] = []
+
+    def apply_limits(self, cur) -> None:
+        #transaction-local, so the pooled session's defaults come back on return
+        cur.execute(
+            "SELECT set_config('statement_timeout', %s, true), set_config('work_mem', %s, true)",
+            (str(self.timeout_ms), self.work_mem),
+        )
+
+    def admit(self, cur, sql_text: str) -> None:
+        """Apply limits, then reject or warn based on the planner's estimates."""
+        self.apply_limits(cur)
+        plan = explain(cur, sql_text)["Plan"]
+        cost, rows = float(plan["Total Cost"]), float(plan["Plan Rows"])
+        self.estimate = {"total_cost": cost, "plan_rows": rows}
+        if cost > self.max_cost:
+            raise QueryTooExpensive(
+                f"Estimated cost {cost:,.0f} is over this question's budget of {self.max_cost:,.0f}. "
+                "Check for a missing join condition or an unfiltered cross join."
+            )
+        if rows > self.max_plan_rows:
+            raise QueryTooExpensive(
+                f"Estimated {rows:,.0f} result rows is over the limit of {self.max_plan_rows:,.0f}."
+            )
+        if cost > self.warn_cost:
+            self.warnings.append(f"Estimated cost {cost:,.0f} is high for this question (warning above {self.warn_cost:,.0f}).")
+
+    def start_clock(self) -> None:
+        """Start the wall-clock budget; call right before the user query executes."""
+        self._deadline = time.monotonic() + self.timeout_ms / 1000 if self.timeout_ms > 0 else None
+
+    def check_deadline(self, conn) -> None:
+        """Between batches of a server-side cursor: fail once over budget, else cap the next FETCH at what is left.
+
+        statement_timeout applies per FETCH, so without this a slowly streaming query could run for
+        many multiples of timeout_ms.
+        """
+        if self._deadline is None:
+            return
+        remaining_ms = int((self._deadline - time.monotonic()) * 1000)
+        if remaining_ms <= 0:
+            raise QueryTooExpensive(self._timeout_message())
+        with conn.cursor() as cur:
+            cur.execute("SELECT set_config('statement_timeout', %s, true)", (str(remaining_ms),))
+
+    def _timeout_message(self) -> str:
+        return f"Query ran longer than the {self.timeout_ms / 1000:g}s time limit."
+
+    def check_rowcount(self, rowcount: int) -> None:
+        if rowcount > self.max_fetch_rows:
+            raise QueryTooExpensive(f"Query returned more than {self.max_fetch_rows:,} rows.")
+
+    def translate(self, exc: psycopg2.Error) -> Exception:
+        #a statement_timeout cancel reads the same as a manual cancel apart from its message
+        if isinstance(exc, psycopg2.errors.QueryCanceled) and "statement timeout" in str(exc):
+            return QueryTooExpensive(self._timeout_message())
+        return exc
+
+
+def _node_types(plan: Dict[str, Any], counts: Counter) -> Counter:
+    counts[plan["Node Type"]] += 1
+    for child in plan.get("Plans", []):
+        _node_types(child, counts)
+    return counts
+
+
+def profile_query(sql_text: str, runs: Optional[int] = None, guard: Optional[QueryGuard] = None) -> Dict[str, Any]:
+    """Median of `runs` warm EXPLAIN (ANALYZE, BUFFERS) executions, after one discarded warm-up run."""
+    runs = max(1, runs or config.PERF_RUNS)
+    samples = []
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            if guard is not None:
+                guard.apply_limits(cur)
+            try:
+                explain(cur, sql_text, analyze=True)
+                for _ in range(runs):
+                    samples.append(explain(cur, sql_text, analyze=True))
+            except psycopg2.Error as exc:
+                translated = guard.translate(exc) if guard is not None else exc
+                if translated is not exc:
+                    raise translated from exc
+                raise
+    exec_ms = [doc["Execution Time"] for doc in samples]
+    median_ms = statistics.median(exec_ms)
+    #buffers and plan shape come from the run closest to the median
+    doc = min(samples, key=lambda d: abs(d["Execution Time"] - median_ms))
+    plan = doc["Plan"]
+    return {
+        "execution_ms": round(median_ms, 3),
+        "planning_ms": round(statistics.median(d["Planning Time"] for d in samples), 3),
+        "runs": runs,
+        "shared_hit_blocks": plan.get("Shared Hit Blocks", 0),
+        "shared_read_blocks": plan.get("Shared Read Blocks", 0),
+        "node_types": dict(sorted(_node_types(plan, Counter()).items())),
+    }
+
+
+def compare_performance(user: Dict[str, Any], sol: Dict[str, Any], max_ratio: float) -> Dict[str, Any]:
+    """Execution-time ratio and plan-shape differences; sub-millisecond solutions are floored to PERF_MIN_MS."""
+    floor = config.PERF_MIN_MS
+    ratio = max(user["execution_ms"], floor) / max(sol["execution_ms"], floor)
+    return {
+        "user": user,
+        "solution": sol,
+        "time_ratio": round(ratio, 2),
+        "max_ratio": max_ratio,
+        "too_slow": ratio > max_ratio,
+        "extra_node_types": sorted(set(user["node_types"]) - set(sol["node_types"])),
+        "missing_node_types": sorted(set(sol["node_types"]) - set(user["node_types"])),
+    }
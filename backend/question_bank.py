@@ -0,0 +1,256 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+
+#bump when the index layout or the compile step changes; older index files are rebuilt
+INDEX_VERSION = 1
+DIFFICULTY_ORDER = ("easy", "medium", "hard")
+
+
+def _file_stat(path: Path) -> Tuple[int, int]:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return 0, -1
+    return st.st_mtime_ns, st.st_size
+
+
+def _file_hash(path: Path) -> str:
+    if not path.exists():
+        return ""
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load_yaml(path: Path):
+    if not path.exists():
+        return None
+    with path.open("r", encoding="utf-8-sig") as f:
+        #libyaml's loader is several times faster when PyYAML was built with it
+        return yaml.load(f, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+
+
+def _question_entries(raw) -> List[Dict[str, Any]]:
+    """A list of {id, question, ...}, a dict keyed by id, or either wrapped under a root `questions:` key."""
+    if isinstance(raw, dict) and "questions" in raw:
+        raw = raw["questions"]
+    if isinstance(raw, dict):
+        raw = [dict(value, id=key) for key, value in raw.items() if isinstance(value, dict)]
+    entries = []
+    for item in raw or []:
+        if isinstance(item, dict) and "id" in item and "question" in item:
+            entries.append(dict(item, id=str(item["id"]), question=str(item["question"]).strip()))
+    return entries
+
+
+def _tags(entry: Dict[str, Any]) -> List[str]:
+    tags = entry.get("tags") or []
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    return sorted({str(tag).strip().lower() for tag in tags if str(tag).strip()})
+
+
+class QuestionBank:
+    """questions.yaml and solutions.yaml compiled into a SQLite index, rebuilt only when a source changes.
+
+    refresh() costs two stat() calls while nothing changed; a changed mtime is confirmed with a
+    content hash before rebuilding. Questions and solutions are read one at a time by id.
+    """
+
+    def __init__(self, questions_path: Path, solutions_path: Path, index_path: Optional[str]):
+        self.sources = {"questions": Path(questions_path), "solutions": Path(solutions_path)}
+        self._path = index_path or ":memory:"
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._seen: Dict[str, Tuple[int, int]] = {}
+        self.rebuilds = 0
+        self.hash_checks = 0
+        self.last_build_ms: Optional[float] = None
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            if self._path != ":memory:":
+                Path(self._path).parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self._path, check_same_thread=False, timeout=5)
+            db.execute("PRAGMA journal_mode=WAL")
+            if db.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+                db.executescript("""
+                    DROP TABLE IF EXISTS sources;
+                    DROP TABLE IF EXISTS questions;
+                    DROP TABLE IF EXISTS question_tags;
+                    DROP TABLE IF EXISTS solutions;
+                """)
+            db.executescript(f"""
+                CREATE TABLE IF NOT EXISTS sources (
+                    name TEXT PRIMARY KEY, path TEXT NOT NULL, mtime_ns INTEGER NOT NULL,
+                    size INTEGER NOT NULL, sha256 TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS questions (
+                    position INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE,
+                    difficulty TEXT, entry TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_questions_difficulty ON questions(difficulty, position);
+                CREATE TABLE IF NOT EXISTS question_tags (
+                    tag TEXT NOT NULL, id TEXT NOT NULL, PRIMARY KEY (tag, id)
+                );
+                CREATE TABLE IF NOT EXISTS solutions (id TEXT PRIMARY KEY, entry TEXT NOT NULL);
+                PRAGMA user_version = {INDEX_VERSION};
+            """)
+            self._db = db
+        return self._db
+
+    def _stale(self, db: sqlite3.Connection) -> Dict[str, Tuple[int, int, str]]:
+        """Sources whose content changed since the index was built, with their new (mtime, size, hash)."""
+        changed = {}
+        for name, path in self.sources.items():
+            stat = _file_stat(path)
+            if self._seen.get(name) == stat:
+                continue
+            row = db.execute("SELECT path, mtime_ns, size, sha256 FROM sources WHERE name = ?", (name,)).fetchone()
+            if row is not None and row[0] == str(path) and (row[1], row[2]) == stat:
+                self._seen[name] = stat
+                continue
+            self.hash_checks += 1
+            digest = _file_hash(path)
+            if row is not None and row[0] == str(path) and row[3] == digest:
+                #touched but unchanged: remember the new mtime so the next check is a stat again
+                db.execute("UPDATE sources SET mtime_ns = ?, size = ? WHERE name = ?", (stat[0], stat[1], name))
+                db.commit()
+                self._seen[name] = stat
+                continue
+            changed[name] = (stat[0], stat[1], digest)
+        return changed
+
+    def _rebuild(self, db: sqlite3.Connection, changed: Dict[str, Tuple[int, int, str]]) -> None:
+        started = time.perf_counter()
+        #parse outside the write transaction so other processes keep reading the old index meanwhile
+        questions = _question_entries(_load_yaml(self.sources["questions"])) if "questions" in changed else None
+        raw_solutions = _load_yaml(self.sources["solutions"]) if "solutions" in changed else None
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            if questions is not None:
+                db.execute("DELETE FROM questions")
+                db.execute("DELETE FROM question_tags")
+                seen = set()
+                for position, entry in enumerate(questions):
+                    if entry["id"] in seen:
+                        continue
+                    seen.add(entry["id"])
+                    difficulty = entry.get("difficulty")
+                    db.execute(
+                        "INSERT INTO questions (position, id, difficulty, entry) VALUES (?, ?, ?, ?)",
+                        (position, entry["id"], str(difficulty).lower() if difficulty else None,
+                         json.dumps(entry, default=str)),
+                    )
+                    db.executemany("INSERT INTO question_tags (tag, id) VALUES (?, ?)",
+                                   [(tag, entry["id"]) for tag in _tags(entry)])
+            if "solutions" in changed:
+                db.execute("DELETE FROM solutions")
+                if isinstance(raw_solutions, dict):
+                    db.executemany(
+                        "INSERT OR REPLACE INTO solutions (id, entry) VALUES (?, ?)",
+                        [(str(key), json.dumps(value, default=str))
+                         for key, value in raw_solutions.items() if isinstance(value, dict)],
+                    )
+            for name, (mtime_ns, size, digest) in changed.items():
+                db.execute(
+                    "INSERT OR REPLACE INTO sources (name, path, mtime_ns, size, sha256) VALUES (?, ?, ?, ?, ?)",
+                    (name, str(self.sources[name]), mtime_ns, size, digest),
+                )
+        for name, (mtime_ns, size, _) in changed.items():
+            self._seen[name] = (mtime_ns, size)
+        self.rebuilds += 1
+        self.last_build_ms = (time.perf_counter() - started) * 1000
+
+    def refresh(self) -> bool:
+        """Rebuild the index if a source file changed; returns True when it did."""
+        with self._lock:
+            db = self._conn()
+            changed = self._stale(db)
+            if changed:
+                self._rebuild(db, changed)
+            return bool(changed)
+
+    @staticmethod
+    def _where(tag: Optional[str], difficulty: Optional[str], *extra: Tuple[str, Any]) -> Tuple[str, List[Any]]:
+        """WHERE clause over `questions q` for the filters plus any extra (clause, param) pairs."""
+        clauses, params = [], []
+        if difficulty:
+            clauses.append("q.difficulty = ?")
+            params.append(difficulty.lower())
+        if tag:
+            clauses.append("EXISTS (SELECT 1 FROM question_tags t WHERE t.id = q.id AND t.tag = ?)")
+            params.append(tag.lower())
+        for clause, param in extra:
+            clauses.append(clause)
+            params.append(param)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def _query(self, sql: str, params=()) -> List[tuple]:
+        with self._lock:
+            return self._conn().execute(sql, params).fetchall()
+
+    def count(self, tag: Optional[str] = None, difficulty: Optional[str] = None) -> int:
+        where, params = self._where(tag, difficulty)
+        return self._query(f"SELECT count(*) FROM questions q{where}", params)[0][0]
+
+    def ids(self, tag: Optional[str] = None, difficulty: Optional[str] = None) -> List[str]:
+        where, params = self._where(tag, difficulty)
+        return [row[0] for row in self._query(f"SELECT q.id FROM questions q{where} ORDER BY q.position", params)]
+
+    def position(self, qid: str, tag: Optional[str] = None, difficulty: Optional[str] = None) -> Optional[int]:
+        """0-based position of a question among those matching the filters, or None if it doesn't match."""
+        where, params = self._where(tag, difficulty, ("q.id = ?", str(qid)))
+        if not self._query(f"SELECT 1 FROM questions q{where}", params):
+            return None
+        where, params = self._where(tag, difficulty, ("q.position < (SELECT position FROM questions WHERE id = ?)", str(qid)))
+        return self._query(f"SELECT count(*) FROM questions q{where}", params)[0][0]
+
+    def neighbor(self, qid: Optional[str], step: int, tag: Optional[str] = None,
+                 difficulty: Optional[str] = None) -> Optional[str]:
+        """Next (step > 0) or previous question id among those matching the filters; the first one if qid is None."""
+        if qid is None:
+            where, params = self._where(tag, difficulty)
+            order = "ASC"
+        else:
+            op, order = (">", "ASC") if step > 0 else ("<", "DESC")
+            where, params = self._where(tag, difficulty, (f"q.position {op} (SELECT position FROM questions WHERE id = ?)", str(qid)))
+        rows = self._query(f"SELECT q.id FROM questions q{where} ORDER BY q.position {order} LIMIT 1", params)
+        return rows[0][0] if rows else None
+
+    def question(self, qid: str) -> Optional[Dict[str, Any]]:
+        rows = self._query("SELECT entry FROM questions WHERE id = ?", (str(qid),))
+        return json.loads(rows[0][0]) if rows else None
+
+    def solution(self, qid: str) -> Dict[str, Any]:
+        rows = self._query("SELECT entry FROM solutions WHERE id = ?", (str(qid),))
+        return json.loads(rows[0][0]) if rows else {}
+
+    def tags(self) -> List[str]:
+        return [row[0] for row in self._query("SELECT DISTINCT tag FROM question_tags ORDER BY tag")]
+
+    def difficulties(self) -> List[str]:
+        found = [row[0] for row in self._query("SELECT DISTINCT difficulty FROM questions WHERE difficulty IS NOT NULL")]
+        rank = {name: i for i, name in enumerate(DIFFICULTY_ORDER)}
+        return sorted(found, key=lambda d: (rank.get(d, len(rank)), d))
+
+    def stats(self) -> Dict[str, Any]:
+        questions = self._query("SELECT count(*) FROM questions")[0][0]
+        solutions = self._query("SELECT count(*) FROM solutions")[0][0]
+        return {
+            "questions": questions,
+            "solutions": solutions,
+            "rebuilds": self.rebuilds,
+            "hash_checks": self.hash_checks,
+            "last_build_ms": round(self.last_build_ms, 1) if self.last_build_ms is not None else None,
+        }
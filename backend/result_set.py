@@ -0,0 +1,306 @@
+from collections import Counter
+from datetime import date, datetime, time, timezone
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+NUMERIC_KINDS = {"int", "float", "bool", "null"}
+#Postgres text cannot contain NUL, so these prefixes never collide with real strings
+_NULL_KEY = "\x00"
+_OTHER_PREFIX = "\x01"
+
+
+#Normalize certain types (e.g. Decimal to float) for JSON serialization
+def normalize_val(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return value
+
+
+class Column:
+    """One result column: a NumPy array when every value is numeric, otherwise a plain list."""
+
+    __slots__ = ("kind", "values", "nulls")
+
+    def __init__(self, kind: str, values, nulls: Optional[np.ndarray] = None):
+        self.kind = kind
+        self.values = values
+        self.nulls = nulls
+
+    @classmethod
+    def from_values(cls, values: List[Any]) -> "Column":
+        types = {type(v) for v in values if v is not None}
+        has_null = any(v is None for v in values)
+        if not types:
+            return cls("null", np.full(len(values), np.nan), np.ones(len(values), dtype=bool))
+        #NULLs go to a mask instead of widening to float64, which would merge bigints above 2**53
+        nulls = np.array([v is None for v in values], dtype=bool) if has_null else None
+        if types == {bool}:
+            return cls("bool", np.array([bool(v) for v in values], dtype=bool), nulls)
+        if types == {int}:
+            try:
+                return cls("int", np.array([0 if v is None else v for v in values] if has_null else values,
+                                           dtype=np.int64), nulls)
+            except OverflowError:
+                return cls("object", values)
+        if types <= {int, float, Decimal, bool}:
+            return cls("float", np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64), nulls)
+        if types <= {datetime, date, time}:
+            return cls("temporal", values)
+        if types == {str}:
+            return cls("text", values)
+        return cls("object", values)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def value(self, i: int):
+        """JSON-friendly value at row i; conversion happens only for rows that are actually shown."""
+        if self.nulls is not None and self.nulls[i]:
+            return None
+        value = self.values[i]
+        if isinstance(value, np.generic):
+            return value.item()
+        return normalize_val(value)
+
+    def as_float(self) -> np.ndarray:
+        if self.kind in {"int", "bool"}:
+            values = self.values.astype(np.float64)
+            if self.nulls is not None:
+                values[self.nulls] = np.nan
+            return values
+        return self.values
+
+    def as_seconds(self) -> np.ndarray:
+        """Temporal values as float seconds (dates/timestamps since the epoch, times since midnight)."""
+        if self.kind != "temporal":
+            return self.as_float()
+        return np.fromiter((_to_seconds(v) for v in self.values), dtype=np.float64, count=len(self.values))
+
+    def null_mask(self) -> np.ndarray:
+        if self.nulls is not None:
+            return self.nulls
+        if isinstance(self.values, list):
+            return np.array([v is None for v in self.values], dtype=bool)
+        return np.zeros(len(self.values), dtype=bool)
+
+    def text_keys(self, casefold: bool = False) -> List[str]:
+        """Equality-preserving string keys; temporal values compare equal to their ISO text, as before."""
+        if self.kind == "text":
+            if casefold:
+                return [_NULL_KEY if v is None else v.casefold() for v in self.values]
+            return [_NULL_KEY if v is None else v for v in self.values]
+        if self.kind == "temporal":
+            return [_NULL_KEY if v is None else v.isoformat() for v in self.values]
+        keys = []
+        for i in range(len(self.values)):
+            value = self.value(i)
+            if value is None:
+                keys.append(_NULL_KEY)
+            elif isinstance(value, str):
+                keys.append(value.casefold() if casefold else value)
+            else:
+                keys.append(_OTHER_PREFIX + repr(value))
+        return keys
+
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_TZ = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _to_seconds(value) -> float:
+    if value is None:
+        return np.nan
+    if isinstance(value, datetime):
+        return (value - (_EPOCH_TZ if value.tzinfo else _EPOCH)).total_seconds()
+    if isinstance(value, date):
+        return float((value - _EPOCH.date()).days * 86400)
+    return value.hour * 3600 + value.minute * 60 + value.second + value.microsecond / 1e6
+
+
+def column_keys(cols: Sequence[str]) -> List[Tuple[str, int]]:
+    """(name, occurrence) per column, so SELECT e.name, d.name keeps two distinct name columns."""
+    seen = Counter()
+    keys = []
+    for name in cols:
+        keys.append((name, seen[name]))
+        seen[name] += 1
+    return keys
+
+
+def _label(name: str, occurrence: int) -> str:
+    return name if occurrence == 0 else f"{name} ({occurrence + 1})"
+
+
+class ResultSet:
+    """Columnar query result: names stored once and one array per column."""
+
+    def __init__(self, cols: List[str], columns: List[Column], rowcount: int):
+        self.cols = cols
+        self.columns = columns
+        self.rowcount = rowcount
+        self._positions = {key: i for i, key in enumerate(column_keys(cols))}
+
+    @classmethod
+    def from_rows(cls, cols: Sequence[str], rows: Sequence[Sequence[Any]]) -> "ResultSet":
+        builder = ResultSetBuilder(cols)
+        builder.extend(rows)
+        return builder.build()
+
+    @classmethod
+    def from_cursor(cls, cur, batch_size: int = 5000, max_rows: Optional[int] = None,
+                    between_batches: Optional[Callable[[], None]] = None) -> "ResultSet":
+        """Build from a cursor in batches; stops reading once more than max_rows rows have arrived.
+
+        between_batches runs before every further fetch and may raise to stop reading.
+        """
+        batch = cur.fetchmany(batch_size)
+        builder = ResultSetBuilder([desc.name for desc in cur.description])
+        while batch:
+            builder.extend(batch)
+            if max_rows is not None and builder.rowcount > max_rows:
+                break
+            if between_batches is not None:
+                between_batches()
+            batch = cur.fetchmany(batch_size)
+        return builder.build()
+
+    def __len__(self) -> int:
+        return self.rowcount
+
+    def column(self, name: str, occurrence: int = 0) -> Column:
+        return self.columns[self._positions[(name, occurrence)]]
+
+    def row(self, i: int, cols: Optional[List[str]] = None) -> Dict[str, Any]:
+        cols = cols or self.cols
+        return {_label(name, n): self.column(name, n).value(i) for name, n in column_keys(cols)}
+
+    def preview(self, n: int = 5) -> List[Dict[str, Any]]:
+        return [self.row(i) for i in range(min(n, self.rowcount))]
+
+
+class ResultSetBuilder:
+    def __init__(self, cols: Sequence[str]):
+        self.cols = list(cols)
+        self._values: List[List[Any]] = [[] for _ in self.cols]
+        self.rowcount = 0
+
+    def extend(self, rows: Sequence[Sequence[Any]]) -> None:
+        if not rows:
+            return
+        for target, values in zip(self._values, zip(*rows)):
+            target.extend(values)
+        self.rowcount += len(rows)
+
+    def build(self) -> ResultSet:
+        columns = [Column.from_values(values) for values in self._values]
+        self._values = []
+        return ResultSet(self.cols, columns, self.rowcount)
+
+
+def paired_keys(user: Column, sol: Column, casefold: bool = False) -> Tuple[List[np.ndarray], List[np.ndarray], bool]:
+    """Sort/equality keys for the same column on both sides, encoded on a shared scale; returns (user_keys, sol_keys, numeric)."""
+    #bool against a number falls through to typed text keys, so true never matches 1 (as in stream mode)
+    mixed_bool = "bool" in {user.kind, sol.kind} and user.kind != sol.kind and "null" not in {user.kind, sol.kind}
+    if user.kind in NUMERIC_KINDS and sol.kind in NUMERIC_KINDS and not mixed_bool:
+        if user.kind == sol.kind and user.kind in {"int", "bool"}:
+            if user.nulls is None and sol.nulls is None:
+                return [user.values], [sol.values], True
+            #NULL slots hold 0, so the mask keeps them apart from a real 0
+            return [user.values, user.null_mask()], [sol.values, sol.null_mask()], True
+        u_keys, s_keys = [user.as_float()], [sol.as_float()]
+        if user.nulls is not None or sol.nulls is not None:
+            #keeps NULL and NaN apart, which both read as NaN in the float array
+            u_keys.append(user.null_mask())
+            s_keys.append(sol.null_mask())
+        return u_keys, s_keys, True
+    u_text, s_text = user.text_keys(casefold), sol.text_keys(casefold)
+    codes = {key: code for code, key in enumerate(sorted(set(u_text) | set(s_text)))}
+    u_codes = np.fromiter((codes[k] for k in u_text), dtype=np.int64, count=len(u_text))
+    s_codes = np.fromiter((codes[k] for k in s_text), dtype=np.int64, count=len(s_text))
+    return [u_codes], [s_codes], False
+
+
+def tolerance_values(user: Column, sol: Column):
+    """(user, sol, user_nulls, sol_nulls) float arrays for tolerance checks, or None when the column is not numeric/temporal."""
+    kinds = {user.kind, sol.kind}
+    if kinds <= NUMERIC_KINDS:
+        return user.as_float(), sol.as_float(), user.null_mask(), sol.null_mask()
+    if kinds <= {"temporal", "null"}:
+        return user.as_seconds(), sol.as_seconds(), user.null_mask(), sol.null_mask()
+    return None
+
+
+class CompareOptions:
+    """Per-question comparison settings from the optional `compare:` block in solutions.yaml.
+
+    compare:
+      ordered: false               # row order is significant
+      case_insensitive: true       # or a list of column names
+      tolerance:                   # per column (or "*" for every numeric/temporal column)
+        avg_salary: {abs: 0.01, rel: 0}
+    """
+
+    def __init__(self, tolerance: Optional[Dict[str, Tuple[float, float]]] = None,
+                 case_insensitive=False, ordered: bool = False):
+        self.tolerance = tolerance or {}
+        self.case_insensitive = case_insensitive
+        self.ordered = ordered
+
+    @classmethod
+    def from_config(cls, raw: Optional[Dict[str, Any]]) -> "CompareOptions":
+        if not raw:
+            return cls()
+        if not isinstance(raw, dict):
+            raise ValueError(f"compare settings must be a mapping, got: {type(raw)}")
+        tolerance = {}
+        for col, spec in (raw.get("tolerance") or {}).items():
+            if not isinstance(spec, dict):
+                raise ValueError(f"tolerance for column {col!r} must be a mapping with 'abs' and/or 'rel'")
+            tolerance[str(col)] = (float(spec.get("abs", 0.0)), float(spec.get("rel", 0.0)))
+        case_insensitive = raw.get("case_insensitive", False)
+        if isinstance(case_insensitive, list):
+            case_insensitive = {str(col) for col in case_insensitive}
+        return cls(tolerance, case_insensitive, bool(raw.get("ordered", False)))
+
+    @property
+    def exact(self) -> bool:
+        return not self.tolerance and not self.case_insensitive and not self.ordered
+
+    def tolerance_for(self, col: str) -> Optional[Tuple[float, float]]:
+        return self.tolerance.get(col, self.tolerance.get("*"))
+
+    def casefold(self, col: str) -> bool:
+        if isinstance(self.case_insensitive, set):
+            return col in self.case_insensitive
+        return bool(self.case_insensitive)
+
+
+def sort_order(keys: List[np.ndarray], rowcount: int) -> np.ndarray:
+    if not keys:
+        return np.arange(rowcount)
+    #lexsort treats the last key as primary
+    return np.lexsort(keys[::-1])
+
+
+def row_key_tuples(keys: List[np.ndarray]) -> List[tuple]:
+    """Hashable per-row keys; floats go through their bit pattern so NaN matches NaN and -0.0 matches 0.0."""
+    columns = []
+    for key in keys:
+        if key.dtype == np.float64:
+            key = (key + 0.0).view(np.int64)
+        columns.append(key.tolist())
+    return list(zip(*columns))
+
+
+def first_difference(from_keys: List[tuple], other_keys: List[tuple]) -> Optional[int]:
+    """Index of a row whose key occurs more often in from_keys than in other_keys (multiplicity-aware)."""
+    surplus = Counter(from_keys)
+    surplus.subtract(other_keys)
+    for i, key in enumerate(from_keys):
+        if surplus[key] > 0:
+            return i
+    return None
@@ -0,0 +1,302 @@
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import psycopg2
+import requests
+import uvicorn
+from starlette.applications import Starlette
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse as _JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from config import config
+from backend.bootstrap_db import bootstrap_database, table_schema
+from backend.db_pool import PoolTimeout, pool_stats
+from backend.llm_client import LLMBusy
+from backend.llm_feedback import get_feedback, stream_feedback
+from backend.metrics import inc, observe, render_prometheus
+from backend.query_plan import QueryTooExpensive
+from backend.question_bank import QuestionBank
+from backend.validate_sql import QueryCancelled, validate_sql_pair
+
+SCHEMA_TABLES = ("departments", "employees", "projects")
+
+
+class JSONResponse(_JSONResponse):
+    """Verdict previews carry dates and decimals, which the stock encoder rejects."""
+
+    def render(self, content: Any) -> bytes:
+        return json.dumps(content, default=str, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class Saturated(Exception):
+    """Raised when a gate's queue is full; answered with 429."""
+
+
+class Gate:
+    """Bounded concurrency with a bounded wait queue for one kind of work.
+
+    At most `slots` requests run at once and at most `queue` more wait for a slot; anything
+    beyond that, or waiting longer than `timeout` seconds, is turned away immediately.
+    """
+
+    def __init__(self, name: str, slots: int, queue: int, timeout: float):
+        self.name = name
+        self.slots = max(1, slots)
+        self.queue = max(0, queue)
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=self.slots, thread_name_prefix=f"svc-{name}")
+        self._sem: Optional[asyncio.Semaphore] = None
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    async def acquire(self) -> None:
+        if self._sem is None:
+            #created lazily so it binds to the server's event loop
+            self._sem = asyncio.Semaphore(self.slots)
+        if self.running >= self.slots and self.waiting >= self.queue:
+            self._reject()
+        self.waiting += 1
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._sem.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self._reject()
+        finally:
+            self.waiting -= 1
+        observe(f"service.{self.name}_queue", time.perf_counter() - started)
+        self.running += 1
+
+    def release(self) -> None:
+        self.running -= 1
+        self._sem.release()
+
+    def _reject(self):
+        self.rejected += 1
+        inc("service_rejected_total", gate=self.name)
+        raise Saturated(f"The {self.name} queue is full; retry shortly.")
+
+    async def run(self, fn, *args, **kwargs):
+        """Run a blocking call on this gate's threads while holding a slot."""
+        await self.acquire()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, lambda: fn(*args, **kwargs))
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"slots": self.slots, "queue": self.queue, "running": self.running, "waiting": self.waiting,
+                "rejected": self.rejected}
+
+
+GRADE_GATE = Gate("grade", config.SERVICE_GRADE_CONCURRENCY, config.SERVICE_QUEUE_DEPTH, config.SERVICE_QUEUE_TIMEOUT)
+FEEDBACK_GATE = Gate("feedback", config.SERVICE_FEEDBACK_CONCURRENCY, config.SERVICE_QUEUE_DEPTH,
+                     config.SERVICE_QUEUE_TIMEOUT)
+BANK = QuestionBank(Path(config.QUESTIONS_PATH), Path(config.SOLUTIONS_PATH), config.QUESTION_INDEX_PATH)
+
+
+def _error(status: int, kind: str, message: str, **headers) -> JSONResponse:
+    return JSONResponse({"error": message, "kind": kind}, status_code=status, headers=headers or None)
+
+
+def _busy(exc: Exception) -> JSONResponse:
+    return _error(429, "busy", str(exc), **{"Retry-After": str(config.SERVICE_RETRY_AFTER)})
+
+
+async def _body(request: Request) -> Dict[str, Any]:
+    try:
+        body = await request.json()
+    except ValueError:
+        body = None
+    return body if isinstance(body, dict) else {}
+
+
+def _find(question_id) -> Optional[Dict[str, Any]]:
+    """Question and solution entries for an id, or None; the bank is refreshed on the way (a stat() when unchanged)."""
+    BANK.refresh()
+    question = BANK.question(str(question_id))
+    if question is None:
+        return None
+    return {"question": question, "solution": BANK.solution(str(question_id))}
+
+
+async def _lookup(question_id) -> Optional[Dict[str, Any]]:
+    #a changed YAML means a reparse and index rebuild, which must not stall the event loop
+    return await run_in_threadpool(_find, question_id)
+
+
+def _page(tag: Optional[str], difficulty: Optional[str], offset: int, limit: int) -> Dict[str, Any]:
+    BANK.refresh()
+    ids = BANK.ids(tag, difficulty)
+    return {"total": len(ids), "offset": offset, "questions": [BANK.question(qid) for qid in ids[offset:offset + limit]]}
+
+
+async def health(request: Request) -> Response:
+    return JSONResponse({"ok": True, "grade": GRADE_GATE.stats(), "feedback": FEEDBACK_GATE.stats(), "pool": pool_stats()})
+
+
+async def metrics(request: Request) -> Response:
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+async def schema(request: Request) -> Response:
+    tables = [t for t in request.query_params.get("tables", "").split(",") if t] or list(SCHEMA_TABLES)
+    try:
+        return JSONResponse(await GRADE_GATE.run(table_schema, tables))
+    except (Saturated, PoolTimeout) as exc:
+        return _busy(exc)
+    except psycopg2.Error as exc:
+        return _error(503, "database", str(exc).strip())
+
+
+def _int_param(request: Request, name: str, default: int) -> Optional[int]:
+    """A non-negative integer query parameter, or None when it is malformed."""
+    raw = request.query_params.get(name)
+    if raw is None or raw == "":
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        return None
+    return value if value >= 0 else None
+
+
+async def questions(request: Request) -> Response:
+    params = request.query_params
+    tag, difficulty = params.get("tag") or None, params.get("difficulty") or None
+    offset, limit = _int_param(request, "offset", 0), _int_param(request, "limit", 100)
+    if offset is None or limit is None:
+        return _error(400, "invalid", "offset and limit must be non-negative integers.")
+    return JSONResponse(await run_in_threadpool(_page, tag, difficulty, offset, min(limit, 1000)))
+
+
+async def question(request: Request) -> Response:
+    found = await _lookup(request.path_params["qid"])
+    if found is None:
+        return _error(404, "not_found", "No such question.")
+    #the solution SQL stays server-side; clients grade against it through /validate
+    return JSONResponse(dict(found["question"], explanation=found["solution"].get("explanation", ""),
+                             has_solution=bool(found["solution"].get("solution_sql"))))
+
+
+async def validate(request: Request) -> Response:
+    """POST {question_id, sql}: the same verdict dict validate_sql_pair returns in-process."""
+    body = await _body(request)
+    user_sql = str(body.get("sql") or "")
+    found = await _lookup(body.get("question_id")) if body.get("question_id") is not None else None
+    if found is None:
+        return _error(404, "not_found", "No such question.")
+    solution = found["solution"]
+    if not solution.get("solution_sql"):
+        return _error(409, "no_solution", "No stored solution for this question yet.")
+    if not user_sql.strip():
+        return _error(400, "invalid", "Enter a SQL query before running.")
+    try:
+        verdict = await GRADE_GATE.run(
+            validate_sql_pair, user_sql, solution["solution_sql"], compare_options=solution.get("compare"),
+            budget=solution.get("budget"), performance=solution.get("performance"),
+        )
+    except (Saturated, PoolTimeout) as exc:
+        #every pooled connection busy is the same backpressure as a full queue
+        return _busy(exc)
+    except QueryTooExpensive as exc:
+        return _error(422, "too_expensive", str(exc))
+    except ValueError as exc:
+        return _error(422, "invalid", str(exc))
+    except (psycopg2.ProgrammingError, psycopg2.DataError) as exc:
+        #the student's SQL is at fault: unknown column, bad cast, division by zero, ...
+        return _error(422, "sql_error", str(exc).strip())
+    except (psycopg2.Error, QueryCancelled) as exc:
+        return _error(503, "database", str(exc).strip())
+    return JSONResponse(verdict)
+
+
+def _feedback_request(body: Dict[str, Any], found: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "question": found["question"]["question"],
+        "user_sql": str(body.get("sql") or ""),
+        "solution_sql": found["solution"].get("solution_sql", ""),
+        "explanation": found["solution"].get("explanation", ""),
+        "diagnostics": body.get("diagnostics") or {},
+        "question_id": str(found["question"]["id"]),
+    }
+
+
+async def feedback(request: Request) -> Response:
+    """POST {question_id, sql, diagnostics[, stream]}: mentor feedback as JSON, or as a text/plain stream."""
+    body = await _body(request)
+    found = await _lookup(body.get("question_id")) if body.get("question_id") is not None else None
+    if found is None:
+        return _error(404, "not_found", "No such question.")
+    args = _feedback_request(body, found)
+    if not body.get("stream"):
+        try:
+            return JSONResponse({"feedback": await FEEDBACK_GATE.run(get_feedback, **args)})
+        except (Saturated, LLMBusy) as exc:
+            return _busy(exc)
+        except requests.RequestException as exc:
+            return _error(502, "llm", f"Mentor unavailable: {exc}")
+
+    try:
+        await FEEDBACK_GATE.acquire()
+    except Saturated as exc:
+        return _busy(exc)
+    stream = stream_feedback(**args)
+    chunks = iterate_in_threadpool(iter(stream))
+    try:
+        #pull the first chunk before answering, so LLM errors still get a proper status code
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = ""
+    except BaseException as exc:
+        FEEDBACK_GATE.release()
+        if isinstance(exc, LLMBusy):
+            return _busy(exc)
+        if isinstance(exc, requests.RequestException):
+            return _error(502, "llm", f"Mentor unavailable: {exc}")
+        raise
+
+    async def body_chunks():
+        try:
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            #a client that disconnects mid-answer stops the model too
+            stream.cancel()
+            FEEDBACK_GATE.release()
+
+    return StreamingResponse(body_chunks(), media_type="text/plain; charset=utf-8")
+
+
+def create_app() -> Starlette:
+    return Starlette(routes=[
+        Route("/health", health),
+        Route("/metrics", metrics),
+        Route("/schema", schema),
+        Route("/questions", questions),
+        Route("/questions/{qid}", question),
+        Route("/validate", validate, methods=["POST"]),
+        Route("/feedback", feedback, methods=["POST"]),
+    ])
+
+
+app = create_app()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Grading service: validate, feedback, schema, and questions over HTTP.")
+    parser.add_argument("--host", default=config.SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVICE_PORT)
+    parser.add_argument("--no-bootstrap", action="store_true", help="skip creating/seeding the tables on startup")
+    args = parser.parse_args()
+    if not args.no_bootstrap:
+        bootstrap_database()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
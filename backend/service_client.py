@@ -0,0 +1,119 @@
+import time
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+import requests
+
+from config import config
+from backend.query_plan import QueryTooExpensive
+
+
+class ServiceError(RuntimeError):
+    """The grading service answered with an error (or could not be reached)."""
+
+
+class ServiceBusy(ServiceError):
+    """The grading service is saturated (HTTP 429); retry after `retry_after` seconds."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RemoteFeedbackStream:
+    """Iterates streamed mentor feedback from the service; same surface as llm_feedback.FeedbackStream."""
+
+    def __init__(self, resp: requests.Response, started: float):
+        self._resp = resp
+        self._started = started
+        self.text = ""
+        self.metrics: Dict[str, Any] = {}
+
+    def cancel(self) -> None:
+        self._resp.close()
+
+    def __iter__(self) -> Iterator[str]:
+        first_token_at, chunks = None, 0
+        try:
+            for chunk in self._resp.iter_content(chunk_size=None, decode_unicode=True):
+                if not chunk:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                chunks += 1
+                self.text += chunk
+                yield chunk
+        except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError, AttributeError):
+            #cancel() closing the socket mid-read
+            pass
+        finally:
+            ended = time.perf_counter()
+            generating = ended - first_token_at if first_token_at is not None else 0.0
+            self.metrics = {
+                "ttft_ms": round((first_token_at - self._started) * 1000, 1) if first_token_at is not None else None,
+                "total_ms": round((ended - self._started) * 1000, 1),
+                "tokens_per_sec": round((chunks - 1) / generating, 1) if chunks > 1 and generating > 0 else None,
+            }
+
+
+class ServiceClient:
+    """Thin client for backend.service; errors come back as the exceptions the in-process calls raise."""
+
+    def __init__(self, base_url: str, timeout: float = 120):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _post(self, path: str, body: Dict[str, Any], stream: bool = False) -> requests.Response:
+        try:
+            resp = self.session.post(f"{self.base_url}{path}", json=body, timeout=self.timeout, stream=stream)
+        except requests.RequestException as exc:
+            raise ServiceError(f"Grading service unreachable: {exc}") from exc
+        self._raise_for(resp)
+        return resp
+
+    def _get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        try:
+            resp = self.session.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+        except requests.RequestException as exc:
+            raise ServiceError(f"Grading service unreachable: {exc}") from exc
+        self._raise_for(resp)
+        return resp.json()
+
+    @staticmethod
+    def _raise_for(resp: requests.Response) -> None:
+        if resp.status_code < 400:
+            return
+        try:
+            body = resp.json()
+        except ValueError:
+            body = {"error": resp.text.strip() or resp.reason, "kind": "http"}
+        message, kind = body.get("error", resp.reason), body.get("kind")
+        if resp.status_code == 429:
+            retry = resp.headers.get("Retry-After")
+            raise ServiceBusy(message, float(retry) if retry else None)
+        if kind == "too_expensive":
+            raise QueryTooExpensive(message)
+        if kind == "invalid":
+            raise ValueError(message)
+        raise ServiceError(message)
+
+    def validate(self, question_id: str, sql: str) -> Dict[str, Any]:
+        return self._post("/validate", {"question_id": question_id, "sql": sql}).json()
+
+    def feedback(self, question_id: str, sql: str, diagnostics: Dict[str, Any]) -> str:
+        return self._post("/feedback", {"question_id": question_id, "sql": sql, "diagnostics": diagnostics}).json()["feedback"]
+
+    def stream_feedback(self, question_id: str, sql: str, diagnostics: Dict[str, Any]) -> RemoteFeedbackStream:
+        started = time.perf_counter()
+        resp = self._post("/feedback", {"question_id": question_id, "sql": sql, "diagnostics": diagnostics,
+                                        "stream": True}, stream=True)
+        resp.encoding = "utf-8"
+        return RemoteFeedbackStream(resp, started)
+
+    def schema(self, tables: Sequence[str]) -> Dict[str, Any]:
+        return {table: [tuple(col) for col in cols] for table, cols in self._get("/schema", {"tables": ",".join(tables)}).items()}
+
+
+def service_client() -> Optional[ServiceClient]:
+    """A client for GRADING_SERVICE_URL, or None to grade in-process."""
+    return ServiceClient(config.GRADING_SERVICE_URL, config.GRADING_SERVICE_TIMEOUT) if config.GRADING_SERVICE_URL else None
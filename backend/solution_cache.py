@@ -0,0 +1,173 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from config import config
+from backend.db_pool import get_conn
+
+
+class SolutionCache:
+    """Bounded, thread-safe LRU shared by every Streamlit session in the process."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+SOLUTION_CACHE = SolutionCache(config.SOLUTION_CACHE_SIZE)
+
+#pg_stat counters only move when rows change; relid catches drop/recreate, n_live_tup catches TRUNCATE
+FINGERPRINT_SQL = """
+    SELECT relid, n_tup_ins, n_tup_upd, n_tup_del, n_live_tup
+    FROM pg_stat_user_tables
+    ORDER BY relid
+"""
+
+_fingerprint_lock = threading.Lock()
+_fingerprint: Dict[str, Any] = {"value": None, "checked_at": 0.0}
+
+
+def dataset_fingerprint() -> str:
+    """Digest of DATASET_VERSION plus table modification counters, re-read at most every DATASET_FINGERPRINT_TTL seconds."""
+    now = time.monotonic()
+    with _fingerprint_lock:
+        if _fingerprint["value"] is not None and now - _fingerprint["checked_at"] < config.DATASET_FINGERPRINT_TTL:
+            return _fingerprint["value"]
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(FINGERPRINT_SQL)
+            counters = cur.fetchall()
+    digest = hashlib.sha256(f"{config.DATASET_VERSION}|{counters!r}".encode("utf-8")).hexdigest()
+    with _fingerprint_lock:
+        _fingerprint["value"] = digest
+        _fingerprint["checked_at"] = now
+    return digest
+
+
+def solution_key(solution_sql: str, fingerprint: str) -> str:
+    sql_digest = hashlib.sha256(solution_sql.strip().encode("utf-8")).hexdigest()
+    return f"{sql_digest}:{fingerprint}"
+
+
+def cache_stats() -> Dict[str, Any]:
+    return SOLUTION_CACHE.stats()
+
+
+class AcceptedAnswers:
+    """Canonical fingerprints of answers already graded correct, per question scope.
+
+    A scope is one solution plus its comparison settings, so editing either starts afresh.
+    Everything is dropped when the dataset fingerprint changes.
+    """
+
+    def __init__(self, max_per_question: int, max_questions: int):
+        self.max_per_question = max_per_question
+        self._scopes = SolutionCache(max_questions)
+        self._lock = threading.Lock()
+        self._dataset: Optional[str] = None
+        self.shortcuts = 0
+        self.added = 0
+        self.invalidations = 0
+
+    def _sync(self, dataset: str) -> None:
+        with self._lock:
+            if dataset != self._dataset:
+                if self._dataset is not None:
+                    self.invalidations += 1
+                self._scopes.clear()
+                self._dataset = dataset
+
+    def contains(self, scope: str, fingerprint: str, dataset: str) -> bool:
+        self._sync(dataset)
+        answers = self._scopes.get(scope)
+        with self._lock:
+            found = answers is not None and fingerprint in answers
+            if found:
+                answers.move_to_end(fingerprint)
+                self.shortcuts += 1
+            return found
+
+    def add(self, scope: str, fingerprint: str, dataset: str) -> None:
+        if self.max_per_question <= 0:
+            return
+        self._sync(dataset)
+        with self._lock:
+            answers = self._scopes.get(scope)
+            if answers is None:
+                answers = OrderedDict()
+                self._scopes.put(scope, answers)
+            if fingerprint not in answers:
+                self.added += 1
+            answers[fingerprint] = True
+            answers.move_to_end(fingerprint)
+            while len(answers) > self.max_per_question:
+                answers.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._scopes.clear()
+            self._dataset = None
+
+    def stats(self) -> Dict[str, Any]:
+        scopes = self._scopes.stats()
+        with self._lock:
+            return {
+                "questions": scopes["entries"],
+                "max_questions": scopes["max_entries"],
+                "max_per_question": self.max_per_question,
+                "added": self.added,
+                "shortcuts": self.shortcuts,
+                "invalidations": self.invalidations,
+            }
+
+
+def answer_scope(solution_sql: str, options: Any) -> str:
+    return hashlib.sha256(f"{solution_sql.strip()}|{options!r}".encode("utf-8")).hexdigest()
+
+
+ACCEPTED_ANSWERS = AcceptedAnswers(config.ACCEPTED_ANSWERS_PER_QUESTION, config.ACCEPTED_ANSWERS_MAX_QUESTIONS)
+
+
+def accepted_answers_stats() -> Dict[str, Any]:
+    return ACCEPTED_ANSWERS.stats()
@@ -0,0 +1,233 @@
+import functools
+import hashlib
+import logging
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+from sqlglot.optimizer.normalize_identifiers import normalize_identifiers
+
+from config import config
+
+#sqlglot logs a warning whenever it falls back to an opaque Command; those statements are rejected anyway
+logging.getLogger("sqlglot").setLevel(logging.ERROR)
+
+DIALECT = "postgres"
+
+#anything that writes, changes schema/session state, or locks rows
+_FORBIDDEN_NODES: Tuple[type, ...] = (
+    exp.Insert, exp.Update, exp.Delete, exp.Merge, exp.Create, exp.Drop, exp.Alter, exp.TruncateTable,
+    exp.Command, exp.Set, exp.Copy, exp.Into, exp.Lock,
+)
+
+#functions sqlglot has no class for arrive as exp.Anonymous; only these are allowed (pg_sleep, set_config, dblink, ... are not)
+ALLOWED_FUNCTIONS = frozenset({
+    "age", "make_date", "make_timestamp", "make_interval", "isfinite", "date_part", "to_json", "to_jsonb",
+    "json_build_object", "jsonb_build_object", "jsonb_agg", "json_object_agg", "jsonb_object_agg", "cardinality",
+    "array_to_string", "string_to_array", "regexp_match", "regexp_matches", "regexp_split_to_array", "octet_length",
+    "bit_length", "every", "num_nonnulls", "num_nulls", "scale", "trim_scale", "gcd", "lcm", "factorial",
+    "degrees", "radians", "justify_hours", "justify_interval", "overlay", "quote_literal", "quote_ident",
+})
+
+#functions whose result changes between runs; such answers are never remembered as accepted
+_VOLATILE_NODES: Tuple[type, ...] = (
+    exp.Rand, exp.CurrentTimestamp, exp.CurrentDate, exp.CurrentTime, exp.Localtimestamp, exp.Localtime,
+)
+_VOLATILE_FUNCTIONS = frozenset({"clock_timestamp", "age"})
+
+_COMPARISON_OPS = {exp.GT: ">", exp.GTE: ">=", exp.LT: "<", exp.LTE: "<=", exp.EQ: "=", exp.NEQ: "<>"}
+_FLIPPED = {">": "<", ">=": "<=", "<": ">", "<=": ">=", "=": "=", "<>": "<>"}
+
+
+class SQLAnalysis:
+    """Everything the grader and feedback code need from one parse of a query.
+
+    Instances are shared through the analyze_sql cache: treat them, and `tree`, as read-only
+    (call tree.copy() before transforming it).
+    """
+
+    __slots__ = (
+        "sql", "tree", "safe", "reason", "tables", "columns", "canonical", "select_star", "distinct",
+        "grouped", "filtered", "outer_join", "inner_join", "ordered", "unordered_limit", "comparisons",
+        "fingerprint", "deterministic",
+    )
+
+    def __init__(self, sql: str, tree: Optional[exp.Expression], reason: Optional[str]):
+        self.sql = sql
+        self.tree = tree
+        self.safe = tree is not None and reason is None
+        self.reason = reason
+        self.tables: FrozenSet[str] = frozenset()
+        self.columns: FrozenSet[str] = frozenset()
+        self.canonical = " ".join(sql.strip().rstrip(";").split())
+        self.select_star = self.distinct = self.grouped = self.filtered = False
+        self.outer_join = self.inner_join = self.ordered = self.unordered_limit = False
+        self.comparisons: Dict[str, Tuple[str, str]] = {}
+        self.fingerprint = hashlib.sha256(self.canonical.encode("utf-8")).hexdigest()
+        self.deterministic = False
+        if tree is not None:
+            self._describe(tree)
+
+    def _describe(self, tree: exp.Expression) -> None:
+        ctes = {cte.alias_or_name.lower() for cte in tree.find_all(exp.CTE)}
+        self.tables = frozenset(t.name.lower() for t in tree.find_all(exp.Table) if t.name and t.name.lower() not in ctes)
+        self.columns = frozenset(c.name.lower() for c in tree.find_all(exp.Column) if c.name and c.name != "*")
+        top = _outermost_selects(tree)
+        self.select_star = any(
+            isinstance(e, exp.Star) or (isinstance(e, exp.Column) and isinstance(e.this, exp.Star))
+            for select in top for e in select.expressions
+        )
+        self.distinct = any(select.args.get("distinct") is not None for select in top)
+        self.grouped = tree.find(exp.Group) is not None
+        self.filtered = tree.find(exp.Where) is not None
+        for join in tree.find_all(exp.Join):
+            side, kind = (join.side or "").upper(), (join.kind or "").upper()
+            if side in ("LEFT", "RIGHT", "FULL"):
+                self.outer_join = True
+            elif kind != "CROSS":
+                self.inner_join = True
+        self.ordered = tree.args.get("order") is not None
+        self.unordered_limit = any(_picks_by_physical_order(q) for q in tree.find_all(exp.Select, exp.SetOperation))
+        for node in tree.find_all(*_COMPARISON_OPS):
+            op = _COMPARISON_OPS[type(node)]
+            left, right = node.left, node.right
+            if isinstance(left, exp.Literal) and isinstance(right, exp.Column):
+                left, right, op = right, left, _FLIPPED[op]
+            if isinstance(left, exp.Column) and isinstance(right, (exp.Literal, exp.Neg)):
+                self.comparisons[left.name.lower()] = (op, right.sql(dialect=DIALECT))
+        normalized = _normalized_tree(tree)
+        self.canonical = normalized.sql(dialect=DIALECT)
+        self.fingerprint = hashlib.sha256(_commuted(normalized).sql(dialect=DIALECT).encode("utf-8")).hexdigest()
+        self.deterministic = not self.unordered_limit and not any(
+            isinstance(node, _VOLATILE_NODES)
+            or (isinstance(node, exp.Anonymous) and node.name.lower() in _VOLATILE_FUNCTIONS)
+            for node in tree.walk()
+        )
+
+
+def _outermost_selects(tree: exp.Expression):
+    if isinstance(tree, exp.SetOperation):
+        return _outermost_selects(tree.left) + _outermost_selects(tree.right)
+    if isinstance(tree, exp.Subquery):
+        return _outermost_selects(tree.this)
+    return [tree] if isinstance(tree, exp.Select) else []
+
+
+def _picks_by_physical_order(query: exp.Expression) -> bool:
+    """LIMIT/OFFSET/FETCH or DISTINCT ON without an ORDER BY on the same query level."""
+    if query.args.get("order") is not None:
+        return False
+    distinct = query.args.get("distinct")
+    return any(query.args.get(k) is not None for k in ("limit", "offset", "fetch")) or \
+        (distinct is not None and distinct.args.get("on") is not None)
+
+
+def _unsafe_reason(tree: exp.Expression) -> Optional[str]:
+    if not isinstance(tree, exp.Query):
+        return "Only SELECT queries are allowed."
+    for node in tree.walk():
+        if isinstance(node, _FORBIDDEN_NODES):
+            what = "FOR UPDATE/SHARE" if isinstance(node, exp.Lock) else \
+                "SELECT INTO" if isinstance(node, exp.Into) else node.key.upper()
+            return f"Only read-only SELECT queries are allowed ({what} found)."
+        if isinstance(node, exp.Anonymous) and node.name.lower() not in ALLOWED_FUNCTIONS:
+            return f"Function {node.name}() is not allowed."
+    return None
+
+
+def _normalized_tree(tree: exp.Expression) -> exp.Expression:
+    """Copy with identifier case and table aliases normalized away; literals are kept verbatim."""
+    tree = normalize_identifiers(tree.copy(), dialect=DIALECT)
+    tables = list(tree.find_all(exp.Table))
+    names = [t.name for t in tables]
+    aliases = {}
+    for table in tables:
+        alias = table.alias
+        #self-joins and aliases that shadow another table keep their alias
+        if alias and names.count(table.name) == 1 and alias not in names:
+            aliases[alias] = table.name
+            table.set("alias", None)
+    #with a single source every qualifier is redundant: `e.salary` == `employees.salary` == `salary`
+    single = len(tables) == 1 and tree.find(exp.Subquery, exp.CTE) is None
+    if aliases or single:
+        for column in tree.find_all(exp.Column):
+            if single and column.table:
+                column.set("table", None)
+            elif column.table in aliases:
+                column.set("table", exp.to_identifier(aliases[column.table]))
+    return tree
+
+
+def _operands(node: exp.Connector):
+    """Operands of an AND/OR chain, looking through redundant parentheses: `a AND (b AND c)` -> a, b, c."""
+    for operand in node.flatten():
+        inner = operand.unnest()
+        if type(inner) is type(node):
+            yield from _operands(inner)
+        else:
+            yield inner
+
+
+def _commuted(tree: exp.Expression) -> exp.Expression:
+    """Order-insensitive predicates: AND/OR operands sorted, `=`/`<>` sides sorted, `<`/`<=` flipped to `>`/`>=`."""
+    tree = tree.copy()
+    #breadth-first order reversed visits children before their parents
+    for node in reversed(list(tree.find_all(exp.EQ, exp.NEQ, exp.LT, exp.LTE))):
+        left, right = node.left, node.right
+        if isinstance(node, exp.LT):
+            node.replace(exp.GT(this=right, expression=left))
+        elif isinstance(node, exp.LTE):
+            node.replace(exp.GTE(this=right, expression=left))
+        elif left.sql() > right.sql():
+            node.replace(type(node)(this=right, expression=left))
+    for node in reversed(list(tree.find_all(exp.Connector))):
+        parent = node.parent
+        while isinstance(parent, exp.Paren):
+            parent = parent.parent
+        if type(parent) is type(node):
+            continue
+        operands = sorted(_operands(node), key=lambda n: n.sql())
+        combine = exp.and_ if isinstance(node, exp.And) else exp.or_
+        node.replace(combine(*operands, copy=False))
+    return tree
+
+
+@functools.lru_cache(maxsize=config.SQL_ANALYSIS_CACHE_SIZE)
+def _analyze(sql: str) -> SQLAnalysis:
+    try:
+        #a comment after the final `;` parses as a Semicolon node; like `;;` it is not a second statement
+        statements = [s for s in sqlglot.parse(sql, read=DIALECT) if s is not None and not isinstance(s, exp.Semicolon)]
+    except SqlglotError as exc:
+        return SQLAnalysis(sql, None, f"Could not parse the query: {str(exc).splitlines()[0]}")
+    if len(statements) != 1:
+        return SQLAnalysis(sql, None, "Submit exactly one SQL statement.")
+    tree = statements[0]
+    return SQLAnalysis(sql, tree, _unsafe_reason(tree))
+
+
+def statement_body(sql: str) -> str:
+    """The query text without trailing `;` and comments, so it can be wrapped in EXPLAIN or a subquery."""
+    try:
+        tokens = sqlglot.Dialect.get_or_raise(DIALECT).tokenize(sql)
+    except SqlglotError:
+        return sql.strip().rstrip(";").strip()
+    body = [t for t in tokens if t.token_type != sqlglot.TokenType.SEMICOLON]
+    return sql[:body[-1].end + 1].strip() if body else ""
+
+
+def analyze_sql(sql: str) -> SQLAnalysis:
+    """Parse once (cached by SQL text) and return the shared analysis."""
+    return _analyze(sql.strip())
+
+
+def sql_analysis_stats() -> Dict[str, Any]:
+    info = _analyze.cache_info()
+    total = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+        "hit_rate": round(info.hits / total, 3) if total else None,
+    }
@@ -1,106 +1,582 @@
-import re
+import hashlib
+import threading
+import uuid
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from typing import List, Dict, Any, Tuple
-from decimal import Decimal
-from datetime import date, datetime, time
+from psycopg2 import sql as pgsql
+import numpy as np
+from typing import List, Dict, Any, Optional, Tuple
 
 from config import config
-
-SELECT_ONLY = re.compile(r"^\s*select\b", re.IGNORECASE | re.DOTALL)
-FORBIDDEN = re.compile(r"\b(drop|alter|insert|update|delete|truncate|create)\b", re.IGNORECASE)
+from backend.db_pool import get_conn
+from backend.metrics import inc, span
+from backend.query_plan import QueryGuard, QueryTooExpensive, compare_performance, profile_query
+from backend.solution_cache import ACCEPTED_ANSWERS, SOLUTION_CACHE, answer_scope, dataset_fingerprint, solution_key
+from backend.sql_analysis import SQLAnalysis, analyze_sql, statement_body
+from backend.result_set import (
+    CompareOptions, ResultSet, column_keys, first_difference, normalize_val, paired_keys, row_key_tuples, sort_order,
+    tolerance_values,
+)
 
 def is_safe_select(sql: str) -> bool:
-    return bool(SELECT_ONLY.match(sql)) and not FORBIDDEN.search(sql)
-
-def get_conn():
-    return psycopg2.connect(
-        host=config.DB_HOST,
-        port=config.DB_PORT,
-        dbname=config.DB_NAME,
-        user=config.DB_USER,
-        password=config.DB_PASSWORD,
-    )
+    """One read-only query: no DML/DDL (also inside CTEs), row locks, SELECT INTO, or disallowed functions."""
+    return analyze_sql(sql).safe
+
+def _require_safe(sql: str) -> None:
+    analysis = analyze_sql(sql)
+    if not analysis.safe:
+        raise ValueError(analysis.reason)
+
+class QueryCancelled(RuntimeError):
+    """Raised when a query is abandoned before it reached Postgres."""
+
+
+class RunningQuery:
+    """Handle that lets another thread cancel a query server-side while it runs."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn = None
+        self.cancelled = False
+
+    def attach(self, conn) -> None:
+        with self._lock:
+            if self.cancelled:
+                raise QueryCancelled("Query was cancelled before it started.")
+            self._conn = conn
+
+    def raise_if_cancelled(self) -> None:
+        #a cancel() that lands between statements is a no-op in Postgres, so check before starting the next one
+        with self._lock:
+            if self.cancelled:
+                raise QueryCancelled("Query was cancelled before it started.")
 
-def run_query(sql: str) -> Tuple[List[Dict[str, Any]], List[str]]:
-    if not is_safe_select(sql):
-        raise ValueError("Only safe SELECT queries are allowed.")
+    def detach(self) -> None:
+        #must run before the connection goes back to the pool, or cancel() could hit another user's query
+        with self._lock:
+            self._conn = None
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            if self._conn is not None:
+                #sends a protocol-level cancel request (same as pg_cancel_backend) for the running statement
+                self._conn.cancel()
+
+def _guarded_cursor(conn, sql: str, guard: Optional[QueryGuard]):
+    """Admit the query and open a server-side cursor so the row cap also bounds client memory."""
+    if guard is None:
+        return conn.cursor()
+    with conn.cursor() as cur:
+        guard.admit(cur, sql)
+    return conn.cursor(name=f"grade_{uuid.uuid4().hex}")
+
+def _raise_translated(exc: psycopg2.Error, guard: Optional[QueryGuard]) -> None:
+    translated = guard.translate(exc) if guard is not None else exc
+    if translated is not exc:
+        raise translated from exc
+
+def _between_batches(conn, running: Optional[RunningQuery], guard: Optional[QueryGuard]):
+    """Checks run before each further FETCH of a server-side cursor, or None when there are none."""
+    if running is None and guard is None:
+        return None
+
+    def check():
+        if running is not None:
+            running.raise_if_cancelled()
+        if guard is not None:
+            guard.check_deadline(conn)
+    return check
+
+def run_query(sql: str, running: Optional[RunningQuery] = None, guard: Optional[QueryGuard] = None) -> ResultSet:
+    _require_safe(sql)
     with get_conn() as conn:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(sql)
-            rows = cur.fetchall()
-            cols = [desc.name for desc in cur.description]
-            #Normalize certain types (e.g. Decimal to float) for JSON serialization
-            def normalize_val(value):
-                if isinstance(value, Decimal):
-                    return float(value)
-                if isinstance(value, (datetime, date, time)):
-                    return value.isoformat()
-                return value
-
-            normalized = [{k: normalize_val(v) for k, v in row.items()} for row in rows]
-            return normalized, cols
-
-def normalize_for_compare(rows: List[Dict[str, Any]], cols: List[str], ignore_col_order: bool = False):
-    #sort columns alphabetically
-    if ignore_col_order:
-        cols = sorted(cols)
-        norm_rows = [{c: r.get(c) for c in cols} for r in rows]
-    else:
-        norm_rows = [{c: r.get(c) for c in cols} for r in rows]
+        if running is not None:
+            running.attach(conn)
+        try:
+            with _guarded_cursor(conn, sql, guard) as cur:
+                if guard is not None:
+                    guard.start_clock()
+                if running is not None:
+                    running.raise_if_cancelled()
+                cur.execute(sql)
+                result = ResultSet.from_cursor(cur, max_rows=guard.max_fetch_rows if guard else None,
+                                               between_batches=_between_batches(conn, running, guard))
+        except psycopg2.Error as exc:
+            _raise_translated(exc, guard)
+            raise
+        finally:
+            if running is not None:
+                running.detach()
+    inc("rows_fetched_total", result.rowcount, mode="memory")
+    if guard is not None:
+        guard.check_rowcount(result.rowcount)
+    return result
 
-    #sort rows deterministically (by all column values as tuple)
-    try:
-        sort_keys = lambda r: tuple((str(k), r[k]) for k in cols)
-        norm_rows = sorted(norm_rows, key=sort_keys)
-    except Exception:
-        
-        norm_rows = sorted(norm_rows, key=lambda r: str(r))
-    return norm_rows, cols
+def _mismatch_mask(u_keys, s_keys, tol_pairs, u_order, s_order) -> np.ndarray:
+    """Per-row mismatch flags for two aligned results: exact keys must match, tolerance columns must be close."""
+    mismatch = np.zeros(len(u_order), dtype=bool)
+    for uk, sk in zip(u_keys, s_keys):
+        a, b = uk[u_order], sk[s_order]
+        if a.dtype == np.float64:
+            mismatch |= ~((a == b) | (np.isnan(a) & np.isnan(b)))
+        else:
+            mismatch |= a != b
+    for (uv, sv, un, sn), (atol, rtol) in tol_pairs:
+        close = np.isclose(uv[u_order], sv[s_order], rtol=rtol, atol=atol, equal_nan=True)
+        mismatch |= ~close | (un[u_order] != sn[s_order])
+    return mismatch
 
 def compare_results(
-    user_rows: List[Dict[str, Any]], user_cols: List[str],
-    sol_rows: List[Dict[str, Any]],  sol_cols: List[str],
-    ignore_column_order: bool = True
+    user: ResultSet, sol: ResultSet,
+    ignore_column_order: bool = True,
+    with_examples: bool = True,
+    options: Optional[CompareOptions] = None
 ) -> Dict[str, Any]:
-    u_rows, u_cols = normalize_for_compare(user_rows, user_cols, ignore_col_order=ignore_column_order)
-    s_rows, s_cols = normalize_for_compare(sol_rows,  sol_cols,  ignore_col_order=ignore_column_order)
+    """Compare two columnar results as multisets of rows using vectorized per-column keys."""
+    options = options or CompareOptions()
+    #columns pair up by (name, occurrence), so repeated names stay positional instead of collapsing
+    u_keyed = sorted(column_keys(user.cols)) if ignore_column_order else column_keys(user.cols)
+    s_keyed = sorted(column_keys(sol.cols)) if ignore_column_order else column_keys(sol.cols)
+    u_cols = [name for name, _ in u_keyed]
+    s_cols = [name for name, _ in s_keyed]
+    same_cols = u_keyed == s_keyed
 
-    equal = (u_rows == s_rows) and ((u_cols == s_cols) if not ignore_column_order else True)
+    u_keys: List[np.ndarray] = []
+    s_keys: List[np.ndarray] = []
+    tol_pairs = []
+    if same_cols:
+        for col, occurrence in s_keyed:
+            u_col, s_col = user.column(col, occurrence), sol.column(col, occurrence)
+            tol = options.tolerance_for(col)
+            values = tolerance_values(u_col, s_col) if tol is not None else None
+            if values is not None:
+                tol_pairs.append((values, tol))
+                continue
+            uk, sk, _ = paired_keys(u_col, s_col, casefold=options.casefold(col))
+            u_keys.extend(uk)
+            s_keys.extend(sk)
+
+    equal = same_cols and user.rowcount == sol.rowcount
+    mismatch = None
+    if equal:
+        if options.ordered:
+            u_order = s_order = np.arange(user.rowcount)
+        else:
+            #exact columns lead the sort so near-equal tolerance values only break ties
+            tol_u = [v[0] for v, _ in tol_pairs]
+            tol_s = [v[1] for v, _ in tol_pairs]
+            u_order = sort_order(u_keys + tol_u, user.rowcount)
+            s_order = sort_order(s_keys + tol_s, sol.rowcount)
+        mismatch = _mismatch_mask(u_keys, s_keys, tol_pairs, u_order, s_order)
+        equal = not mismatch.any()
 
     #diagnostics check
     diag = {
         "equal": equal,
-        "user_rowcount": len(u_rows),
-        "solution_rowcount": len(s_rows),
+        "user_rowcount": user.rowcount,
+        "solution_rowcount": sol.rowcount,
         "user_cols": u_cols,
         "solution_cols": s_cols,
     }
 
-    if not equal:
-        #check diffs
-        u_set = set(map(lambda r: tuple(r.items()), u_rows))
-        s_set = set(map(lambda r: tuple(r.items()), s_rows))
-        missing = s_set - u_set
-        extra   = u_set - s_set
-        diag["missing_rows_example"] = dict(missing.pop()) if missing else None
-        diag["extra_rows_example"]   = dict(extra.pop())   if extra   else None
+    if not equal and with_examples:
+        missing = extra = None
+        if same_cols:
+            u_rows = row_key_tuples(u_keys + [v[0] for v, _ in tol_pairs])
+            s_rows = row_key_tuples(s_keys + [v[1] for v, _ in tol_pairs])
+            if options.exact or mismatch is None:
+                missing = first_difference(s_rows, u_rows)
+                extra = first_difference(u_rows, s_rows)
+            else:
+                #tolerance/order-aware: report the first aligned pair that differs
+                first = int(np.argmax(mismatch))
+                missing, extra = int(s_order[first]), int(u_order[first])
+                if options.ordered and first_difference(s_rows, u_rows) is None and first_difference(u_rows, s_rows) is None:
+                    diag["row_order_mismatch"] = True
+        else:
+            #rows with different column sets never match, so any row is an example
+            missing = 0 if sol.rowcount else None
+            extra = 0 if user.rowcount else None
+        diag["missing_rows_example"] = sol.row(missing, s_cols) if missing is not None else None
+        diag["extra_rows_example"] = user.row(extra, u_cols) if extra is not None else None
 
-        if not ignore_column_order and u_cols != s_cols:
-            diag["column_mismatch"] = {"user": u_cols, "solution": s_cols}
+    if not equal and not ignore_column_order and u_cols != s_cols:
+        diag["column_mismatch"] = {"user": u_cols, "solution": s_cols}
 
     return diag
 
-def validate_sql_pair(user_sql: str, solution_sql: str) -> Dict[str, Any]:
-    """Run both queries and compare results; returns a verdict + diagnostics."""
-    sol_rows, sol_cols = run_query(solution_sql)
-    user_rows, user_cols = run_query(user_sql)
+_HASH_MASK = (1 << 64) - 1
+
+def _hashable_val(value):
+    value = normalize_val(value)
+    #type-tagged stand-ins, so none of them digests like a text value or an int (memory mode keeps these apart too)
+    if isinstance(value, bool):
+        return ("bool", value)
+    #NaN hashes by identity since 3.10, so give it a stable stand-in
+    if isinstance(value, float) and value != value:
+        return ("float", "NaN")
+    #80000 and Decimal('80000.00') are the same answer, so integral floats digest as ints
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, (list, dict)):
+        return ("json", repr(value))
+    return value
+
+def _row_digests(values: Tuple) -> Tuple[int, int]:
+    #hash() collides on small ints (hash(-1) == hash(-2)), so the multiset sums use a real digest
+    digest = hashlib.blake2b(repr(values).encode("utf-8"), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big")
+
+class ResultSummary:
+    """Order-independent multiset fingerprint of a result plus a bounded row sample."""
+
+    def __init__(self, cols: List[str], ignore_col_order: bool, sample_size: int):
+        #a stable sort keeps repeated names (SELECT e.name, d.name) paired by position
+        self._order = sorted(range(len(cols)), key=lambda i: cols[i]) if ignore_col_order else list(range(len(cols)))
+        self.cols = [cols[i] for i in self._order]
+        self.sample_size = sample_size
+        self.rowcount = 0
+        self.sum_a = 0
+        self.sum_b = 0
+        self.sample: List[Dict[str, Any]] = []
+
+    def add(self, row) -> None:
+        values = tuple(_hashable_val(row[i]) for i in self._order)
+        #two independent 64-bit sums; equal multisets give equal sums regardless of row order
+        digest_a, digest_b = _row_digests(values)
+        self.sum_a = (self.sum_a + digest_a) & _HASH_MASK
+        self.sum_b = (self.sum_b + digest_b) & _HASH_MASK
+        self.rowcount += 1
+        if len(self.sample) < self.sample_size:
+            self.sample.append(dict(zip(self.cols, (normalize_val(row[i]) for i in self._order))))
+
+    @property
+    def complete(self) -> bool:
+        return self.rowcount <= self.sample_size
+
+def summarize_query(sql: str, running: Optional[RunningQuery] = None, ignore_col_order: bool = True,
+                    batch_size: Optional[int] = None, sample_size: Optional[int] = None,
+                    guard: Optional[QueryGuard] = None) -> ResultSummary:
+    """Stream a query through a named server-side cursor, holding at most one batch in memory."""
+    _require_safe(sql)
+    batch_size = batch_size or config.STREAM_BATCH_SIZE
+    sample_size = config.STREAM_SAMPLE_ROWS if sample_size is None else sample_size
+    with get_conn() as conn:
+        if running is not None:
+            running.attach(conn)
+        try:
+            if guard is not None:
+                with conn.cursor() as cur:
+                    guard.admit(cur, sql)
+            with conn.cursor(name=f"grade_{uuid.uuid4().hex}") as cur:
+                cur.itersize = batch_size
+                if guard is not None:
+                    guard.start_clock()
+                if running is not None:
+                    running.raise_if_cancelled()
+                cur.execute(sql)
+                batch = cur.fetchmany(batch_size)
+                cols = [desc.name for desc in cur.description]
+                summary = ResultSummary(cols, ignore_col_order, sample_size)
+                while batch:
+                    for row in batch:
+                        summary.add(row)
+                    if guard is not None:
+                        guard.check_rowcount(summary.rowcount)
+                        guard.check_deadline(conn)
+                    if running is not None:
+                        running.raise_if_cancelled()
+                    batch = cur.fetchmany(batch_size)
+        except psycopg2.Error as exc:
+            _raise_translated(exc, guard)
+            raise
+        finally:
+            if running is not None:
+                running.detach()
+    inc("rows_fetched_total", summary.rowcount, mode="stream")
+    return summary
+
+def compare_summaries(user: ResultSummary, sol: ResultSummary, ignore_column_order: bool = True,
+                      with_examples: bool = True) -> Dict[str, Any]:
+    """Streaming counterpart of compare_results; diff examples only when both samples hold the full result."""
+    same_cols = (sorted(user.cols) == sorted(sol.cols)) if ignore_column_order else (user.cols == sol.cols)
+    equal = (
+        same_cols
+        and user.rowcount == sol.rowcount
+        and user.sum_a == sol.sum_a
+        and user.sum_b == sol.sum_b
+    )
+    diag = {
+        "equal": equal,
+        "user_rowcount": user.rowcount,
+        "solution_rowcount": sol.rowcount,
+        "user_cols": user.cols,
+        "solution_cols": sol.cols,
+    }
+    if not equal:
+        if not with_examples:
+            pass
+        elif user.complete and sol.complete:
+            #keyed like the digests: JSON values are unhashable as they are, and True must not match 1
+            u_rows = {tuple((k, _hashable_val(v)) for k, v in r.items()): r for r in user.sample}
+            s_rows = {tuple((k, _hashable_val(v)) for k, v in r.items()): r for r in sol.sample}
+            missing = s_rows.keys() - u_rows.keys()
+            extra = u_rows.keys() - s_rows.keys()
+            diag["missing_rows_example"] = s_rows[missing.pop()] if missing else None
+            diag["extra_rows_example"] = u_rows[extra.pop()] if extra else None
+        else:
+            diag["missing_rows_example"] = None
+            diag["extra_rows_example"] = None
+            diag["examples_unavailable"] = f"results exceed the {sol.sample_size}-row diagnostic sample"
+        if not ignore_column_order and user.cols != sol.cols:
+            diag["column_mismatch"] = {"user": user.cols, "solution": sol.cols}
+    return diag
+
+DB_DIFF_SQL = """
+    WITH sol AS ({solution}
+    ), usr AS ({user}
+    ), missing AS (
+        SELECT {cols} FROM sol EXCEPT ALL SELECT {cols} FROM usr
+    ), extra AS (
+        SELECT {cols} FROM usr EXCEPT ALL SELECT {cols} FROM sol
+    )
+    SELECT
+        (SELECT count(*) FROM missing),
+        (SELECT count(*) FROM extra),
+        (SELECT json_agg(d) FROM (
+            SELECT {cols}, count(*) AS "__count" FROM missing GROUP BY {cols} ORDER BY count(*) DESC LIMIT {limit}
+        ) d),
+        (SELECT json_agg(d) FROM (
+            SELECT {cols}, count(*) AS "__count" FROM extra GROUP BY {cols} ORDER BY count(*) DESC LIMIT {limit}
+        ) d)
+"""
+
+def _as_subquery(sql_text: str) -> pgsql.SQL:
+    return pgsql.SQL(statement_body(sql_text))
+
+def _split_counts(examples) -> List[Dict[str, Any]]:
+    out = []
+    for example in examples or []:
+        count = example.pop("__count")
+        out.append({"row": example, "count": count})
+    return out
+
+def diff_in_database(user_sql: str, solution_sql: str, cols: List[str], limit: Optional[int] = None,
+                     guard: Optional[QueryGuard] = None) -> Dict[str, Any]:
+    """Diff both results inside Postgres with EXCEPT ALL; only counts and a few example rows cross the wire."""
+    _require_safe(user_sql)
+    limit = config.DIFF_EXAMPLE_LIMIT if limit is None else limit
+    col_list = pgsql.SQL(", ").join(pgsql.Identifier(c) for c in cols)
+    query = pgsql.SQL(DB_DIFF_SQL).format(
+        solution=_as_subquery(solution_sql),
+        user=_as_subquery(user_sql),
+        cols=col_list,
+        limit=pgsql.Literal(limit),
+    )
+    try:
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                if guard is not None:
+                    guard.apply_limits(cur)
+                cur.execute(query)
+                missing_count, extra_count, missing, extra = cur.fetchone()
+    except psycopg2.Error as exc:
+        #e.g. column types that EXCEPT cannot match; grading still stands, only the diff is lost
+        return {"db_diff_error": str(exc).strip()}
+    missing_examples = _split_counts(missing)
+    extra_examples = _split_counts(extra)
+    return {
+        "missing_rowcount": missing_count,
+        "extra_rowcount": extra_count,
+        "missing_rows_example": missing_examples[0]["row"] if missing_examples else None,
+        "extra_rows_example": extra_examples[0]["row"] if extra_examples else None,
+        "missing_rows": missing_examples,
+        "extra_rows": extra_examples,
+    }
+
+def _cached_solution(solution_sql: str, use_cache: bool, kind: str, compute):
+    if not use_cache:
+        return compute(), False
+    key = f"{kind}:{solution_key(solution_sql, dataset_fingerprint())}"
+    cached = SOLUTION_CACHE.get(key)
+    inc("solution_cache_total", result="miss" if cached is None else "hit")
+    if cached is not None:
+        return cached, True
+    value = compute()
+    SOLUTION_CACHE.put(key, value)
+    return value, False
+
+def run_solution_query(solution_sql: str, use_cache: bool = True, running: Optional[RunningQuery] = None) -> Tuple[ResultSet, bool]:
+    """Run the official solution, serving repeat grades from the shared cache; returns (result, cached)."""
+    return _cached_solution(solution_sql, use_cache, "rows", lambda: run_query(solution_sql, running=running))
+
+def summarize_solution_query(solution_sql: str, use_cache: bool = True, running: Optional[RunningQuery] = None) -> Tuple[ResultSummary, bool]:
+    return _cached_solution(solution_sql, use_cache, "stream", lambda: summarize_query(solution_sql, running=running))
+
+def profile_solution_query(solution_sql: str, runs: int, use_cache: bool = True) -> Dict[str, Any]:
+    profile, _ = _cached_solution(solution_sql, use_cache, f"perf{runs}", lambda: profile_query(solution_sql, runs))
+    return profile
+
+def grade_performance(user_sql: str, solution_sql: str, settings: Optional[Dict[str, Any]] = None,
+                      use_cache: bool = True, guard: Optional[QueryGuard] = None) -> Dict[str, Any]:
+    """Compare the user's plan and runtime to the solution; settings is the question's `performance:` block."""
+    settings = settings or {}
+    runs = int(settings.get("runs", config.PERF_RUNS))
+    max_ratio = float(settings.get("max_ratio", config.PERF_MAX_RATIO))
+    sol_profile = profile_solution_query(solution_sql, runs, use_cache=use_cache)
+    user_profile = profile_query(user_sql, runs, guard=guard)
+    return compare_performance(user_profile, sol_profile, max_ratio)
+
+#two queries per grade, so this keeps every pooled connection busy without queueing past the pool
+_GRADING_EXECUTOR = ThreadPoolExecutor(max_workers=max(2, config.DB_POOL_MAX), thread_name_prefix="grade")
+
+def _run_pair_concurrently(run_user, run_solution):
+    """Run solution and user queries in parallel; the first failure cancels the other in Postgres."""
+    sol_running, user_running = RunningQuery(), RunningQuery()
+    sol_future = _GRADING_EXECUTOR.submit(run_solution, sol_running)
+    user_future = _GRADING_EXECUTOR.submit(run_user, user_running)
+    try:
+        done, _ = wait([user_future, sol_future], return_when=FIRST_EXCEPTION)
+        if user_future in done and user_future.exception() is not None:
+            sol_running.cancel()
+            wait([sol_future])
+            raise user_future.exception()
+        if sol_future in done and sol_future.exception() is not None:
+            user_running.cancel()
+            wait([user_future])
+            raise sol_future.exception()
+    except BaseException:
+        #also covers the caller being interrupted (e.g. a Streamlit rerun) mid-grade
+        sol_running.cancel()
+        user_running.cancel()
+        raise
+    return sol_future.result(), user_future.result()
+
+def _options_signature(options: CompareOptions) -> Tuple:
+    case = options.case_insensitive
+    return (sorted(options.tolerance.items()), sorted(case) if isinstance(case, set) else case, options.ordered)
+
+def _shortcut_verdict(user: SQLAnalysis, solution_sql: str, scope: str) -> Optional[Dict[str, Any]]:
+    """Correct verdict for an answer canonically equal to the solution or to an accepted answer, without running it."""
+    dataset = dataset_fingerprint()
+    if user.fingerprint == analyze_sql(solution_sql).fingerprint:
+        matched = "solution"
+    elif user.deterministic and ACCEPTED_ANSWERS.contains(scope, user.fingerprint, dataset):
+        matched = "accepted"
+    else:
+        return None
+    cached = SOLUTION_CACHE.get(f"rows:{solution_key(solution_sql, dataset)}")
+    preview = cached.preview(5) if cached is not None else []
+    return {
+        "is_correct": True,
+        "diagnostics": {"equal": True, "shortcut": matched},
+        "user_preview": preview,
+        "solution_preview": preview,
+        "solution_cached": cached is not None,
+        "estimate": None,
+        "performance": None,
+        "warnings": [],
+        "shortcut": matched,
+    }
+
+def validate_sql_pair(user_sql: str, solution_sql: str, use_cache: bool = True, concurrent: Optional[bool] = None,
+                      compare_mode: Optional[str] = None, db_diff: Optional[bool] = None,
+                      compare_options: Optional[Dict[str, Any]] = None,
+                      budget: Optional[Dict[str, Any]] = None,
+                      performance: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Run both queries and compare results; returns a verdict + diagnostics.
+
+    compare_options, budget and performance are the question's optional `compare:`, `budget:` and
+    `performance:` blocks from solutions.yaml. Raises QueryTooExpensive when the user query is over budget.
+    A performance verdict is added when the question has a `performance:` block or PERF_GRADING is on.
+    With SHORTCUT_GRADING, answers canonically equal to the solution or to an earlier accepted answer
+    are graded correct without running either query (`shortcut` names the match).
+    Each stage is timed into backend.metrics under `grade.*`.
+    """
+    with span("grade.total") as timed:
+        verdict = _grade_pair(user_sql, solution_sql, use_cache, concurrent, compare_mode, db_diff,
+                              compare_options, budget, performance)
+        timed.set(correct=verdict["is_correct"], shortcut=verdict["shortcut"])
+    inc("grades_total", correct=verdict["is_correct"])
+    return verdict
+
+def _grade_pair(user_sql, solution_sql, use_cache, concurrent, compare_mode, db_diff, compare_options, budget,
+                performance) -> Dict[str, Any]:
+    if concurrent is None:
+        concurrent = config.GRADE_CONCURRENTLY
+    if db_diff is None:
+        db_diff = config.DIFF_IN_DATABASE
+    compare_mode = compare_mode or config.COMPARE_MODE
+    options = compare_options if isinstance(compare_options, CompareOptions) else CompareOptions.from_config(compare_options)
+    if not options.exact:
+        #fingerprints and EXCEPT ALL are exact by construction, so relaxed comparisons need the columnar path
+        compare_mode, db_diff = "memory", False
+    _require_safe(user_sql)
+    user_analysis = analyze_sql(user_sql)
+    #performance grading needs the user's own plan, so it always runs the query
+    shortcut = use_cache and config.SHORTCUT_GRADING and performance is None and not config.PERF_GRADING
+    scope = answer_scope(solution_sql, _options_signature(options))
+    if shortcut:
+        with span("grade.shortcut") as timed:
+            verdict = _shortcut_verdict(user_analysis, solution_sql, scope)
+            timed.set(matched=verdict["shortcut"] if verdict is not None else None)
+        if verdict is not None:
+            inc("shortcut_grades_total", match=verdict["shortcut"])
+            return verdict
+    guard = QueryGuard(budget)
+    summarize = compare_mode == "stream"
+
+    def run_solution(running=None):
+        with span("grade.solution_query", mode=compare_mode) as timed:
+            out = (summarize_solution_query if summarize else run_solution_query)(solution_sql, use_cache, running)
+            timed.set(cached=out[1], rows=out[0].rowcount)
+            return out
+
+    def run_user(running=None):
+        with span("grade.user_query", mode=compare_mode) as timed:
+            out = summarize_query(user_sql, running, guard=guard) if summarize else run_query(user_sql, running, guard=guard)
+            timed.set(rows=out.rowcount)
+            return out
+
+    if concurrent:
+        sol_out, user_out = _run_pair_concurrently(run_user, run_solution)
+    else:
+        sol_out = run_solution()
+        user_out = run_user()
+
+    with span("grade.compare", mode=compare_mode):
+        if summarize:
+            sol_summary, sol_cached = sol_out
+            cmp_diag = compare_summaries(user_out, sol_summary, ignore_column_order=True, with_examples=not db_diff)
+            user_preview, solution_preview = user_out.sample[:5], sol_summary.sample[:5]
+        else:
+            sol_result, sol_cached = sol_out
+            cmp_diag = compare_results(user_out, sol_result, ignore_column_order=True, with_examples=not db_diff, options=options)
+            user_preview, solution_preview = user_out.preview(5), sol_result.preview(5)
+
+    #EXCEPT ALL needs matching columns; a column mismatch is already explained by the diagnostics
+    if db_diff and not cmp_diag["equal"] and sorted(cmp_diag["user_cols"]) == sorted(cmp_diag["solution_cols"]):
+        with span("grade.db_diff"):
+            cmp_diag.update(diff_in_database(user_sql, solution_sql, sorted(cmp_diag["solution_cols"]), guard=guard))
+
+    perf = None
+    if performance is not None or config.PERF_GRADING:
+        with span("grade.performance"):
+            perf = grade_performance(user_sql, solution_sql, performance, use_cache=use_cache, guard=guard)
+        cmp_diag["performance"] = perf
 
-    cmp_diag = compare_results(user_rows, user_cols, sol_rows, sol_cols, ignore_column_order=True)
     verdict = {
         "is_correct": cmp_diag["equal"],
         "diagnostics": cmp_diag,
-        "user_preview": user_rows[:5],
-        "solution_preview": sol_rows[:5],
+        "user_preview": user_preview,
+        "solution_preview": solution_preview,
+        "solution_cached": sol_cached,
+        "estimate": guard.estimate,
+        "performance": perf,
+        "warnings": guard.warnings,
+        "shortcut": None,
     }
+    if shortcut and verdict["is_correct"] and user_analysis.deterministic:
+        ACCEPTED_ANSWERS.add(scope, user_analysis.fingerprint, dataset_fingerprint())
     return verdict
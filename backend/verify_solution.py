@@ -0,0 +1,106 @@
+import hashlib
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+import psycopg2
+
+from config import config
+from backend.db_pool import get_conn
+from backend.query_plan import explain
+from backend.result_set import normalize_val
+from backend.sql_analysis import analyze_sql
+
+_HASH_MASK = (1 << 64) - 1
+
+#planner settings that change scan/join/aggregate strategy; a deterministic query returns the same rows under all of them
+PLAN_VARIANTS = {
+    "default": {},
+    "no_seqscan": {"enable_seqscan": "off"},
+    "no_indexscan": {"enable_indexscan": "off", "enable_indexonlyscan": "off", "enable_bitmapscan": "off"},
+    "no_hash": {"enable_hashjoin": "off", "enable_hashagg": "off"},
+    "parallel": {
+        "max_parallel_workers_per_gather": "4",
+        "parallel_setup_cost": "0",
+        "parallel_tuple_cost": "0",
+        "min_parallel_table_scan_size": "0",
+    },
+}
+
+
+def _row_digest(row) -> int:
+    #hash() is salted per process, so fingerprints stored in YAML need a stable digest
+    text = repr(tuple(normalize_val(v) for v in row))
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _run_variant(conn, sql: str, settings: Dict[str, str], timeout_ms: int) -> Dict[str, Any]:
+    with conn.cursor() as cur:
+        cur.execute("SELECT set_config('statement_timeout', %s, true)", (str(timeout_ms),))
+        for name, value in settings.items():
+            cur.execute("SELECT set_config(%s, %s, true)", (name, value))
+    started = time.perf_counter()
+    rows, unordered = 0, 0
+    ordered = hashlib.blake2b(digest_size=8)
+    with conn.cursor(name=f"verify_{uuid.uuid4().hex}") as cur:
+        cur.itersize = config.STREAM_BATCH_SIZE
+        cur.execute(sql)
+        for row in cur:
+            digest = _row_digest(row)
+            unordered = (unordered + digest) & _HASH_MASK
+            ordered.update(digest.to_bytes(8, "big"))
+            rows += 1
+    runtime_ms = (time.perf_counter() - started) * 1000
+    conn.rollback()
+    return {"rows": rows, "fingerprint": f"{rows}:{unordered:016x}", "ordered": ordered.hexdigest(), "runtime_ms": runtime_ms}
+
+
+def verify_solution(sql: str, ordered: bool = False, timeout_ms: Optional[int] = None) -> Dict[str, Any]:
+    """Execute a candidate solution under every PLAN_VARIANTS setting and decide whether it is safe to store.
+
+    Rejects queries that error, time out, return no rows, or whose result changes with the plan
+    (LIMIT/OFFSET/DISTINCT ON without ORDER BY, or any ordering when the question compares in order).
+    """
+    timeout_ms = timeout_ms or config.VERIFY_TIMEOUT_MS
+    sql = sql.strip().rstrip(";")
+    analysis = analyze_sql(sql)
+    report: Dict[str, Any] = {"ok": False, "reason": None}
+    if not analysis.safe:
+        report["reason"] = analysis.reason
+        return report
+    if analysis.unordered_limit:
+        report["reason"] = "LIMIT/OFFSET/DISTINCT ON without ORDER BY picks rows by physical order."
+        return report
+    if ordered and not analysis.ordered:
+        report["reason"] = "The question compares rows in order, but the query has no ORDER BY."
+        return report
+    runs = {}
+    try:
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                report["plan_cost"] = round(float(explain(cur, sql)["Plan"]["Total Cost"]), 2)
+            conn.rollback()
+            for name, settings in PLAN_VARIANTS.items():
+                runs[name] = _run_variant(conn, sql, settings, timeout_ms)
+    except psycopg2.errors.QueryCanceled:
+        report["reason"] = f"Timed out after {timeout_ms / 1000:g}s."
+        return report
+    except psycopg2.Error as exc:
+        report["reason"] = f"Query failed: {str(exc).strip().splitlines()[0]}"
+        return report
+
+    base = runs["default"]
+    report.update({
+        "runtime_ms": round(base["runtime_ms"], 2),
+        "rows": base["rows"],
+        "fingerprint": base["fingerprint"],
+    })
+    key = "ordered" if ordered else "fingerprint"
+    unstable = sorted(name for name, run in runs.items() if run[key] != base[key])
+    if base["rows"] == 0:
+        report["reason"] = "Query returned no rows."
+    elif unstable:
+        report["reason"] = f"Result changes with the query plan ({', '.join(unstable)}); the query is not deterministic."
+    else:
+        report["ok"] = True
+    return report
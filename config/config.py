@@ -3,6 +3,9 @@ import os
 
 load_dotenv()
 
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() in {"1", "true", "yes", "on"}
+
 class Config:
     #DB password
     DB_HOST = os.getenv("DB_HOST", "localhost")
@@ -11,14 +14,100 @@ class Config:
     DB_USER = os.getenv("DB_USER", "playground_user")
     DB_PASSWORD = os.getenv("DB_PASSWORD", "playground_pass")
 
+    #connection pool (process-wide, read-only sessions)
+    DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+    DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+    DB_POOL_HEALTHCHECK_SECONDS = float(os.getenv("DB_POOL_HEALTHCHECK_SECONDS", "30"))
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))
+
+    #solution result cache; bump DATASET_VERSION to force invalidation after reseeding
+    SOLUTION_CACHE_SIZE = int(os.getenv("SOLUTION_CACHE_SIZE", "256"))
+    DATASET_VERSION = os.getenv("DATASET_VERSION", "")
+    DATASET_FINGERPRINT_TTL = float(os.getenv("DATASET_FINGERPRINT_TTL", "5"))
+    #answers canonically equal to the solution or to an earlier accepted answer are graded without running them
+    SHORTCUT_GRADING = _env_bool("SHORTCUT_GRADING", "true")
+    ACCEPTED_ANSWERS_PER_QUESTION = int(os.getenv("ACCEPTED_ANSWERS_PER_QUESTION", "64"))
+    ACCEPTED_ANSWERS_MAX_QUESTIONS = int(os.getenv("ACCEPTED_ANSWERS_MAX_QUESTIONS", "1000"))
+
+    #parsed-SQL cache (backend/sql_analysis.py), keyed by query text
+    SQL_ANALYSIS_CACHE_SIZE = int(os.getenv("SQL_ANALYSIS_CACHE_SIZE", "1024"))
+
+    #grading: run solution and user queries in parallel on two pooled connections
+    GRADE_CONCURRENTLY = _env_bool("GRADE_CONCURRENTLY", "true")
+    #"memory" materializes both results; "stream" fingerprints them through server-side cursors
+    COMPARE_MODE = os.getenv("COMPARE_MODE", "memory")
+    STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "2000"))
+    STREAM_SAMPLE_ROWS = int(os.getenv("STREAM_SAMPLE_ROWS", "50"))
+    #on mismatch, diff both results in Postgres with EXCEPT ALL instead of in Python
+    DIFF_IN_DATABASE = _env_bool("DIFF_IN_DATABASE", "false")
+    DIFF_EXAMPLE_LIMIT = int(os.getenv("DIFF_EXAMPLE_LIMIT", "5"))
+
+    #admission control for user SQL; solutions.yaml `budget:` overrides the cost/row budgets per question
+    QUERY_MAX_COST = float(os.getenv("QUERY_MAX_COST", "5000000"))
+    QUERY_WARN_COST = float(os.getenv("QUERY_WARN_COST", "500000"))
+    QUERY_MAX_PLAN_ROWS = float(os.getenv("QUERY_MAX_PLAN_ROWS", "5000000"))
+    USER_MAX_FETCH_ROWS = int(os.getenv("USER_MAX_FETCH_ROWS", "200000"))
+    USER_STATEMENT_TIMEOUT_MS = int(os.getenv("USER_STATEMENT_TIMEOUT_MS", "5000"))
+    USER_WORK_MEM = os.getenv("USER_WORK_MEM", "16MB")
+
+    #performance grading (EXPLAIN ANALYZE); on for every question, or per question via `performance:`
+    PERF_GRADING = _env_bool("PERF_GRADING", "false")
+    PERF_RUNS = int(os.getenv("PERF_RUNS", "3"))
+    PERF_MAX_RATIO = float(os.getenv("PERF_MAX_RATIO", "3.0"))
+    PERF_MIN_MS = float(os.getenv("PERF_MIN_MS", "1.0"))
+
+    #dataset: 0 keeps the small stock seed; N loads the synthetic dataset at scale factor N
+    DATA_SCALE_FACTOR = int(os.getenv("DATA_SCALE_FACTOR", "0"))
+    DATA_SEED = int(os.getenv("DATA_SEED", "42"))
+
     #LLM (OpenAI-compatible local endpoint; Ollama)
     LLM_API_BASE = os.getenv("LLM_API_BASE", "http://localhost:11434/v1")
     LLM_API_KEY  = os.getenv("LLM_API_KEY", "ollama")
     LLM_MODEL    = os.getenv("LLM_MODEL", "gemma2:9b")
+    #shared LLM client: in-flight cap sized to what the local model serves, retries on 429/5xx
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "2"))
+    LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "60"))
+    LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+    LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "120"))
+    LLM_RETRIES = int(os.getenv("LLM_RETRIES", "3"))
+    LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "0.5"))
+    #approximate token budget for the diagnostics JSON in mentor prompts
+    LLM_DIAGNOSTICS_TOKENS = int(os.getenv("LLM_DIAGNOSTICS_TOKENS", "300"))
+    #stream mentor feedback into the page as it is generated
+    LLM_STREAM = _env_bool("LLM_STREAM", "true")
+    #answer recognizable mistakes with templated hints and only call the LLM on request
+    FEEDBACK_RULES = _env_bool("FEEDBACK_RULES", "true")
+    #mentor feedback cache: memory LRU in front of SQLite; empty path keeps it memory-only, 0 entries disables it
+    FEEDBACK_CACHE_PATH = os.getenv("FEEDBACK_CACHE_PATH", ".cache/feedback.sqlite3")
+    FEEDBACK_CACHE_TTL = float(os.getenv("FEEDBACK_CACHE_TTL", str(7 * 24 * 3600)))
+    FEEDBACK_CACHE_MAX_ENTRIES = int(os.getenv("FEEDBACK_CACHE_MAX_ENTRIES", "5000"))
+    FEEDBACK_CACHE_MEMORY_SIZE = int(os.getenv("FEEDBACK_CACHE_MEMORY_SIZE", "256"))
+    #generated solutions are executed under several planner settings before they are saved
+    VERIFY_TIMEOUT_MS = int(os.getenv("VERIFY_TIMEOUT_MS", "10000"))
+
+    #per-stage timing spans; METRICS_PORT serves /metrics (Prometheus text) on localhost, 0 keeps it off
+    METRICS_ENABLED = _env_bool("METRICS_ENABLED", "true")
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+    METRICS_LOG = _env_bool("METRICS_LOG", "false")
+    METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "2048"))
+
+    #grading service (python -m backend.service); the app becomes its thin client when GRADING_SERVICE_URL is set
+    SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+    SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8600"))
+    SERVICE_GRADE_CONCURRENCY = int(os.getenv("SERVICE_GRADE_CONCURRENCY", str(DB_POOL_MAX)))
+    SERVICE_FEEDBACK_CONCURRENCY = int(os.getenv("SERVICE_FEEDBACK_CONCURRENCY", str(LLM_MAX_CONCURRENCY)))
+    SERVICE_QUEUE_DEPTH = int(os.getenv("SERVICE_QUEUE_DEPTH", "32"))
+    SERVICE_QUEUE_TIMEOUT = float(os.getenv("SERVICE_QUEUE_TIMEOUT", "30"))
+    SERVICE_RETRY_AFTER = int(os.getenv("SERVICE_RETRY_AFTER", "1"))
+    GRADING_SERVICE_URL = os.getenv("GRADING_SERVICE_URL", "")
+    GRADING_SERVICE_TIMEOUT = float(os.getenv("GRADING_SERVICE_TIMEOUT", "120"))
 
     #files
     QUESTIONS_PATH = os.getenv("QUESTIONS_PATH", "questions/questions.yaml")
     SOLUTIONS_PATH = os.getenv("SOLUTIONS_PATH", "solutions/solutions.yaml")
+    #compiled index of both files, rebuilt when either changes; empty keeps it in memory only
+    QUESTION_INDEX_PATH = os.getenv("QUESTION_INDEX_PATH", ".cache/question_bank.sqlite3")
 
 
 config = Config()
@@ -23,6 +23,12 @@ CREATE TABLE projects (
     budget NUMERIC(12,2) NOT NULL
 );
 
+-- Secondary indexes (keep in sync with INDEXES in backend/bootstrap_db.py)
+CREATE INDEX idx_employees_department_id ON employees (department_id);
+CREATE INDEX idx_employees_hire_date ON employees (hire_date);
+CREATE INDEX idx_employees_salary ON employees (salary);
+CREATE INDEX idx_projects_department_id ON projects (department_id);
+
 -- Seed departments
 INSERT INTO departments (name) VALUES
 ('Engineering'),
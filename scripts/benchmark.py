@@ -0,0 +1,225 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:
+    #Windows has no getrusage; peak RSS is reported as unavailable there
+    resource = None
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+#the suite measures the grader itself, so lift the per-user guards before config is imported
+os.environ.setdefault("USER_MAX_FETCH_ROWS", str(10**9))
+os.environ.setdefault("QUERY_MAX_COST", "1e15")
+os.environ.setdefault("QUERY_MAX_PLAN_ROWS", "1e12")
+os.environ.setdefault("USER_STATEMENT_TIMEOUT_MS", "0")
+
+BASELINE_PATH = Path("bench/baseline.json")
+
+#result shapes: narrow vs wide, many duplicates, numeric-heavy
+SHAPES = {
+    "narrow": "SELECT id FROM employees",
+    "wide": (
+        "SELECT e.id, e.name, e.department_id, e.salary, e.hire_date, d.name AS department,"
+        " e.salary * 12 AS yearly, e.hire_date + 90 AS probation_end, upper(e.name) AS shout,"
+        " length(e.name) AS name_len"
+        " FROM employees e JOIN departments d ON d.id = e.department_id"
+    ),
+    "duplicates": "SELECT department_id, date_trunc('year', hire_date)::date AS hired FROM employees",
+    "numeric": (
+        "SELECT salary, salary * 1.1 AS raised, salary / 12 AS monthly, id::float8 AS f,"
+        " ln(salary) AS log_salary, department_id FROM employees"
+    ),
+}
+
+STAGES = ("fetch", "normalize", "sort", "compare_equal", "diff", "validate_memory", "validate_stream")
+
+
+def _median_ms(samples):
+    return round(statistics.median(samples) * 1000, 3)
+
+
+def run_case(scale_factor: int, shape: str, repeat: int) -> dict:
+    """Time every grading stage for one (dataset, shape) pair; runs in its own process for a clean peak RSS."""
+    from backend.db_pool import get_conn
+    from backend.result_set import ResultSet, paired_keys, sort_order
+    from backend.validate_sql import compare_results, validate_sql_pair
+
+    sql = SHAPES[shape]
+    timings = {stage: [] for stage in STAGES}
+    rowcount = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        with get_conn() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql)
+                rows = cur.fetchall()
+                cols = [desc.name for desc in cur.description]
+        timings["fetch"].append(time.perf_counter() - started)
+        rowcount = len(rows)
+
+        started = time.perf_counter()
+        result = ResultSet.from_rows(cols, rows)
+        timings["normalize"].append(time.perf_counter() - started)
+
+        rotated = ResultSet.from_rows(cols, rows[1:] + rows[:1])
+        #same row count, one row swapped for a duplicate: forces the example-finding path
+        mismatched = ResultSet.from_rows(cols, rows[:-1] + rows[:1]) if rows else rotated
+        del rows
+
+        started = time.perf_counter()
+        u_keys, s_keys = [], []
+        for col in sorted(cols):
+            uk, sk, _ = paired_keys(rotated.column(col), result.column(col))
+            u_keys.extend(uk)
+            s_keys.extend(sk)
+        sort_order(u_keys, rotated.rowcount)
+        sort_order(s_keys, result.rowcount)
+        timings["sort"].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        compare_results(rotated, result)
+        timings["compare_equal"].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        compare_results(mismatched, result)
+        timings["diff"].append(time.perf_counter() - started)
+
+        for mode in ("memory", "stream"):
+            started = time.perf_counter()
+            validate_sql_pair(sql, sql, use_cache=False, compare_mode=mode)
+            timings[f"validate_{mode}"].append(time.perf_counter() - started)
+
+    #separate pass so tracemalloc overhead never leaks into the timings
+    with get_conn() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql)
+            rows = cur.fetchall()
+            cols = [desc.name for desc in cur.description]
+    tracemalloc.start()
+    result = ResultSet.from_rows(cols, rows)
+    compare_results(ResultSet.from_rows(cols, rows[::-1]), result)
+    _, alloc_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "scale_factor": scale_factor,
+        "shape": shape,
+        "rows": rowcount,
+        "columns": len(cols),
+        "stages_ms": {stage: _median_ms(samples) for stage, samples in timings.items()},
+        "peak_rss_mb": _peak_rss_mb(),
+        "normalize_compare_alloc_mb": round(alloc_peak / (1024 * 1024), 1),
+    }
+
+
+def _peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where getrusage is unavailable."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #ru_maxrss is bytes on macOS but KiB on Linux and the BSDs
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def _key(case: dict) -> str:
+    return f"sf{case['scale_factor']}/{case['shape']}"
+
+
+def check_regressions(results: list, baseline: dict, threshold: float, min_ms: float) -> list:
+    """Stages slower than baseline by more than `threshold` (fractional) and `min_ms` absolute."""
+    regressions = []
+    for case in results:
+        base = baseline.get(_key(case))
+        if not base:
+            continue
+        for stage, ms in case["stages_ms"].items():
+            before = base["stages_ms"].get(stage)
+            if before is None:
+                continue
+            if ms > before * (1 + threshold) and ms - before > min_ms:
+                regressions.append(f"{_key(case)} {stage}: {before:.1f} ms -> {ms:.1f} ms")
+        if case["peak_rss_mb"] and base.get("peak_rss_mb") and case["peak_rss_mb"] > base["peak_rss_mb"] * (1 + threshold):
+            regressions.append(f"{_key(case)} peak RSS: {base['peak_rss_mb']} MB -> {case['peak_rss_mb']} MB")
+    return regressions
+
+
+def print_table(results: list) -> None:
+    header = ["case", "rows"] + list(STAGES) + ["rss_mb", "alloc_mb"]
+    print(" | ".join(header))
+    for case in results:
+        cells = [_key(case), str(case["rows"])]
+        cells += [f"{case['stages_ms'][stage]:.1f}" for stage in STAGES]
+        cells += [str(case["peak_rss_mb"] or "n/a"), str(case["normalize_compare_alloc_mb"])]
+        print(" | ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the grading pipeline across dataset scales and result shapes.")
+    parser.add_argument("--scales", default="1,10", help="comma-separated scale factors; 0 uses the stock seed as loaded")
+    parser.add_argument("--shapes", default=",".join(SHAPES), help=f"comma-separated subset of: {', '.join(SHAPES)}")
+    parser.add_argument("--repeat", type=int, default=3, help="timed repetitions per case (median is reported)")
+    parser.add_argument("--no-load", action="store_true", help="benchmark whatever data is already loaded")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="write these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.20, help="allowed slowdown before flagging (0.20 = 20%%)")
+    parser.add_argument("--min-ms", type=float, default=5.0, help="ignore regressions smaller than this many ms")
+    parser.add_argument("--output", type=Path, help="also write raw results as JSON")
+    args = parser.parse_args()
+
+    from backend.bootstrap_db import load_scaled_dataset
+
+    scales = [int(s) for s in args.scales.split(",") if s.strip()]
+    shapes = [s.strip() for s in args.shapes.split(",") if s.strip()]
+    unknown = set(shapes) - set(SHAPES)
+    if unknown:
+        parser.error(f"unknown shapes: {', '.join(sorted(unknown))}")
+
+    results = []
+    for scale_factor in scales:
+        if scale_factor > 0 and not args.no_load:
+            loaded = load_scaled_dataset(scale_factor)
+            print(f"Loaded SF={scale_factor}: {loaded}")
+        for shape in shapes:
+            #one process per case keeps peak RSS and allocator state independent
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                case = pool.submit(run_case, scale_factor, shape, args.repeat).result()
+            results.append(case)
+            print(f"- {_key(case)}: {case['rows']} rows, validate_memory {case['stages_ms']['validate_memory']:.1f} ms")
+
+    print()
+    print_table(results)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps({_key(case): case for case in results}, indent=2), encoding="utf-8")
+        print(f"\nSaved baseline to {args.baseline}")
+        return
+
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = check_regressions(results, baseline, args.threshold, args.min_ms)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline} (threshold {args.threshold:.0%}).")
+    else:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one.")
+
+
+if __name__ == "__main__":
+    main()
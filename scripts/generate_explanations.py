@@ -1,68 +1,47 @@
+import argparse
 import json
-import re
+import os
 import sys
+import threading
+import time
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
-import requests
 import yaml
 
-try:
-    from config import config
-    LLM_API_BASE = config.LLM_API_BASE
-    LLM_API_KEY = config.LLM_API_KEY
-    LLM_MODEL = config.LLM_MODEL
-    QUESTIONS_PATH = Path(config.QUESTIONS_PATH)
-    SOLUTIONS_PATH = Path(config.SOLUTIONS_PATH)
-except Exception:
-    #fallbacks if config.py isn’t working
-    LLM_API_BASE = "http://localhost:11434/v1"
-    LLM_API_KEY = "ollama"
-    LLM_MODEL = "gemma2:9b"
-    QUESTIONS_PATH = Path("questions/questions.yaml")
-    SOLUTIONS_PATH = Path("solutions/solutions.yaml")
-
-HEADERS = {
-    "Content-Type": "application/json",
-    "Authorization": f"Bearer {LLM_API_KEY}",
-}
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from config import config
+from backend.llm_client import LLM_CLIENT
+from backend.prompts import SCHEMA_HINT, prompt_metrics
+from backend.sql_analysis import analyze_sql
+from backend.verify_solution import verify_solution
 
+LLM_MODEL = config.LLM_MODEL
+QUESTIONS_PATH = Path(config.QUESTIONS_PATH)
+SOLUTIONS_PATH = Path(config.SOLUTIONS_PATH)
+
+#everything static lives in the system prompt, so each question only adds its own text after a cached prefix
 SYSTEM_PROMPT = (
     "You are a senior SQL mentor. You write *only* SELECT queries compatible with PostgreSQL 16. "
     "Given a natural-language SQL practice question and the available schema, produce: "
-    "1) a correct, minimal SELECT SQL solution; 2) a clear, concise human explanation."
-)
-
-SCHEMA_HINT = """\
-Tables:
-- departments(id SERIAL PRIMARY KEY, name VARCHAR(50) NOT NULL)
-- employees(id SERIAL PRIMARY KEY, name VARCHAR(100) NOT NULL,
-            department_id INTEGER REFERENCES departments(id),
-            salary NUMERIC(10,2) NOT NULL, hire_date DATE NOT NULL)
-"""
-
-USER_TEMPLATE = """\
-Question:
-{question}
-
-Schema:
-{schema}
-
-Return a strict JSON object with keys:
+    "1) a correct, minimal SELECT SQL solution; 2) a clear, concise human explanation.\n\n"
+    f"Schema:\n{SCHEMA_HINT}\n"
+    """Return a strict JSON object with keys:
 - "solution_sql": string (a single valid PostgreSQL SELECT; no DDL/DML; no comments)
 - "explanation": string (1-3 sentences)
 
 Example:
-{{
+{
   "solution_sql": "SELECT * FROM employees WHERE salary > 100000;",
   "explanation": "Filters employees with salary above 100,000."
-}}
-"""
-
-SELECT_ONLY = re.compile(r"^\s*select\b", re.IGNORECASE | re.DOTALL)
-FORBIDDEN = re.compile(r"\b(drop|alter|insert|update|delete|truncate|create)\b", re.IGNORECASE)
+}"""
+)
 
-def is_safe_select(sql: str) -> bool:
-    return bool(SELECT_ONLY.match(sql)) and not FORBIDDEN.search(sql)
+USER_TEMPLATE = """\
+Question:
+{question}
+"""
 
 def load_yaml(path: Path):
     if not path.exists():
@@ -77,13 +56,18 @@ def save_yaml(path: Path, data) -> None:
         yaml.safe_dump(data, f, sort_keys=False, allow_unicode=True)
     tmp.replace(path)
 
+def id_order(qid) -> tuple:
+    """Sort key for question ids: numeric ids in numeric order, any other string id still sorts."""
+    qid = str(qid)
+    return (len(qid), qid)
+
 def normalize_questions(raw):
     """
     Accepts:
       - list of {id, question}
       - dict of id -> {question}
       - dict with root key 'questions' containing either of the above
-    Returns: list[{'id': int, 'question': str}]
+    Returns: list[{'id': str, 'question': str}]
     """
     if raw is None:
         return []
@@ -100,7 +84,7 @@ def normalize_questions(raw):
                 raise ValueError(f"Item #{i} is not a dict: {item!r}")
             if "id" not in item or "question" not in item:
                 raise ValueError(f"Item #{i} missing 'id' or 'question': {item!r}")
-            out.append({"id": int(item["id"]), "question": str(item["question"]).strip()})
+            out.append({"id": str(item["id"]).strip(), "question": str(item["question"]).strip()})
         return out
 
     #dict keyed by id
@@ -109,9 +93,9 @@ def normalize_questions(raw):
         for k, v in raw.items():
             if not isinstance(v, dict) or "question" not in v:
                 raise ValueError(f"Key {k!r} must map to a dict with 'question'. Got: {v!r}")
-            out.append({"id": int(k), "question": str(v["question"]).strip()})
+            out.append({"id": str(k).strip(), "question": str(v["question"]).strip()})
         #maintain numeric order
-        out.sort(key=lambda x: x["id"])
+        out.sort(key=lambda x: id_order(x["id"]))
         return out
 
     raise ValueError(f"Unsupported YAML structure for questions: {type(raw)}")
@@ -133,20 +117,21 @@ def normalize_solutions(raw):
         out[key] = v
     return out
 
-def call_llm(question: str) -> dict:
+def call_llm(question: str):
+    """Returns (parsed JSON, prompt metrics)."""
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": USER_TEMPLATE.format(question=question)},
+    ]
     payload = {
         "model": LLM_MODEL,
-        "messages": [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": USER_TEMPLATE.format(question=question, schema=SCHEMA_HINT)},
-        ],
+        "messages": messages,
         "temperature": 0.2,
         "stream": False,
     }
-    resp = requests.post(f"{LLM_API_BASE}/chat/completions", headers=HEADERS, data=json.dumps(payload), timeout=120)
-    resp.raise_for_status()
-    data = resp.json()
+    data = LLM_CLIENT.chat(payload)
     content = data["choices"][0]["message"]["content"].strip()
+    metrics = prompt_metrics(messages, data.get("usage"), data.get("timings"))
 
     #find JSON in the content
     try:
@@ -157,11 +142,163 @@ def call_llm(question: str) -> dict:
             if parts:
                 json_str = parts[0]
         parsed = json.loads(json_str)
-        return parsed
+        return parsed, metrics
     except Exception as e:
         raise ValueError(f"Failed to parse JSON from model output:\n{content}\nError: {e}") from e
 
-def main():
+def parse_ids(spec: str):
+    """'1,4,10-12,joins-a' -> {'1', '4', '10', '11', '12', 'joins-a'}; only number-number is a range."""
+    ids = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        lo, dash, hi = part.partition("-")
+        if dash and lo.strip().isdigit() and hi.strip().isdigit():
+            ids.update(str(i) for i in range(int(lo), int(hi) + 1))
+        else:
+            ids.add(str(int(part)) if part.isdigit() else part)
+    return ids
+
+def journal_path_for(solutions_path: Path) -> Path:
+    return solutions_path.with_name(solutions_path.stem + ".journal.jsonl")
+
+def read_journal(path: Path) -> dict:
+    """Accepted solutions from an unfinished run; a torn last line from a crash is dropped."""
+    done = {}
+    if not path.exists():
+        return done
+    #cut the torn line off, or the next appended entry would be glued onto it and lost as well
+    with path.open("rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            done[str(entry.pop("id"))] = entry
+    return done
+
+class Journal:
+    """Append-only JSONL checkpoint; each accepted solution is flushed and fsynced before it counts as done."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = path.open("a", encoding="utf-8")
+
+    def append(self, qid: str, entry: dict) -> None:
+        line = json.dumps(dict(entry, id=qid), ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+def merge_entry(existing, entry: dict) -> dict:
+    """New solution fields first; per-question settings (compare:, budget:, ...) from the YAML are kept."""
+    merged = dict(entry)
+    for key, value in (existing or {}).items():
+        #a `verified:` block describes the old SQL, not the new one
+        if key != "verified":
+            merged.setdefault(key, value)
+    return merged
+
+def _is_ordered(existing) -> bool:
+    return bool(((existing or {}).get("compare") or {}).get("ordered", False))
+
+def verified_block(sql: str, ordered: bool = False) -> dict:
+    """Runs verify_solution and returns the `verified:` block stored with the solution, or raises with the reason."""
+    report = verify_solution(sql, ordered=ordered)
+    if not report["ok"]:
+        raise ValueError(f"Verification failed: {report['reason']}")
+    return {
+        "runtime_ms": report["runtime_ms"],
+        "rows": report["rows"],
+        "plan_cost": report["plan_cost"],
+        "fingerprint": report["fingerprint"],
+        "verified_on": date.today().isoformat(),
+    }
+
+def generate_one(qtext: str, verify: bool = True, ordered: bool = False):
+    """Returns (solution entry, prompt metrics) or raises with the reason the candidate was rejected."""
+    result, metrics = call_llm(qtext)
+    sol = (result.get("solution_sql") or "").strip().rstrip(";") + ";"
+    exp = (result.get("explanation") or "").strip()
+
+    if sol == ";":
+        raise ValueError("Model returned empty solution_sql.")
+    analysis = analyze_sql(sol)
+    if not analysis.safe:
+        raise ValueError(f"Generated SQL rejected: {analysis.reason}")
+    entry = {"solution_sql": sol, "explanation": exp}
+    if verify:
+        entry["verified"] = verified_block(sol, ordered)
+    return entry, metrics
+
+def _format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+def _prompt_note(metrics) -> str:
+    prompt_tokens = metrics["prompt_tokens"] or metrics["prompt_tokens_estimated"]
+    evaluated = metrics["prompt_tokens_evaluated"]
+    return (f"prompt {prompt_tokens} tokens"
+            + (f", {evaluated} evaluated" if evaluated is not None else "")
+            + (f", {metrics['prompt_eval_ms']:.0f} ms prompt eval" if metrics["prompt_eval_ms"] is not None else ""))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate missing solutions and explanations with the local LLM.")
+    parser.add_argument("--workers", type=int, default=config.LLM_MAX_CONCURRENCY,
+                        help="concurrent LLM requests (default: LLM_MAX_CONCURRENCY)")
+    parser.add_argument("--only", help="question ids to consider, e.g. 1,4,10-20")
+    parser.add_argument("--limit", type=int, help="stop after this many questions")
+    parser.add_argument("--regenerate", action="store_true", help="also regenerate questions that already have a solution")
+    parser.add_argument("--restart", action="store_true", help="discard the checkpoint of an unfinished run")
+    parser.add_argument("--no-verify", action="store_true", help="save candidates without executing them against the database")
+    parser.add_argument("--verify-only", action="store_true",
+                        help="re-verify existing solutions and refresh their `verified:` blocks; no LLM calls")
+    return parser.parse_args(argv)
+
+def verify_existing(solutions: dict, ids, workers: int) -> None:
+    """Re-run verification for stored solutions in parallel, refreshing `verified:` and reporting rejects."""
+    todo = [qid for qid in sorted(solutions, key=id_order) if ids is None or qid in ids]
+    print(f"Verifying {len(todo)} solution(s) with {workers} worker(s)...\n")
+    rejected = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(verified_block, solutions[qid]["solution_sql"], _is_ordered(solutions[qid])): qid
+            for qid in todo
+        }
+        for future in as_completed(futures):
+            qid = futures[future]
+            try:
+                block = future.result()
+            except Exception as e:
+                rejected += 1
+                solutions[qid].pop("verified", None)
+                print(f"QID {qid} rejected: {e}")
+            else:
+                solutions[qid]["verified"] = block
+                print(f"QID {qid} ok ({block['rows']} rows, {block['runtime_ms']:.1f} ms, cost {block['plan_cost']:g})")
+    save_yaml(SOLUTIONS_PATH, solutions)
+    print(f"\nUpdated {SOLUTIONS_PATH}: {len(todo) - rejected} verified, {rejected} rejected.")
+    if rejected:
+        sys.exit(1)
+
+
+def main(argv=None):
+    args = parse_args(argv)
     raw_questions = load_yaml(QUESTIONS_PATH)
     raw_solutions = load_yaml(SOLUTIONS_PATH)
 
@@ -179,43 +316,84 @@ def main():
     except Exception:
         solutions = {}
 
-    missing = [q for q in questions if str(q["id"]) not in solutions]
-    if not missing:
-        print("No missing entries. solutions.yaml already covers all questions.")
+    journal_path = journal_path_for(SOLUTIONS_PATH)
+    if args.restart and journal_path.exists():
+        journal_path.unlink()
+    checkpoint = read_journal(journal_path)
+    for qid, entry in checkpoint.items():
+        solutions[qid] = merge_entry(solutions.get(qid), entry)
+    if checkpoint:
+        print(f"Resuming: {len(checkpoint)} solution(s) recovered from {journal_path}.")
+
+    only = parse_ids(args.only) if args.only else None
+    if args.verify_only:
+        verify_existing(solutions, only, max(1, args.workers))
+        return
+    todo = [
+        q for q in questions
+        if (only is None or str(q["id"]) in only)
+        and str(q["id"]) not in checkpoint
+        and (args.regenerate or str(q["id"]) not in solutions)
+    ]
+    if args.limit is not None:
+        todo = todo[:args.limit]
+    if not todo:
+        if checkpoint:
+            save_yaml(SOLUTIONS_PATH, solutions)
+            journal_path.unlink()
+            print(f"Nothing left to generate; wrote recovered solutions to {SOLUTIONS_PATH}.")
+        else:
+            print("No missing entries. solutions.yaml already covers all questions.")
         return
 
-    print(f"Found {len(missing)} question(s) without solutions. Generating...\n")
-
-    updated = False
-    for q in missing:
-        qid = str(q["id"])
-        qtext = q["question"].strip()
-        print(f"- Generating solution for QID {qid}: {qtext[:80]}...")
-
-        try:
-            result = call_llm(qtext)
-            sol = (result.get("solution_sql") or "").strip().rstrip(";") + ";"
-            exp = (result.get("explanation") or "").strip()
-
-            if not sol:
-                raise ValueError("Model returned empty solution_sql.")
-            if not is_safe_select(sol):
-                raise ValueError("Generated SQL is not a safe SELECT or contains forbidden keywords.")
-
-            solutions[qid] = {
-                "solution_sql": sol,
-                "explanation": exp,
-            }
-            updated = True
-            print(f"Saved.")
-
-        except Exception as e:
-            print(f"Skipped QID {qid}: {e}")
-
-    if updated:
+    workers = max(1, args.workers)
+    if workers > config.LLM_MAX_CONCURRENCY:
+        print(f"Note: LLM_MAX_CONCURRENCY={config.LLM_MAX_CONCURRENCY} caps in-flight requests below --workers={workers}.")
+    print(f"Generating {len(todo)} solution(s) with {workers} worker(s)...\n")
+
+    journal = Journal(journal_path)
+    started = time.monotonic()
+    done = failed = 0
+    pool = ThreadPoolExecutor(max_workers=workers)
+    futures = {
+        pool.submit(generate_one, q["question"].strip(), not args.no_verify, _is_ordered(solutions.get(str(q["id"])))): q
+        for q in todo
+    }
+    try:
+        for future in as_completed(futures):
+            q = futures[future]
+            qid = str(q["id"])
+            try:
+                entry, metrics = future.result()
+            except Exception as e:
+                failed += 1
+                outcome = f"skipped: {e}"
+            else:
+                journal.append(qid, entry)
+                solutions[qid] = merge_entry(solutions.get(qid), entry)
+                done += 1
+                outcome = f"saved ({_prompt_note(metrics)})"
+            finished = done + failed
+            elapsed = time.monotonic() - started
+            rate = finished / elapsed if elapsed > 0 else 0.0
+            eta = (len(todo) - finished) / rate if rate > 0 else 0.0
+            print(f"[{finished}/{len(todo)}] QID {qid} {outcome} | {rate * 60:.1f}/min, ETA {_format_duration(eta)}")
+    except KeyboardInterrupt:
+        pool.shutdown(wait=False, cancel_futures=True)
+        journal.close()
+        print(f"\nInterrupted. {done} solution(s) are checkpointed in {journal_path}; re-run to resume.")
+        #don't wait for in-flight LLM calls: anything not journaled yet is simply redone on resume
+        os._exit(130)
+    pool.shutdown()
+    journal.close()
+
+    if done or checkpoint:
         save_yaml(SOLUTIONS_PATH, solutions)
-        print(f"\nUpdated {SOLUTIONS_PATH} successfully.")
+        journal_path.unlink()
+        print(f"\nUpdated {SOLUTIONS_PATH} successfully: {done} generated, {failed} failed"
+              f" in {_format_duration(time.monotonic() - started)}.")
     else:
+        journal.path.unlink()
         print("\nNo updates written (all generations failed or were unsafe).")
 
 if __name__ == "__main__":
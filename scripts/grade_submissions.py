@@ -0,0 +1,279 @@
+import argparse
+import csv
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from config import config
+from backend.metrics import metrics_stats
+from backend.question_bank import QuestionBank
+from backend.query_plan import QueryTooExpensive
+from backend.validate_sql import run_solution_query, summarize_solution_query, validate_sql_pair
+
+FIELDS = ["submission", "student_id", "question_id", "status", "is_correct", "shortcut", "ms",
+          "user_rowcount", "solution_rowcount", "message"]
+#accepted spellings of the three input columns
+ALIASES = {
+    "student_id": ("student_id", "student", "user_id"),
+    "question_id": ("question_id", "question", "qid"),
+    "sql": ("sql", "query", "answer", "user_sql"),
+}
+
+
+def _field(row: dict, name: str) -> str:
+    for key in ALIASES[name]:
+        if row.get(key) not in (None, ""):
+            return str(row[key])
+    return ""
+
+
+def read_submissions(path: Path):
+    """Rows of {submission, student_id, question_id, sql} from CSV or JSONL.
+
+    `submission` is the row's own `submission_id` when present, else student:question:n where n counts
+    repeat attempts, so the key is stable across runs as long as the input file only grows.
+    """
+    with path.open("r", encoding="utf-8-sig", newline="") as f:
+        if path.suffix.lower() in (".jsonl", ".ndjson"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+    attempts = defaultdict(int)
+    out = []
+    for row in rows:
+        student, qid = _field(row, "student_id"), _field(row, "question_id")
+        attempts[(student, qid)] += 1
+        key = str(row.get("submission_id") or f"{student}:{qid}:{attempts[(student, qid)]}")
+        out.append({"submission": key, "student_id": student, "question_id": qid, "sql": _field(row, "sql")})
+    return out
+
+
+def _trim_torn_tail(path: Path) -> None:
+    """Drop a half-written last line left by a crash, so appended records start on a fresh line."""
+    with path.open("rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def read_results(path: Path) -> dict:
+    """Already graded records by submission key (CSV values come back as strings)."""
+    done = {}
+    if not path.exists():
+        return done
+    _trim_torn_tail(path)
+    with path.open("r", encoding="utf-8", newline="") as f:
+        if path.suffix.lower() == ".csv":
+            records = list(csv.DictReader(f))
+        else:
+            records = [json.loads(line) for line in f if line.strip()]
+    for record in records:
+        if record.get("submission") and record.get("status"):
+            done[record["submission"]] = record
+    return done
+
+
+class ResultWriter:
+    """Appends one record per graded submission and flushes it, so an interrupted run loses nothing written."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.csv = path.suffix.lower() == ".csv"
+        fresh = not path.exists() or path.stat().st_size == 0
+        self._file = path.open("a", encoding="utf-8", newline="")
+        self._lock = threading.Lock()
+        if self.csv:
+            self._writer = csv.DictWriter(self._file, fieldnames=FIELDS, extrasaction="ignore")
+            if fresh:
+                self._writer.writeheader()
+
+    def write(self, record: dict) -> None:
+        with self._lock:
+            if self.csv:
+                self._writer.writerow(record)
+            else:
+                self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+
+class SolutionWarmer:
+    """Runs each question's solution once into the shared solution cache before its submissions are graded."""
+
+    def __init__(self, compare_mode: str):
+        self.compare_mode = compare_mode
+        self._locks = defaultdict(threading.Lock)
+        self._guard = threading.Lock()
+        self._warm = set()
+
+    def ensure(self, qid: str, solution_sql: str) -> None:
+        with self._guard:
+            lock = self._locks[qid]
+        with lock:
+            if qid in self._warm:
+                return
+            if self.compare_mode == "stream":
+                summarize_solution_query(solution_sql)
+            else:
+                run_solution_query(solution_sql)
+            self._warm.add(qid)
+
+
+def grade_one(sub: dict, solution: dict, warmer: SolutionWarmer, compare_mode: str, timeout_ms) -> dict:
+    record = {k: sub[k] for k in ("submission", "student_id", "question_id")}
+    record.update(status="error", is_correct=False, shortcut=None, user_rowcount=None, solution_rowcount=None, message="")
+    started = time.perf_counter()
+    try:
+        solution_sql = solution.get("solution_sql")
+        if not solution_sql:
+            record.update(status="no_solution", message=f"No solution for question {sub['question_id']}.")
+            return record
+        if not sub["sql"].strip():
+            record.update(status="empty", message="No SQL submitted.")
+            return record
+        warmer.ensure(sub["question_id"], solution_sql)
+        budget = dict(solution.get("budget") or {})
+        if timeout_ms:
+            budget["timeout_ms"] = timeout_ms
+        #the solution is already cached, so there is nothing to overlap the user query with
+        verdict = validate_sql_pair(sub["sql"], solution_sql, concurrent=False, compare_mode=compare_mode,
+                                    compare_options=solution.get("compare"), budget=budget,
+                                    performance=solution.get("performance"))
+        diag = verdict["diagnostics"]
+        record.update(
+            status="correct" if verdict["is_correct"] else "incorrect",
+            is_correct=verdict["is_correct"],
+            shortcut=verdict["shortcut"],
+            user_rowcount=diag.get("user_rowcount"),
+            solution_rowcount=diag.get("solution_rowcount"),
+        )
+    except QueryTooExpensive as e:
+        record.update(status="too_expensive", message=str(e))
+    except ValueError as e:
+        record.update(status="rejected", message=str(e))
+    except Exception as e:
+        #psycopg2 errors, cancellations, a malformed solution entry: one bad submission must not stop the exam run
+        record.update(status="error", message=str(e).strip().splitlines()[0] if str(e).strip() else type(e).__name__)
+    finally:
+        record["ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return record
+
+
+def summarize(records, elapsed: float, graded_now: int) -> dict:
+    per_question = defaultdict(lambda: defaultdict(int))
+    latencies = defaultdict(list)
+    statuses = defaultdict(int)
+    for r in records:
+        statuses[r["status"]] += 1
+        q = per_question[str(r["question_id"])]
+        q["submissions"] += 1
+        q[r["status"]] += 1
+        latencies[str(r["question_id"])].append(float(r["ms"] or 0))
+    questions = {}
+    for qid in sorted(per_question, key=lambda k: (len(k), k)):
+        q = dict(per_question[qid])
+        q["correct_pct"] = round(100 * q.get("correct", 0) / q["submissions"], 1)
+        q["median_ms"] = round(statistics.median(latencies[qid]), 2)
+        questions[qid] = q
+    return {
+        "submissions": len(records),
+        "graded_this_run": graded_now,
+        "seconds": round(elapsed, 2),
+        "per_second": round(graded_now / elapsed, 1) if elapsed > 0 else None,
+        "statuses": dict(sorted(statuses.items())),
+        "questions": questions,
+        "stages": metrics_stats()["stages"],
+    }
+
+
+def print_summary(summary: dict) -> None:
+    print(f"\n{summary['submissions']} submission(s), {summary['graded_this_run']} graded this run in "
+          f"{summary['seconds']}s ({summary['per_second'] or 0}/s).")
+    print("  " + ", ".join(f"{status}: {n}" for status, n in summary["statuses"].items()))
+    print(f"\n{'question':>10} {'subs':>6} {'correct':>8} {'wrong':>6} {'errors':>7} {'correct%':>9} {'median ms':>10}")
+    for qid, q in summary["questions"].items():
+        errors = q["submissions"] - q.get("correct", 0) - q.get("incorrect", 0)
+        print(f"{qid:>10} {q['submissions']:>6} {q.get('correct', 0):>8} {q.get('incorrect', 0):>6} {errors:>7} "
+              f"{q['correct_pct']:>9} {q['median_ms']:>10}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Grade a CSV/JSONL of (student_id, question_id, sql) submissions.")
+    parser.add_argument("submissions", type=Path, help="CSV with a header row, or JSONL")
+    parser.add_argument("-o", "--output", type=Path, help="results file, .jsonl or .csv (default: <input>.results.jsonl)")
+    parser.add_argument("--workers", type=int, default=config.DB_POOL_MAX,
+                        help="submissions graded at once (default DB_POOL_MAX; more only queue for a connection)")
+    parser.add_argument("--timeout-ms", type=int, help="statement timeout per user query (default USER_STATEMENT_TIMEOUT_MS)")
+    parser.add_argument("--compare-mode", choices=("memory", "stream"), default=config.COMPARE_MODE)
+    parser.add_argument("--summary", type=Path, help="also write the summary as JSON here")
+    parser.add_argument("--restart", action="store_true", help="discard existing results instead of resuming")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    output = args.output or args.submissions.with_name(args.submissions.stem + ".results.jsonl")
+    if args.restart and output.exists():
+        output.unlink()
+    submissions = read_submissions(args.submissions)
+    done = read_results(output)
+    if done:
+        print(f"Resuming: {len(done)} submission(s) already graded in {output}.")
+
+    bank = QuestionBank(Path(config.QUESTIONS_PATH), Path(config.SOLUTIONS_PATH), config.QUESTION_INDEX_PATH)
+    bank.refresh()
+    #grouped by question, so each solution is run once and stays hot in the cache while its group is graded
+    todo = sorted((s for s in submissions if s["submission"] not in done), key=lambda s: s["question_id"])
+    solutions = {qid: bank.solution(qid) for qid in {s["question_id"] for s in todo}}
+    records = list(done.values())
+    if not todo:
+        print("Nothing left to grade.")
+    else:
+        workers = max(1, args.workers)
+        print(f"Grading {len(todo)} submission(s) for {len(solutions)} question(s) with {workers} worker(s)...")
+
+    warmer = SolutionWarmer(args.compare_mode)
+    writer = ResultWriter(output)
+    started = time.monotonic()
+    graded = 0
+    pool = ThreadPoolExecutor(max_workers=max(1, args.workers), thread_name_prefix="batch")
+    futures = [pool.submit(grade_one, s, solutions[s["question_id"]], warmer, args.compare_mode, args.timeout_ms)
+               for s in todo]
+    try:
+        for future in as_completed(futures):
+            record = future.result()
+            writer.write(record)
+            records.append(record)
+            graded += 1
+            if graded % 100 == 0 or graded == len(todo):
+                elapsed = time.monotonic() - started
+                print(f"[{graded}/{len(todo)}] {graded / elapsed if elapsed > 0 else 0:.1f}/s")
+    except KeyboardInterrupt:
+        pool.shutdown(wait=False, cancel_futures=True)
+        writer.close()
+        print(f"\nInterrupted after {graded} submission(s); results so far are in {output}. Re-run to resume.")
+        #in-flight queries are not waited for: anything not written yet is graded again on resume
+        os._exit(130)
+    pool.shutdown()
+    writer.close()
+
+    summary = summarize(records, time.monotonic() - started, graded)
+    print_summary(summary)
+    print(f"\nResults: {output}")
+    if args.summary:
+        args.summary.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+        print(f"Summary: {args.summary}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+import sqlglot
+from sqlglot import exp
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from stub_llm import start_stub
+
+#wrong answers a student might plausibly submit, derived from the official solution
+PERTURBATIONS = ("boundary", "drop_filter", "distinct", "drop_column", "literal", "limit", "star")
+_FLIP = {exp.GT: exp.GTE, exp.GTE: exp.GT, exp.LT: exp.LTE, exp.LTE: exp.LT}
+
+
+def perturb(sql: str, kind: str):
+    """A deliberately wrong variant of sql, or None when the perturbation does not apply."""
+    try:
+        tree = sqlglot.parse_one(sql, read="postgres")
+    except sqlglot.errors.ParseError:
+        return None
+    select = tree if isinstance(tree, exp.Select) else tree.find(exp.Select)
+    if select is None:
+        return None
+    if kind == "boundary":
+        node = tree.find(*_FLIP)
+        if node is None:
+            return None
+        node.replace(_FLIP[type(node)](this=node.this.copy(), expression=node.expression.copy()))
+    elif kind == "drop_filter":
+        if select.args.get("where") is None:
+            return None
+        select.set("where", None)
+    elif kind == "distinct":
+        select.set("distinct", None if select.args.get("distinct") else exp.Distinct())
+    elif kind == "drop_column":
+        if len(select.expressions) < 2:
+            return None
+        select.set("expressions", select.expressions[:-1])
+    elif kind == "literal":
+        node = next((n for n in tree.find_all(exp.Literal) if n.is_number), None)
+        if node is None:
+            return None
+        node.replace(exp.Literal.number(float(node.this) + 1 if "." in node.this else int(node.this) + 1))
+    elif kind == "limit":
+        select.set("limit", exp.Limit(expression=exp.Literal.number(1)))
+    elif kind == "star":
+        if any(isinstance(e, exp.Star) for e in select.expressions):
+            return None
+        select.set("expressions", [exp.Star()])
+    return tree.sql(dialect="postgres")
+
+
+def correct_variants(sql: str):
+    """The solution itself (graded by the shortcut) plus an equivalent rewrite that has to be executed."""
+    variants = [sql]
+    try:
+        tree = sqlglot.parse_one(sql, read="postgres")
+        if isinstance(tree, exp.Select):
+            variants.append(tree.where("1 = 1").sql(dialect="postgres"))
+    except sqlglot.errors.ParseError:
+        pass
+    return variants
+
+
+def _graded_wrong(sql: str, solution: dict) -> bool:
+    """Only perturbations that run and really change the result count as wrong answers (on small data many don't)."""
+    from backend.validate_sql import validate_sql_pair
+    try:
+        return not validate_sql_pair(sql, solution["solution_sql"], compare_options=solution.get("compare"),
+                                     budget=solution.get("budget"))["is_correct"]
+    except Exception:
+        return False
+
+
+def load_workload(bank):
+    """[(question, solution entry, correct answers, wrong answers)] for every question with a solution."""
+    work = []
+    for qid in bank.ids():
+        solution = bank.solution(qid)
+        sql = (solution.get("solution_sql") or "").strip().rstrip(";")
+        if not sql:
+            continue
+        candidates = {v for v in (perturb(sql, kind) for kind in PERTURBATIONS) if v and v != sql}
+        wrong = sorted(v for v in candidates if _graded_wrong(v, solution))
+        work.append((bank.question(qid), solution, correct_variants(sql), wrong))
+    return work
+
+
+class ConnectionSampler:
+    """Samples pg_stat_activity for this database on its own connection while the test runs."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples = []
+        self.max_connections = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="pg-sampler", daemon=True)
+
+    def _run(self):
+        from backend.db_pool import get_conn
+        with get_conn(readonly=False) as conn:
+            with conn.cursor() as cur:
+                cur.execute("SHOW max_connections")
+                self.max_connections = int(cur.fetchone()[0])
+                while not self._stop.is_set():
+                    cur.execute("""
+                        SELECT count(*),
+                               count(*) FILTER (WHERE state = 'active'),
+                               count(*) FILTER (WHERE state = 'idle'),
+                               count(*) FILTER (WHERE state LIKE 'idle in transaction%')
+                        FROM pg_stat_activity
+                        WHERE datname = current_database() AND pid <> pg_backend_pid()
+                    """)
+                    self.samples.append(cur.fetchone())
+                    #pg_stat_activity is snapshotted per transaction
+                    conn.commit()
+                    self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+    def summary(self):
+        names = ("total", "active", "idle", "idle_in_transaction")
+        if not self.samples:
+            return {"samples": 0, "max_connections": self.max_connections}
+        columns = list(zip(*self.samples))
+        return {
+            "samples": len(self.samples),
+            "max_connections": self.max_connections,
+            "peak": {name: max(col) for name, col in zip(names, columns)},
+            "mean": {name: round(sum(col) / len(col), 1) for name, col in zip(names, columns)},
+        }
+
+
+class VirtualUser(threading.Thread):
+    """Works through the questions: think, answer (right or wrong), get graded, ask the mentor when wrong."""
+
+    def __init__(self, index: int, work, args, stats, stop: threading.Event):
+        super().__init__(name=f"vu-{index}", daemon=True)
+        self.index = index
+        self.work = work
+        self.args = args
+        self.stats = stats
+        self.stop_event = stop
+        self.rng = random.Random(args.seed * 1000 + index)
+
+    def think(self) -> None:
+        if self.args.think_ms > 0:
+            #exponential think times, capped so one unlucky draw doesn't idle a user for the whole run
+            pause = min(self.rng.expovariate(1000 / self.args.think_ms), 5 * self.args.think_ms / 1000)
+            self.stop_event.wait(pause)
+
+    def run(self) -> None:
+        from backend import metrics
+        from backend.llm_feedback import get_feedback
+        from backend.validate_sql import validate_sql_pair
+
+        self.stop_event.wait(self.args.ramp_up * self.index / max(1, self.args.users))
+        position = self.index
+        while not self.stop_event.is_set():
+            question, solution, correct, wrong = self.work[position % len(self.work)]
+            position += 1
+            self.think()
+            if self.stop_event.is_set():
+                break
+            expect_correct = not wrong or self.rng.random() < self.args.correct_ratio
+            user_sql = self.rng.choice(correct if expect_correct else wrong)
+            started = time.perf_counter()
+            try:
+                with metrics.span("vu.grade"):
+                    verdict = validate_sql_pair(user_sql, solution["solution_sql"], use_cache=not self.args.cold,
+                                                compare_options=solution.get("compare"), budget=solution.get("budget"),
+                                                performance=solution.get("performance"))
+            except Exception as exc:
+                self.stats.record("grade", exc)
+                continue
+            self.stats.record("grade", None, verdict["is_correct"], expect_correct)
+            if not verdict["is_correct"] and self.rng.random() < self.args.feedback_ratio:
+                try:
+                    with metrics.span("vu.feedback"):
+                        get_feedback(question["question"], user_sql, solution["solution_sql"],
+                                     solution.get("explanation", ""), verdict["diagnostics"],
+                                     question_id=None if self.args.cold else str(question["id"]))
+                except Exception as exc:
+                    self.stats.record("feedback", exc)
+                else:
+                    self.stats.record("feedback", None)
+            metrics.observe("vu.iteration", time.perf_counter() - started)
+
+
+class RunStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ops = Counter()
+        self.errors = Counter()
+        self.outcomes = Counter()
+
+    def record(self, op: str, error, is_correct=None, expected=None) -> None:
+        with self._lock:
+            self.ops[op] += 1
+            if error is not None:
+                self.errors[f"{op}:{type(error).__name__}"] += 1
+            elif is_correct is not None:
+                self.outcomes["correct" if is_correct else "incorrect"] += 1
+                if is_correct != expected:
+                    #a rewrite of the solution graded wrong, or a perturbation that happens to match
+                    self.outcomes["unexpected"] += 1
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parents[1], timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_report(report: dict) -> None:
+    t = report["throughput"]
+    print(f"\n{report['users']} users for {report['duration_s']}s: {t['iterations_per_s']} iterations/s, "
+          f"{t['grades_per_s']} grades/s, {t['feedback_per_s']} feedback/s")
+    print(f"  outcomes: {dict(report['outcomes'])}")
+    print(f"  errors: {report['error_rate']:.2%} {dict(report['errors']) or ''}")
+    pg = report["postgres"]
+    if pg.get("peak"):
+        print(f"  postgres connections: peak {pg['peak']['total']} ({pg['peak']['active']} active), "
+              f"mean {pg['mean']['total']}, max_connections {pg['max_connections']}")
+    print(f"\n{'stage':<24} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage, row in sorted(report["stages"].items()):
+        print(f"{stage:<24} {row['count']:>7} {row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9}")
+
+
+def print_comparison(report: dict, baseline: dict) -> None:
+    def pct(new, old):
+        return f"{(new - old) / old:+.0%}" if old else "n/a"
+
+    old_t, new_t = baseline["throughput"]["iterations_per_s"], report["throughput"]["iterations_per_s"]
+    print(f"\nAgainst {baseline.get('git_commit') or 'baseline'} ({baseline['started_at']}):")
+    print(f"  iterations/s {old_t} -> {new_t} ({pct(new_t, old_t)}), "
+          f"error rate {baseline['error_rate']:.2%} -> {report['error_rate']:.2%}")
+    for stage, row in sorted(report["stages"].items()):
+        old = baseline["stages"].get(stage)
+        if old:
+            print(f"  {stage:<24} p50 {old['p50_ms']} -> {row['p50_ms']} ({pct(row['p50_ms'], old['p50_ms'])}), "
+                  f"p99 {old['p99_ms']} -> {row['p99_ms']} ({pct(row['p99_ms'], old['p99_ms'])})")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent students against the grading path.")
+    parser.add_argument("--users", type=int, default=20, help="virtual users")
+    parser.add_argument("--duration", type=float, default=60, help="seconds to run after ramp-up starts")
+    parser.add_argument("--ramp-up", type=float, default=5, help="seconds over which users join")
+    parser.add_argument("--think-ms", type=float, default=2000, help="mean think time between answers (exponential)")
+    parser.add_argument("--correct-ratio", type=float, default=0.5, help="share of answers that are correct")
+    parser.add_argument("--feedback-ratio", type=float, default=1.0, help="share of wrong answers that ask the mentor")
+    parser.add_argument("--cold", action="store_true", help="bypass the solution, shortcut, and feedback caches")
+    parser.add_argument("--llm", default="stub", help="'stub' for the bundled stub LLM, or 'config' for LLM_API_BASE")
+    parser.add_argument("--llm-latency-ms", type=float, default=500, help="stub: time to first token")
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=30, help="stub: decode speed")
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="seconds between pg_stat_activity samples")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--report", type=Path, default=Path("bench/load_report.json"))
+    parser.add_argument("--baseline", type=Path, help="earlier report to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    stub = None
+    if args.llm == "stub":
+        server, stub = start_stub(latency_ms=args.llm_latency_ms, tokens_per_sec=args.llm_tokens_per_sec)
+        #set before the backend modules read config
+        os.environ["LLM_API_BASE"] = f"http://127.0.0.1:{server.server_port}/v1"
+
+    from config import config
+    from backend import metrics
+    from backend.bootstrap_db import bootstrap_database
+    from backend.db_pool import pool_stats
+    from backend.llm_client import llm_stats
+    from backend.question_bank import QuestionBank
+
+    bootstrap_database()
+    bank = QuestionBank(Path(config.QUESTIONS_PATH), Path(config.SOLUTIONS_PATH), config.QUESTION_INDEX_PATH)
+    bank.refresh()
+    work = load_workload(bank)
+    if not work:
+        sys.exit("No questions with stored solutions to drive the load with.")
+    #a fresh registry whose window holds the whole run, so percentiles cover every sample
+    metrics.ENABLED = True
+    metrics.REGISTRY = metrics.Registry(window=1_000_000)
+
+    print(f"{args.users} virtual users, {len(work)} question(s), think {args.think_ms:g} ms, "
+          f"{args.correct_ratio:.0%} correct, LLM {os.environ.get('LLM_API_BASE', config.LLM_API_BASE)}")
+    stats, stop = RunStats(), threading.Event()
+    sampler = ConnectionSampler(args.sample_interval)
+    sampler.start()
+    users = [VirtualUser(i, work, args, stats, stop) for i in range(args.users)]
+    started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    started = time.monotonic()
+    for user in users:
+        user.start()
+    try:
+        stop.wait(args.duration)
+    except KeyboardInterrupt:
+        print("\nStopping early...")
+    stop.set()
+    for user in users:
+        user.join()
+    elapsed = time.monotonic() - started
+    sampler.stop()
+
+    ops = sum(stats.ops.values())
+    report = {
+        "started_at": started_at,
+        "git_commit": _git_commit(),
+        "users": args.users,
+        "duration_s": round(elapsed, 1),
+        "settings": {
+            "think_ms": args.think_ms, "correct_ratio": args.correct_ratio, "feedback_ratio": args.feedback_ratio,
+            "cold": args.cold, "llm": args.llm, "llm_latency_ms": args.llm_latency_ms,
+            "llm_tokens_per_sec": args.llm_tokens_per_sec, "questions": len(work), "seed": args.seed,
+            "DB_POOL_MAX": config.DB_POOL_MAX, "LLM_MAX_CONCURRENCY": config.LLM_MAX_CONCURRENCY,
+            "COMPARE_MODE": config.COMPARE_MODE, "GRADE_CONCURRENTLY": config.GRADE_CONCURRENTLY,
+            "SHORTCUT_GRADING": config.SHORTCUT_GRADING,
+        },
+        "throughput": {
+            "iterations_per_s": round(stats.ops["grade"] / elapsed, 2),
+            "grades_per_s": round((stats.ops["grade"] - sum(n for k, n in stats.errors.items() if k.startswith("grade:"))) / elapsed, 2),
+            "feedback_per_s": round(stats.ops["feedback"] / elapsed, 2),
+        },
+        "ops": dict(stats.ops),
+        "outcomes": dict(stats.outcomes),
+        "errors": dict(stats.errors),
+        "error_rate": round(sum(stats.errors.values()) / ops, 4) if ops else 0.0,
+        **metrics.metrics_stats(),
+        "postgres": sampler.summary(),
+        "pool": pool_stats(),
+        "llm": llm_stats(),
+        "llm_stub": stub.stats() if stub is not None else None,
+    }
+    print_report(report)
+    args.report.parent.mkdir(parents=True, exist_ok=True)
+    args.report.write_text(json.dumps(report, indent=2, default=str), encoding="utf-8")
+    print(f"\nReport: {args.report}")
+    if args.baseline and args.baseline.exists():
+        print_comparison(report, json.loads(args.baseline.read_text(encoding="utf-8")))
+
+
+if __name__ == "__main__":
+    main()
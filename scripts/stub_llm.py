@@ -0,0 +1,153 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = (
+    "Your result differs from the official solution. Compare the rows you return with the expected ones: "
+    "check the filter condition, the join type, and whether duplicates or NULLs change the count. "
+    "Adjust one clause at a time and re-run the query."
+)
+
+
+class StubLLM:
+    """OpenAI-compatible /v1/chat/completions with a fixed answer at a configurable speed.
+
+    latency_ms is the time to first token (prompt processing); tokens are then emitted at
+    tokens_per_sec, streamed as SSE when the request asks for it. Words stand in for tokens.
+    """
+
+    def __init__(self, latency_ms: float = 300, tokens_per_sec: float = 40, reply: str = DEFAULT_REPLY,
+                 model: str = "stub"):
+        self.latency = latency_ms / 1000
+        self.tokens_per_sec = tokens_per_sec
+        self.words = reply.split()
+        self.model = model
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def enter(self) -> None:
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def leave(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def tokens(self):
+        """Yield tokens at the configured pace after the first-token latency."""
+        time.sleep(self.latency)
+        gap = 1 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0
+        for i, word in enumerate(self.words):
+            if i:
+                time.sleep(gap)
+            yield word if i == 0 else " " + word
+
+    def usage(self, messages, completion_tokens: int):
+        prompt = sum(len(str(m.get("content", ""))) for m in messages) // 4
+        return {"prompt_tokens": prompt, "completion_tokens": completion_tokens,
+                "total_tokens": prompt + completion_tokens}
+
+    def stats(self):
+        with self._lock:
+            return {"requests": self.requests, "in_flight": self.in_flight, "peak_in_flight": self.peak_in_flight}
+
+
+def _handler(stub: StubLLM):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _json(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/models"):
+                self._json(200, {"object": "list", "data": [{"id": stub.model, "object": "model"}]})
+            elif self.path == "/stats":
+                self._json(200, stub.stats())
+            else:
+                self._json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._json(404, {"error": "not found"})
+                return
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            messages = payload.get("messages") or []
+            stub.enter()
+            try:
+                if payload.get("stream"):
+                    self._stream(messages)
+                else:
+                    text = "".join(stub.tokens())
+                    self._json(200, {
+                        "id": "stub", "object": "chat.completion", "model": stub.model,
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                                     "finish_reason": "stop"}],
+                        "usage": stub.usage(messages, len(stub.words)),
+                    })
+            except (BrokenPipeError, ConnectionResetError):
+                #the client cancelled mid-answer, as the app does on a rerun
+                self.close_connection = True
+            finally:
+                stub.leave()
+
+        def _stream(self, messages):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def send(event):
+                data = f"data: {event}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            count = 0
+            for token in stub.tokens():
+                count += 1
+                send(json.dumps({"choices": [{"index": 0, "delta": {"content": token}}]}))
+            send(json.dumps({"choices": [], "usage": stub.usage(messages, count)}))
+            send("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start_stub(port: int = 0, host: str = "127.0.0.1", **options):
+    """Start a stub in a daemon thread; returns (server, stub). Port 0 picks a free port (server.server_port)."""
+    stub = StubLLM(**options)
+    server = ThreadingHTTPServer((host, port), _handler(stub))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-llm", daemon=True).start()
+    return server, stub
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub LLM with configurable latency and speed.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency-ms", type=float, default=300, help="time to first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=40, help="decode speed after the first token")
+    args = parser.parse_args()
+    server, _ = start_stub(args.port, args.host, latency_ms=args.latency_ms, tokens_per_sec=args.tokens_per_sec)
+    print(f"Stub LLM on http://{args.host}:{server.server_port}/v1 "
+          f"({args.latency_ms:g} ms to first token, {args.tokens_per_sec:g} tokens/s)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
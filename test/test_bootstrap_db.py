@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from backend.bootstrap_db import dataset_rows
+
+def _materialize(scale_factor, seed):
+    return {table: list(rows) for table, (_, rows) in dataset_rows(scale_factor, seed).items()}
+
+def test_same_seed_and_scale_generate_identical_rows():
+    first = _materialize(1, 42)
+    assert first == _materialize(1, 42)
+    assert len(first["employees"]) == 10_000
+    assert first["employees"] != _materialize(1, 43)["employees"]
+
+def test_rows_match_the_copy_column_lists():
+    for table, (columns, rows) in dataset_rows(1, 7).items():
+        assert next(rows).rstrip("\n").count("\t") == columns.count(",")
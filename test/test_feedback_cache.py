@@ -0,0 +1,42 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from backend import feedback_cache
+from backend.feedback_cache import FeedbackCache, diagnostics_digest, normalize_sql
+
+def test_normalize_sql_ignores_whitespace_case_and_aliases():
+    a = "SELECT e.name, d.name\nFROM employees e JOIN departments AS d ON e.department_id = d.id;"
+    b = "select employees.name , departments.name from EMPLOYEES join departments on employees.department_id=departments.id"
+    assert normalize_sql(a) == normalize_sql(b)
+
+def test_normalize_sql_keeps_string_literals():
+    assert normalize_sql("SELECT * FROM employees WHERE name = 'Alice'") != \
+        normalize_sql("SELECT * FROM employees WHERE name = 'alice'")
+    assert normalize_sql("select *\nFROM Employees WHERE salary>1;") == "SELECT * FROM employees WHERE salary > 1"
+
+def test_digest_ignores_previews_and_timings():
+    base = {"equal": False, "user_rowcount": 3, "solution_rowcount": 2, "user_cols": ["name"], "solution_cols": ["name"]}
+    noisy = dict(base, performance={"time_ratio": 1.7, "too_slow": False})
+    assert diagnostics_digest(base) == diagnostics_digest(noisy)
+    assert diagnostics_digest(base) != diagnostics_digest(dict(base, user_rowcount=4))
+
+def test_disk_tier_survives_restart_and_expires(tmp_path, monkeypatch):
+    path = str(tmp_path / "feedback.sqlite3")
+    cache = FeedbackCache(path, ttl=60, max_entries=10, memory_entries=10)
+    cache.put("k", "Add a JOIN to departments.", "2")
+    fresh = FeedbackCache(path, ttl=60, max_entries=10, memory_entries=10)
+    assert fresh.get("k") == "Add a JOIN to departments."
+    assert fresh.stats()["disk_hits"] == 1
+    real_time = feedback_cache.time.time
+    monkeypatch.setattr(feedback_cache.time, "time", lambda: real_time() + 120)
+    assert FeedbackCache(path, ttl=60, max_entries=10, memory_entries=10).get("k") is None
+
+def test_size_limit_evicts_least_recently_used(tmp_path):
+    cache = FeedbackCache(str(tmp_path / "feedback.sqlite3"), ttl=60, max_entries=2, memory_entries=0)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.stats()["stored_entries"] == 2
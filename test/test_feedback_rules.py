@@ -0,0 +1,52 @@
+import pytest
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from backend.feedback_rules import rule_feedback
+
+def _diag(**kwargs):
+    diag = {"equal": False, "user_rowcount": 4, "solution_rowcount": 4, "user_cols": ["name"], "solution_cols": ["name"]}
+    diag.update(kwargs)
+    return diag
+
+def test_select_star_when_named_columns_expected():
+    hint = rule_feedback("SELECT * FROM employees", "SELECT name FROM employees",
+                         _diag(user_cols=["id", "name", "salary"]))
+    assert hint["rule"] == "select_star"
+
+def test_filter_boundary_on_same_column():
+    hint = rule_feedback("SELECT name FROM employees WHERE hire_date > '2018-01-01'",
+                         "SELECT name FROM employees WHERE hire_date > '2018-12-31'",
+                         _diag(user_rowcount=5, solution_rowcount=3))
+    assert hint["rule"] == "filter_boundary"
+    assert "2018-12-31" not in hint["hint"]
+
+def test_duplicates_point_to_distinct():
+    hint = rule_feedback("SELECT department_id FROM employees", "SELECT DISTINCT department_id FROM employees",
+                         _diag(user_rowcount=6, solution_rowcount=3, extra_rows_example={"name": "x"}))
+    assert hint["rule"] == "missing_distinct"
+
+def test_outer_join_nulls():
+    hint = rule_feedback("SELECT d.name FROM departments d LEFT JOIN employees e ON e.department_id = d.id",
+                         "SELECT d.name FROM departments d JOIN employees e ON e.department_id = d.id",
+                         _diag(user_rowcount=5, missing_rows_example=None, extra_rows_example={"name": None}))
+    assert hint["rule"] == "outer_join_nulls"
+
+def test_close_numbers_and_unclassified_fall_through():
+    hint = rule_feedback("SELECT 1", "SELECT 1", _diag(user_cols=["avg"], solution_cols=["avg"],
+                                                       missing_rows_example={"avg": 1000.5}, extra_rows_example={"avg": 1000}))
+    assert hint["rule"] == "precision"
+    assert rule_feedback("SELECT name FROM employees", "SELECT name FROM employees",
+                         _diag(missing_rows_example={"name": "Alice"}, extra_rows_example={"name": "Bob"})) is None
+
+@pytest.mark.parametrize("expected,got", [(6, 5), (100000, 99000), (3.5, 2), (1.5, float("nan")),
+                                          (float("inf"), 1.5), (float("-inf"), float("inf"))])
+def test_wrong_values_are_not_precision(expected, got):
+    assert rule_feedback("SELECT 1", "SELECT 1", _diag(user_cols=["n"], solution_cols=["n"],
+                                                       missing_rows_example={"n": expected}, extra_rows_example={"n": got})) is None
+
+def test_rounded_decimals_are_precision():
+    hint = rule_feedback("SELECT 1", "SELECT 1", _diag(user_cols=["avg"], solution_cols=["avg"],
+                                                       missing_rows_example={"avg": 123333.3333}, extra_rows_example={"avg": 123333.33}))
+    assert hint["rule"] == "precision"
@@ -0,0 +1,49 @@
+import json
+import sys
+from pathlib import Path
+
+import yaml
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "scripts"))
+import generate_explanations as gen
+
+def test_parse_ids_accepts_ranges_and_string_ids():
+    assert gen.parse_ids("1, 4,10-12,joins-a,07") == {"1", "4", "10", "11", "12", "joins-a", "7"}
+
+def test_string_ids_sort_after_numeric_ones():
+    questions = gen.normalize_questions({10: {"question": "c"}, "joins-a": {"question": "d"}, 2: {"question": "b"}})
+    assert [q["id"] for q in questions] == ["2", "10", "joins-a"]
+    assert sorted({"joins-a": 1, "10": 1, "9": 1}, key=gen.id_order) == ["9", "10", "joins-a"]
+
+def test_read_journal_drops_a_torn_tail(tmp_path):
+    journal = tmp_path / "solutions.journal.jsonl"
+    journal.write_text(json.dumps({"id": "1", "solution_sql": "SELECT 1;"}) + "\n{\"id\": \"2", encoding="utf-8")
+    assert gen.read_journal(journal) == {"1": {"solution_sql": "SELECT 1;"}}
+    assert journal.read_text(encoding="utf-8").endswith("\n")
+
+def test_resume_takes_journaled_answers_and_generates_the_rest(tmp_path, monkeypatch):
+    questions, solutions = tmp_path / "questions.yaml", tmp_path / "solutions.yaml"
+    questions.write_text(yaml.safe_dump([{"id": 1, "question": "one"}, {"id": "joins-a", "question": "two"}]),
+                         encoding="utf-8")
+    solutions.write_text(yaml.safe_dump({"1": {"compare": {"ordered": True}}}), encoding="utf-8")
+    journal = gen.journal_path_for(solutions)
+    #an accepted answer from the interrupted run, then a line torn by the crash
+    journal.write_text(json.dumps({"id": "1", "solution_sql": "SELECT 1;", "explanation": "old"}) + "\n{\"id\": \"jo",
+                       encoding="utf-8")
+    monkeypatch.setattr(gen, "QUESTIONS_PATH", questions)
+    monkeypatch.setattr(gen, "SOLUTIONS_PATH", solutions)
+    asked = []
+
+    def fake_generate(qtext, verify=True, ordered=False):
+        asked.append(qtext)
+        return {"solution_sql": "SELECT 2;", "explanation": "new"}, {}
+
+    monkeypatch.setattr(gen, "generate_one", fake_generate)
+    monkeypatch.setattr(gen, "_prompt_note", lambda metrics: "")
+    gen.main(["--no-verify", "--workers", "1"])
+
+    assert asked == ["two"]
+    saved = yaml.safe_load(solutions.read_text(encoding="utf-8"))
+    assert saved["1"] == {"solution_sql": "SELECT 1;", "explanation": "old", "compare": {"ordered": True}}
+    assert saved["joins-a"]["solution_sql"] == "SELECT 2;"
+    assert not journal.exists()
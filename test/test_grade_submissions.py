@@ -0,0 +1,47 @@
+import json
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "scripts"))
+import grade_submissions as grader
+
+def test_submission_keys_count_repeat_attempts(tmp_path):
+    path = tmp_path / "subs.csv"
+    path.write_text("\ufeffstudent,qid,query,submission_id\n"
+                    "ann,1,SELECT 1,\nann,1,SELECT 2,\nbob,1,SELECT 1,\nann,2,SELECT 3,x-9\n", encoding="utf-8")
+    subs = grader.read_submissions(path)
+    assert [s["submission"] for s in subs] == ["ann:1:1", "ann:1:2", "bob:1:1", "x-9"]
+    assert subs[1] == {"submission": "ann:1:2", "student_id": "ann", "question_id": "1", "sql": "SELECT 2"}
+
+def test_resume_skips_a_torn_tail(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text(json.dumps({"submission": "ann:1:1", "status": "correct"}) + "\n{\"submission\": \"ann:1:2\", \"sta",
+                    encoding="utf-8")
+    assert list(grader.read_results(path)) == ["ann:1:1"]
+    writer = grader.ResultWriter(path)
+    writer.write({"submission": "ann:1:2", "status": "incorrect"})
+    writer.close()
+    assert list(grader.read_results(path)) == ["ann:1:1", "ann:1:2"]
+
+def test_unexpected_errors_are_recorded_not_raised(monkeypatch):
+    def boom(*args, **kwargs):
+        raise KeyError("solution_sql")
+
+    monkeypatch.setattr(grader, "validate_sql_pair", boom)
+    warmer = grader.SolutionWarmer("memory")
+    warmer._warm.add("1")
+    sub = {"submission": "ann:1:1", "student_id": "ann", "question_id": "1", "sql": "SELECT 1"}
+    record = grader.grade_one(sub, {"solution_sql": "SELECT 1"}, warmer, "memory", None)
+    assert record["status"] == "error" and "solution_sql" in record["message"]
+
+def test_summarize_groups_by_question():
+    records = [
+        {"question_id": "2", "status": "correct", "ms": "10"},
+        {"question_id": "10", "status": "incorrect", "ms": 30.0},
+        {"question_id": "2", "status": "error", "ms": 20.0},
+    ]
+    summary = grader.summarize(records, elapsed=2.0, graded_now=2)
+    assert list(summary["questions"]) == ["2", "10"]
+    assert summary["questions"]["2"] == {"submissions": 2, "correct": 1, "error": 1, "correct_pct": 50.0, "median_ms": 15.0}
+    assert summary["statuses"] == {"correct": 1, "error": 1, "incorrect": 1}
+    assert summary["per_second"] == 1.0
@@ -0,0 +1,63 @@
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from backend.llm_client import LLMBusy, LLMClient
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+def _client(max_concurrency=1, queue_timeout=5.0):
+    return LLMClient("http://llm.invalid/v1", "key", max_concurrency=max_concurrency, connect_timeout=1,
+                     read_timeout=1, retries=0, backoff=0, queue_timeout=queue_timeout)
+
+def _slow_post(calls, delay=0.2):
+    lock = threading.Lock()
+    def post(url, data=None, **kwargs):
+        with lock:
+            calls.append(data)
+        time.sleep(delay)
+        return FakeResponse({"echo": data})
+    return post
+
+def test_identical_concurrent_prompts_share_one_request(monkeypatch):
+    client, calls = _client(max_concurrency=4), []
+    monkeypatch.setattr(client.session, "post", _slow_post(calls))
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lambda _: client.chat({"prompt": "same"}), range(4)))
+    assert len(calls) == 1
+    assert all(r == results[0] for r in results)
+    assert client.stats()["deduplicated"] == 3
+
+def test_in_flight_requests_are_capped(monkeypatch):
+    client, calls = _client(max_concurrency=2), []
+    monkeypatch.setattr(client.session, "post", _slow_post(calls, delay=0.1))
+    with ThreadPoolExecutor(6) as pool:
+        list(pool.map(lambda i: client.chat({"prompt": i}), range(6)))
+    stats = client.stats()
+    assert len(calls) == 6
+    assert stats["peak_in_flight"] == 2
+    assert stats["queue_wait_ms_max"] >= 50
+
+def test_busy_model_raises_after_queue_timeout(monkeypatch):
+    client, calls = _client(max_concurrency=1, queue_timeout=0.05), []
+    monkeypatch.setattr(client.session, "post", _slow_post(calls, delay=0.3))
+    with ThreadPoolExecutor(2) as pool:
+        first = pool.submit(client.chat, {"prompt": 1})
+        time.sleep(0.05)
+        with pytest.raises(LLMBusy):
+            client.chat({"prompt": 2})
+        first.result()
+    assert client.stats()["rejected"] == 1
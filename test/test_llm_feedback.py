@@ -0,0 +1,45 @@
+import json
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from backend.llm_client import LLM_CLIENT
+from backend.llm_feedback import stream_feedback
+
+class FakeStreamResponse:
+    def __init__(self, events):
+        self.lines = []
+        for event in events:
+            self.lines += ["data: " + (event if isinstance(event, str) else json.dumps(event)), ""]
+        self.closed = False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self, decode_unicode=False):
+        yield from self.lines
+
+    def close(self):
+        self.closed = True
+
+def _delta(text):
+    return {"choices": [{"delta": {"content": text}}]}
+
+def test_stream_yields_deltas_and_records_metrics(monkeypatch):
+    resp = FakeStreamResponse([_delta("Check "), _delta("the JOIN."), {"choices": [], "usage": {"completion_tokens": 4}}, "[DONE]"])
+    monkeypatch.setattr(LLM_CLIENT.session, "post", lambda *args, **kwargs: resp)
+    stream = stream_feedback("q", "SELECT 1", "SELECT 2", "", {})
+    assert "".join(stream) == "Check the JOIN."
+    assert resp.closed
+    assert stream.metrics["tokens"] == 4
+    assert stream.metrics["completed"] and stream.metrics["ttft_ms"] is not None
+
+def test_closing_stream_early_counts_as_cancelled(monkeypatch):
+    resp = FakeStreamResponse([_delta("a"), _delta("b"), "[DONE]"])
+    monkeypatch.setattr(LLM_CLIENT.session, "post", lambda *args, **kwargs: resp)
+    stream = stream_feedback("q", "SELECT 1", "SELECT 2", "", {})
+    chunks = iter(stream)
+    assert next(chunks) == "a"
+    chunks.close()
+    assert resp.closed
+    assert stream.metrics["cancelled"]
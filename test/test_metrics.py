@@ -0,0 +1,52 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from backend import metrics
+
+@pytest.fixture
+def registry(monkeypatch):
+    fresh = metrics.Registry(window=100)
+    monkeypatch.setattr(metrics, "REGISTRY", fresh)
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    return fresh
+
+def test_spans_feed_histograms_and_error_counters(registry):
+    for _ in range(3):
+        with metrics.span("grade.user_query", rows=1):
+            pass
+    with pytest.raises(ValueError):
+        with metrics.span("grade.user_query"):
+            raise ValueError("boom")
+    stats = metrics.metrics_stats()
+    assert stats["stages"]["grade.user_query"]["count"] == 4
+    assert stats["stages"]["grade.user_query"]["p99_ms"] is not None
+    assert stats["counters"] == {'stage_errors_total{stage="grade.user_query",error="ValueError"}': 1}
+
+def test_quantiles_come_from_the_recent_window():
+    hist = metrics.Histogram(window=100)
+    for ms in range(1, 101):
+        hist.observe(ms / 1000)
+    q = hist.quantiles()
+    assert (q[0.5], q[0.95], q[0.99]) == (0.051, 0.096, 0.1)
+
+def test_disabled_metrics_record_nothing(registry, monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", False)
+    with metrics.span("grade.total") as timed:
+        timed.set(correct=True)
+    metrics.inc("rows_fetched_total", 10, mode="memory")
+    assert metrics.metrics_stats() == {"stages": {}, "counters": {}}
+
+def test_prometheus_text_has_cumulative_buckets_and_counters(registry):
+    metrics.observe("db.get_conn", 0.002)
+    metrics.observe("db.get_conn", 0.2)
+    metrics.inc("rows_fetched_total", 42, mode="stream")
+    text = metrics.render_prometheus()
+    assert "# TYPE sqlplay_stage_seconds histogram" in text
+    assert 'sqlplay_stage_seconds_bucket{stage="db.get_conn",le="0.0025"} 1' in text
+    assert 'sqlplay_stage_seconds_bucket{stage="db.get_conn",le="+Inf"} 2' in text
+    assert 'sqlplay_stage_seconds_count{stage="db.get_conn"} 2' in text
+    assert 'sqlplay_stage_seconds_recent{stage="db.get_conn",quantile="0.99"} 0.200000' in text
+    assert 'sqlplay_rows_fetched_total{mode="stream"} 42' in text
@@ -0,0 +1,35 @@
+import json
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from backend.prompts import estimate_tokens, prompt_metrics, serialize_diagnostics
+
+def _wide_diag():
+    row = {f"col_{i}": "x" * 200 for i in range(30)}
+    return {
+        "equal": False,
+        "user_rowcount": 10,
+        "solution_rowcount": 12,
+        "user_cols": list(row),
+        "solution_cols": list(row),
+        "missing_rows_example": row,
+        "extra_rows_example": row,
+        "missing_rows": [{"row": row, "count": 2}] * 5,
+    }
+
+def test_small_diagnostics_are_kept_whole():
+    diag = {"equal": False, "user_rowcount": 6, "solution_rowcount": 4, "missing_rows_example": {"name": "Alice"}}
+    assert json.loads(serialize_diagnostics(diag, 300)) == {
+        "user_rowcount": 6, "solution_rowcount": 4, "missing_rows_example": {"name": "Alice"}}
+
+def test_large_diagnostics_fit_the_budget():
+    text = serialize_diagnostics(_wide_diag(), 300)
+    assert estimate_tokens(text) <= 300
+    compact = json.loads(text)
+    assert compact["user_rowcount"] == 10 and compact["solution_rowcount"] == 12
+
+def test_prompt_metrics_prefers_server_counts():
+    messages = [{"role": "user", "content": "x" * 40}]
+    metrics = prompt_metrics(messages, {"prompt_tokens": 12}, {"prompt_n": 3, "prompt_ms": 55.0})
+    assert metrics == {"prompt_tokens": 12, "prompt_tokens_estimated": 10, "prompt_tokens_evaluated": 3, "prompt_eval_ms": 55.0}
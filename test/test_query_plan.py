@@ -0,0 +1,67 @@
+import pytest
+import sys
+import time
+from contextlib import nullcontext
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from backend.query_plan import QueryGuard, QueryTooExpensive, compare_performance
+
+class FakeCursor:
+    def __init__(self, cost, rows):
+        self.plan = [{"Plan": {"Total Cost": cost, "Plan Rows": rows}}]
+        self.executed = []
+
+    def execute(self, query, params=None):
+        self.executed.append(query)
+
+    def fetchone(self):
+        return (self.plan,)
+
+def test_guard_rejects_over_budget_cost():
+    guard = QueryGuard({"max_cost": 100})
+    with pytest.raises(QueryTooExpensive):
+        guard.admit(FakeCursor(cost=5000, rows=10), "SELECT 1")
+
+def test_guard_warns_between_thresholds():
+    guard = QueryGuard({"max_cost": 1000, "warn_cost": 10})
+    guard.admit(FakeCursor(cost=50, rows=10), "SELECT 1")
+    assert guard.estimate == {"total_cost": 50.0, "plan_rows": 10.0}
+    assert len(guard.warnings) == 1
+
+def test_guard_caps_fetched_rows():
+    guard = QueryGuard()
+    guard.check_rowcount(guard.max_fetch_rows)
+    with pytest.raises(QueryTooExpensive):
+        guard.check_rowcount(guard.max_fetch_rows + 1)
+
+def test_compare_performance_flags_slow_plans():
+    sol = {"execution_ms": 4.0, "node_types": {"Index Scan": 1}}
+    user = {"execution_ms": 20.0, "node_types": {"Seq Scan": 1, "Nested Loop": 1}}
+    perf = compare_performance(user, sol, max_ratio=3.0)
+    assert perf["time_ratio"] == 5.0 and perf["too_slow"]
+    assert perf["extra_node_types"] == ["Nested Loop", "Seq Scan"]
+    assert perf["missing_node_types"] == ["Index Scan"]
+
+class FakeConn:
+    def __init__(self):
+        self.cur = FakeCursor(cost=0, rows=0)
+
+    def cursor(self):
+        return nullcontext(self.cur)
+
+def test_guard_caps_each_fetch_at_the_remaining_time():
+    guard = QueryGuard({"timeout_ms": 60000})
+    conn = FakeConn()
+    guard.check_deadline(conn)
+    assert conn.cur.executed == []
+    guard.start_clock()
+    guard.check_deadline(conn)
+    assert "statement_timeout" in conn.cur.executed[0]
+
+def test_guard_deadline_spans_the_whole_read():
+    guard = QueryGuard({"timeout_ms": 1})
+    guard.start_clock()
+    time.sleep(0.01)
+    with pytest.raises(QueryTooExpensive, match="time limit"):
+        guard.check_deadline(FakeConn())
@@ -0,0 +1,45 @@
+import os
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from backend.question_bank import QuestionBank
+
+QUESTIONS = """\
+- {id: 1, question: Easy filter, difficulty: easy, tags: [filter]}
+- {id: 2, question: Join one, difficulty: medium, tags: [join, aggregate]}
+- {id: 3, question: Join two, difficulty: hard, tags: [join]}
+"""
+
+def _bank(tmp_path):
+    (tmp_path / "questions.yaml").write_text(QUESTIONS)
+    (tmp_path / "solutions.yaml").write_text("1: {solution_sql: SELECT 1;}\n")
+    return QuestionBank(tmp_path / "questions.yaml", tmp_path / "solutions.yaml", str(tmp_path / "index.sqlite3"))
+
+def test_index_is_rebuilt_only_when_content_changes(tmp_path):
+    bank = _bank(tmp_path)
+    assert bank.refresh() is True
+    assert bank.refresh() is False
+    os.utime(tmp_path / "questions.yaml", ns=(0, 10**18))
+    assert bank.refresh() is False
+    assert bank.stats()["hash_checks"] == 3
+    (tmp_path / "solutions.yaml").write_text("1: {solution_sql: SELECT 2;}\n")
+    assert bank.refresh() is True
+    assert bank.solution("1") == {"solution_sql": "SELECT 2;"}
+    #a second process reuses the index on disk without parsing YAML
+    other = QuestionBank(tmp_path / "questions.yaml", tmp_path / "solutions.yaml", str(tmp_path / "index.sqlite3"))
+    assert other.refresh() is False and other.count() == 3
+
+def test_lookup_and_filters(tmp_path):
+    bank = _bank(tmp_path)
+    bank.refresh()
+    assert bank.question("2")["question"] == "Join one"
+    assert bank.question("9") is None and bank.solution("2") == {}
+    assert bank.ids(tag="join") == ["2", "3"]
+    assert bank.ids(tag="join", difficulty="hard") == ["3"]
+    assert bank.difficulties() == ["easy", "medium", "hard"]
+    assert bank.neighbor(None, 1, tag="join") == "2"
+    assert bank.neighbor("2", 1, tag="join") == "3"
+    assert bank.neighbor("3", -1) == "2" and bank.neighbor("3", 1) is None
+    assert bank.position("3", tag="join") == 1
+    assert bank.position("1", tag="join") is None
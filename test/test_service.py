@@ -0,0 +1,97 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import psycopg2
+import pytest
+import requests
+from starlette.requests import Request
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from backend.query_plan import QueryTooExpensive
+from backend import service
+from backend.db_pool import PoolTimeout
+from backend.service import Gate, Saturated, questions
+from backend.service_client import ServiceBusy, ServiceClient, ServiceError
+
+def test_gate_queues_up_to_its_depth_then_rejects():
+    async def scenario():
+        gate = Gate("grade", slots=1, queue=1, timeout=5)
+        release = asyncio.Event()
+
+        async def job():
+            await gate.acquire()
+            try:
+                await release.wait()
+            finally:
+                gate.release()
+
+        running = asyncio.create_task(job())
+        queued = asyncio.create_task(job())
+        await asyncio.sleep(0.01)
+        assert (gate.running, gate.waiting) == (1, 1)
+        with pytest.raises(Saturated):
+            await gate.acquire()
+        release.set()
+        await asyncio.gather(running, queued)
+        assert gate.stats()["rejected"] == 1 and gate.running == 0
+
+    asyncio.run(scenario())
+
+def test_gate_rejects_after_waiting_too_long():
+    async def scenario():
+        gate = Gate("feedback", slots=1, queue=4, timeout=0.05)
+        await gate.acquire()
+        with pytest.raises(Saturated):
+            await gate.acquire()
+        assert gate.waiting == 0
+
+    asyncio.run(scenario())
+
+@pytest.mark.parametrize("query", [b"offset=abc", b"limit=ten", b"offset=-5", b"limit=-1"])
+def test_questions_rejects_bad_paging(query):
+    request = Request({"type": "http", "method": "GET", "path": "/questions", "query_string": query, "headers": []})
+    resp = asyncio.run(questions(request))
+    assert resp.status_code == 400 and b'"kind":"invalid"' in resp.body
+
+def _post(path, body: bytes) -> Request:
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+    return Request({"type": "http", "method": "POST", "path": path, "query_string": b"", "headers": []}, receive)
+
+@pytest.mark.parametrize("exc,status,kind", [
+    (PoolTimeout("No database connection available"), 429, "busy"),
+    (psycopg2.ProgrammingError("column \"nope\" does not exist"), 422, "sql_error"),
+    (psycopg2.DataError("division by zero"), 422, "sql_error"),
+    (psycopg2.OperationalError("server closed the connection unexpectedly"), 503, "database"),
+])
+def test_validate_maps_grading_failures(monkeypatch, exc, status, kind):
+    def grade(*args, **kwargs):
+        raise exc
+
+    monkeypatch.setattr(service, "_find", lambda qid: {"question": {"id": qid}, "solution": {"solution_sql": "SELECT 1"}})
+    monkeypatch.setattr(service, "validate_sql_pair", grade)
+    resp = asyncio.run(service.validate(_post("/validate", b'{"question_id": "1", "sql": "SELECT 1"}')))
+    assert resp.status_code == status and f'"kind":"{kind}"'.encode() in resp.body
+
+def _response(status, body, headers=None):
+    resp = requests.Response()
+    resp.status_code = status
+    resp._content = body.encode("utf-8")
+    resp.headers.update(headers or {})
+    return resp
+
+def test_client_maps_service_errors_to_in_process_exceptions():
+    raise_for = ServiceClient._raise_for
+    raise_for(_response(200, "{}"))
+    with pytest.raises(ServiceBusy) as busy:
+        raise_for(_response(429, '{"error": "full", "kind": "busy"}', {"Retry-After": "2"}))
+    assert busy.value.retry_after == 2.0
+    with pytest.raises(QueryTooExpensive):
+        raise_for(_response(422, '{"error": "too big", "kind": "too_expensive"}'))
+    with pytest.raises(ValueError, match="pg_sleep"):
+        raise_for(_response(422, '{"error": "Function pg_sleep() is not allowed.", "kind": "invalid"}'))
+    with pytest.raises(ServiceError, match="nope"):
+        raise_for(_response(422, '{"error": "relation nope does not exist", "kind": "sql_error"}'))
+    with pytest.raises(ServiceError, match="Bad Gateway"):
+        raise_for(_response(502, "Bad Gateway"))
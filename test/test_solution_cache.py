@@ -0,0 +1,31 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from backend.solution_cache import AcceptedAnswers, SolutionCache, solution_key
+
+def test_lru_evicts_least_recently_used():
+    cache = SolutionCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (2, 1, 1)
+
+def test_solution_key_tracks_dataset_fingerprint():
+    sql = "SELECT 1;"
+    assert solution_key(sql, "v1") == solution_key("  SELECT 1;\n", "v1")
+    assert solution_key(sql, "v1") != solution_key(sql, "v2")
+
+def test_accepted_answers_are_bounded_and_reset_with_the_dataset():
+    store = AcceptedAnswers(max_per_question=2, max_questions=10)
+    for fp in ("a", "b", "c"):
+        store.add("q1", fp, "data-v1")
+    assert not store.contains("q1", "a", "data-v1")
+    assert store.contains("q1", "c", "data-v1")
+    assert not store.contains("q2", "c", "data-v1")
+    assert not store.contains("q1", "c", "data-v2")
+    assert store.stats()["invalidations"] == 1
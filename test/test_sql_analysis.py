@@ -0,0 +1,47 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from backend.sql_analysis import analyze_sql, sql_analysis_stats, statement_body
+from backend.validate_sql import is_safe_select
+
+def test_keywords_in_identifiers_and_literals_are_allowed():
+    assert is_safe_select("SELECT created_at FROM employees WHERE name = 'update me'")
+    assert is_safe_select("WITH top AS (SELECT * FROM employees) SELECT name FROM top")
+
+def test_writes_hidden_in_ctes_and_side_effect_functions_are_rejected():
+    assert not is_safe_select("WITH gone AS (DELETE FROM employees RETURNING *) SELECT * FROM gone")
+    assert not is_safe_select("SELECT pg_sleep(10)")
+    assert not is_safe_select("SELECT pg_catalog.set_config('statement_timeout', '0', false)")
+    assert not is_safe_select("SELECT * FROM employees FOR UPDATE")
+    assert not is_safe_select("SELECT * INTO copy FROM employees")
+    assert not is_safe_select("SELECT 1; DROP TABLE employees")
+    assert "DELETE" in analyze_sql("WITH gone AS (DELETE FROM employees RETURNING *) SELECT * FROM gone").reason
+
+def test_tables_columns_and_shape():
+    a = analyze_sql("SELECT DISTINCT e.name FROM employees e LEFT JOIN departments d ON d.id = e.department_id WHERE 100 < e.salary")
+    assert a.tables == {"employees", "departments"}
+    assert {"name", "id", "department_id", "salary"} <= a.columns
+    assert a.distinct and a.outer_join and a.filtered and not a.inner_join and not a.grouped
+    assert a.comparisons == {"salary": (">", "100")}
+
+def test_unordered_limit_is_detected_per_query_level():
+    assert analyze_sql("SELECT name FROM employees LIMIT 2").unordered_limit
+    assert analyze_sql("SELECT DISTINCT ON (department_id) name FROM employees").unordered_limit
+    assert not analyze_sql("SELECT * FROM (SELECT name FROM employees ORDER BY salary LIMIT 2) t").unordered_limit
+
+def test_canonical_form_and_cache():
+    a = analyze_sql("SELECT e.name FROM employees e WHERE e.salary > 1")
+    b = analyze_sql("select EMPLOYEES.name\nfrom employees where employees.salary>1;")
+    assert a.canonical == b.canonical == "SELECT name FROM employees WHERE salary > 1"
+    assert analyze_sql("SELECT name FROM employees WHERE salary > 1 AND id < 9").fingerprint == \
+        analyze_sql("SELECT e.name FROM employees e WHERE 9 > e.id AND e.salary > 1").fingerprint
+    #self-joins keep their aliases
+    assert "AS a" in analyze_sql("SELECT a.name FROM employees a JOIN employees b ON a.id = b.id").canonical
+    hits = sql_analysis_stats()["hits"]
+    assert analyze_sql("  SELECT e.name FROM employees e WHERE e.salary > 1") is a
+    assert sql_analysis_stats()["hits"] == hits + 1
+
+def test_statement_body_drops_trailing_semicolons_and_comments():
+    assert statement_body("SELECT 'a--b' FROM employees; -- note") == "SELECT 'a--b' FROM employees"
+    assert statement_body("SELECT 1 /* keep */ + 1;;\n/* done */") == "SELECT 1 /* keep */ + 1"
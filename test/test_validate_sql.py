@@ -1,15 +1,241 @@
 import pytest
 import sys
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).resolve().parents[1]))
-from backend.validate_sql import is_safe_select
+from decimal import Decimal
+
+from psycopg2 import sql as pgsql
+
+from backend.result_set import CompareOptions, ResultSet
+from backend import validate_sql
+from backend.solution_cache import ACCEPTED_ANSWERS
+from backend.validate_sql import ResultSummary, compare_results, compare_summaries, is_safe_select, validate_sql_pair
 
 @pytest.mark.parametrize("sql,ok", [
     ("SELECT 1;", True),
     (" select * from employees ;", True),
     ("DELETE FROM employees;", False),
     ("DROP TABLE employees;", False),
+    ("SELECT 1; -- note", True),
+    ("SELECT 1; /* done */", True),
+    ("SELECT 1;\n-- first try: SELECT 2", True),
+    ("SELECT 1; SELECT 2", False),
+    ("SELECT 1; -- note\nDELETE FROM employees", False),
 ])
 def test_is_safe_select(sql, ok):
     assert is_safe_select(sql) == ok
+
+def test_canonical_matches_skip_the_database(monkeypatch):
+    monkeypatch.setattr(validate_sql, "dataset_fingerprint", lambda: "data-v1")
+    monkeypatch.setattr(validate_sql, "get_conn", lambda *a, **k: pytest.fail("query was executed"))
+    ACCEPTED_ANSWERS.clear()
+    solution = "SELECT name FROM employees WHERE salary > 100 AND department_id = 2;"
+    verdict = validate_sql_pair("select e.name from EMPLOYEES e where 2 = e.department_id and 100 < e.salary", solution)
+    assert verdict["is_correct"] and verdict["shortcut"] == "solution"
+    scope = validate_sql.answer_scope(solution, validate_sql._options_signature(CompareOptions()))
+    accepted = validate_sql.analyze_sql("SELECT name FROM employees WHERE department_id = 2 AND salary >= 100.01")
+    ACCEPTED_ANSWERS.add(scope, accepted.fingerprint, "data-v1")
+    verdict = validate_sql_pair("SELECT name FROM employees WHERE salary >= 100.01 AND department_id = 2", solution)
+    assert verdict["shortcut"] == "accepted"
+
+def _summary(cols, rows, sample_size=50):
+    summary = ResultSummary(cols, ignore_col_order=True, sample_size=sample_size)
+    for row in rows:
+        summary.add(row)
+    return summary
+
+def test_summaries_ignore_row_and_column_order():
+    sol = _summary(["id", "salary"], [(1, Decimal("10.50")), (2, Decimal("20"))])
+    user = _summary(["salary", "id"], [(20.0, 2), (10.5, 1)])
+    assert compare_summaries(user, sol)["equal"]
+
+def test_summaries_detect_duplicate_counts():
+    sol = _summary(["id"], [(1,), (2,)])
+    user = _summary(["id"], [(1,), (1,), (2,)])
+    diag = compare_summaries(user, sol)
+    assert not diag["equal"]
+    assert diag["user_rowcount"] == 3
+
+def test_summaries_skip_examples_past_sample():
+    sol = _summary(["id"], [(i,) for i in range(10)], sample_size=3)
+    user = _summary(["id"], [(i,) for i in range(1, 11)], sample_size=3)
+    diag = compare_summaries(user, sol)
+    assert not diag["equal"]
+    assert diag["missing_rows_example"] is None and "examples_unavailable" in diag
+
+def test_summaries_separate_values_with_colliding_hashes():
+    #hash(-1) == hash(-2) in CPython
+    assert not compare_summaries(_summary(["id"], [(-1,)]), _summary(["id"], [(-2,)]))["equal"]
+
+def test_summaries_keep_duplicate_column_names_apart():
+    sol = _summary(["name", "name"], [("Alice", "Eng")])
+    user = _summary(["name", "name"], [("Alice", "Alice")])
+    assert not compare_summaries(user, sol)["equal"]
+
+@pytest.mark.parametrize("user,sol", [(True, 1), (False, 0), ("NaN", float("nan")), ("[1]", [1])])
+def test_both_compare_modes_keep_types_apart(user, sol):
+    for rows in (lambda v: [(v,)], lambda v: [(v,), (None,)]):
+        assert not compare_summaries(_summary(["v"], rows(user)), _summary(["v"], rows(sol)))["equal"]
+        assert not compare_results(ResultSet.from_rows(["v"], rows(user)), ResultSet.from_rows(["v"], rows(sol)))["equal"]
+    assert compare_results(ResultSet.from_rows(["v"], [(True,), (None,)]), ResultSet.from_rows(["v"], [(None,), (True,)]))["equal"]
+
+def test_summaries_match_integral_decimals_and_ints():
+    assert compare_summaries(_summary(["n"], [(80000,)]), _summary(["n"], [(Decimal("80000.00"),)]))["equal"]
+
+def test_compare_results_ignores_row_and_column_order():
+    sol = ResultSet.from_rows(["name", "avg"], [("HR", Decimal("80000.00")), ("Eng", None)])
+    user = ResultSet.from_rows(["avg", "name"], [(None, "Eng"), (80000, "HR")])
+    assert compare_results(user, sol)["equal"]
+
+def test_compare_results_reports_duplicate_as_extra():
+    sol = ResultSet.from_rows(["name"], [("Alice",), ("Bob",)])
+    user = ResultSet.from_rows(["name"], [("Alice",), ("Alice",)])
+    diag = compare_results(user, sol)
+    assert not diag["equal"]
+    assert diag["missing_rows_example"] == {"name": "Bob"}
+    assert diag["extra_rows_example"] == {"name": "Alice"}
+
+def test_compare_results_keeps_duplicate_column_names_apart():
+    sol = ResultSet.from_rows(["name", "name"], [("Alice", "Eng")])
+    user = ResultSet.from_rows(["name", "name"], [("Alice", "Alice")])
+    diag = compare_results(user, sol)
+    assert not diag["equal"]
+    assert diag["missing_rows_example"] == {"name": "Alice", "name (2)": "Eng"}
+    assert compare_results(ResultSet.from_rows(["name", "name"], [("Alice", "Eng")]), sol)["equal"]
+
+def test_compare_results_keeps_bigints_exact_next_to_nulls():
+    big = 2**53
+    sol = ResultSet.from_rows(["id"], [(big,), (None,)])
+    assert not compare_results(ResultSet.from_rows(["id"], [(big + 1,), (None,)]), sol)["equal"]
+    assert compare_results(ResultSet.from_rows(["id"], [(None,), (big,)]), sol)["equal"]
+    assert not compare_results(ResultSet.from_rows(["id"], [(big,), (0,)]), sol)["equal"]
+    assert sol.row(1) == {"id": None} and sol.row(0) == {"id": big}
+
+def test_compare_results_text_never_equals_number():
+    sol = ResultSet.from_rows(["id"], [(1,)])
+    user = ResultSet.from_rows(["id"], [("1",)])
+    assert not compare_results(user, sol)["equal"]
+
+def test_compare_results_applies_column_tolerance():
+    sol = ResultSet.from_rows(["dept", "avg"], [("Eng", Decimal("123333.3333")), ("HR", Decimal("80000"))])
+    user = ResultSet.from_rows(["dept", "avg"], [("HR", 80000.0), ("Eng", 123333.33)])
+    assert not compare_results(user, sol)["equal"]
+    options = CompareOptions.from_config({"tolerance": {"avg": {"abs": 0.01}}})
+    assert compare_results(user, sol, options=options)["equal"]
+
+def test_compare_results_ordered_and_case_insensitive():
+    sol = ResultSet.from_rows(["name"], [("alice",), ("bob",)])
+    user = ResultSet.from_rows(["name"], [("BOB",), ("ALICE",)])
+    assert compare_results(user, sol, options=CompareOptions.from_config({"case_insensitive": True}))["equal"]
+    diag = compare_results(user, sol, options=CompareOptions.from_config({"case_insensitive": True, "ordered": True}))
+    assert not diag["equal"] and diag["row_order_mismatch"]
+
+class _CancelRecorder:
+    def __init__(self):
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+def test_failed_user_query_cancels_the_solution_query():
+    conn = _CancelRecorder()
+
+    def run_solution(running):
+        running.attach(conn)
+        try:
+            assert conn.cancelled.wait(5), "solution query was never cancelled"
+            raise validate_sql.QueryCancelled("canceling statement due to user request")
+        finally:
+            running.detach()
+
+    def run_user(running):
+        raise ValueError("syntax error")
+
+    with pytest.raises(ValueError):
+        validate_sql._run_pair_concurrently(run_user, run_solution)
+    assert conn.cancelled.is_set()
+
+def test_cancel_before_attach_stops_the_query_from_starting():
+    running = validate_sql.RunningQuery()
+    running.cancel()
+    with pytest.raises(validate_sql.QueryCancelled):
+        running.attach(_CancelRecorder())
+
+def test_split_counts_moves_count_out_of_the_row():
+    examples = [{"name": "Bob", "__count": 2}, {"name": "Eve", "__count": 1}]
+    assert validate_sql._split_counts(examples) == [
+        {"row": {"name": "Bob"}, "count": 2}, {"row": {"name": "Eve"}, "count": 1},
+    ]
+    assert validate_sql._split_counts(None) == []
+
+def _render(query) -> str:
+    #enough of psycopg2's composition to read the SQL without a connection
+    if isinstance(query, pgsql.Composed):
+        return "".join(_render(part) for part in query.seq)
+    if isinstance(query, pgsql.Identifier):
+        return ".".join(f'"{s}"' for s in query.strings)
+    if isinstance(query, pgsql.Literal):
+        return repr(query.wrapped)
+    return query.string
+
+class DiffCursor:
+    def __init__(self, row):
+        self.row = row
+        self.executed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.executed.append(query)
+
+    def fetchone(self):
+        return self.row
+
+def test_diff_in_database_composes_except_all(monkeypatch):
+    cur = DiffCursor((1, 0, [{"name": "Bob", "__count": 1}], None))
+
+    @contextmanager
+    def fake_conn(*args, **kwargs):
+        yield type("Conn", (), {"cursor": lambda self: cur})()
+
+    monkeypatch.setattr(validate_sql, "get_conn", fake_conn)
+    diff = validate_sql.diff_in_database("SELECT name FROM employees WHERE id > 1;", "SELECT name FROM employees",
+                                         ["name"], limit=3)
+    query = " ".join(_render(cur.executed[0]).split())
+    assert "WITH sol AS (SELECT name FROM employees ), usr AS (SELECT name FROM employees WHERE id > 1 )" in query
+    assert 'SELECT "name" FROM sol EXCEPT ALL SELECT "name" FROM usr' in query
+    assert 'SELECT "name" FROM usr EXCEPT ALL SELECT "name" FROM sol' in query
+    assert "LIMIT 3" in query
+    assert diff["missing_rowcount"] == 1 and diff["extra_rowcount"] == 0
+    assert diff["missing_rows_example"] == {"name": "Bob"} and diff["extra_rows"] == []
+
+@pytest.mark.parametrize("run", [validate_sql.run_query, validate_sql.summarize_query])
+def test_cancel_between_attach_and_execute_stops_the_query(monkeypatch, run):
+    running = validate_sql.RunningQuery()
+    executed = []
+
+    class Cursor(DiffCursor):
+        def execute(self, query, params=None):
+            executed.append(query)
+
+    class Conn(_CancelRecorder):
+        def cursor(self, name=None):
+            #the partner query fails while this one is still being set up: no statement is running to cancel
+            running.cancel()
+            return Cursor(None)
+
+    @contextmanager
+    def fake_conn(*args, **kwargs):
+        yield Conn()
+
+    monkeypatch.setattr(validate_sql, "get_conn", fake_conn)
+    with pytest.raises(validate_sql.QueryCancelled):
+        run("SELECT 1", running)
+    assert executed == []
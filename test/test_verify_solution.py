@@ -0,0 +1,23 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from backend.verify_solution import _row_digest, verify_solution
+
+def test_limit_without_order_by_is_rejected_before_running():
+    report = verify_solution("SELECT name FROM employees LIMIT 3")
+    assert not report["ok"]
+    assert "ORDER BY" in report["reason"]
+    assert "rows" not in report
+
+def test_ordered_comparison_requires_order_by():
+    report = verify_solution("SELECT name FROM employees", ordered=True)
+    assert not report["ok"]
+    assert "no ORDER BY" in report["reason"]
+
+def test_row_digest_is_stable_across_numeric_types():
+    from decimal import Decimal
+    assert _row_digest((1, Decimal("2.50"))) == _row_digest((1, 2.5))
+    assert _row_digest((1, 2)) != _row_digest((2, 1))
+    #fixed value: stored fingerprints must not change between processes
+    assert _row_digest(("a",)) == 16633953107510889303